@@ -8,11 +8,22 @@ Requires env vars:
 
 Returns a LangChain-ish payload with `text` and `sources` so the rest of the
 app can treat it like a vector store result.
+
+boto3 is blocking, so every Bedrock call runs on the adapter's own thread pool
+(sized to the client's connection pool) instead of on the event loop or the
+loop's shared default executor.
 """
 
+import asyncio
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
 from mappings.knowledge_sources import knowledge_sources
+from managers.context_builder import build_context
+from managers.retrieval_cache import RetrievalCache
 
 DEFAULT_MODEL_ARN = os.getenv(
     "AWS_KB_MODEL_ARN",
@@ -20,14 +31,41 @@ DEFAULT_MODEL_ARN = os.getenv(
 )
 
 
+DEFAULT_MAX_WORKERS = int(os.getenv("AWS_KB_MAX_WORKERS", "8"))
+
+
 class BedrockKnowledgeBase:
-    def __init__(self, kb_id: str, model_arn: str | None = None, region: str | None = None):
+    def __init__(
+        self,
+        kb_id: str,
+        model_arn: str | None = None,
+        region: str | None = None,
+        max_workers: int | None = None,
+        cache: RetrievalCache | None = None,
+        context_token_budget: int | None = None,
+        tag_sources: bool = True,
+    ):
         if not kb_id:
             raise ValueError("kb_id is required for BedrockKnowledgeBase")
         self.kb_id = kb_id
         self.model_arn = model_arn or DEFAULT_MODEL_ARN
         self.region = region or os.getenv("AWS_REGION", "us-west-2")
-        self.client = boto3.client("bedrock-agent-runtime", region_name=self.region)
+        max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.client = boto3.client(
+            "bedrock-agent-runtime",
+            region_name=self.region,
+            config=Config(max_pool_connections=max_workers),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock-kb")
+        # KB data syncs outside the app, so this cache is TTL-bounded rather than version-checked
+        self._cache = cache
+        self._context_token_budget = context_token_budget
+        self._tag_sources = tag_sources
+
+    async def _call(self, method, **kwargs):
+        """Run a blocking boto3 client method on the adapter's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, **kwargs))
 
     async def retrieve(self, user_query: str, session_id: str | None = None) -> dict:
         """Call RetrieveAndGenerate and normalize response to {text, sources, raw}."""
@@ -44,7 +82,7 @@ class BedrockKnowledgeBase:
         if session_id:
             payload["sessionConfiguration"] = {"sessionId": session_id}
 
-        resp = self.client.retrieve_and_generate(**payload)
+        resp = await self._call(self.client.retrieve_and_generate, **payload)
 
         output_text = resp.get("output", {}).get("text", "")
         citations = resp.get("citations", []) or []
@@ -80,7 +118,14 @@ class BedrockKnowledgeBase:
         Uses the Retrieve API so the LLM adapter handles generation with full
         conversation history, avoiding double-invocation.
         """
-        resp = self.client.retrieve(
+        version = 0
+        if self._cache:
+            cached, version = await self._cache.lookup(user_query, locale, k)
+            if cached is not None:
+                return cached
+
+        resp = await self._call(
+            self.client.retrieve,
             knowledgeBaseId=self.kb_id,
             retrievalQuery={"text": user_query},
             retrievalConfiguration={
@@ -118,18 +163,16 @@ class BedrockKnowledgeBase:
                     "human_readable": mapping.get("description", filename),
                 })
 
-        return {"documents": documents, "sources": sources}
+        result = {"documents": documents, "sources": sources}
+        if self._cache:
+            self._cache.store(user_query, locale, k, result, version)
+        return result
 
     async def knowledge_to_string(self, docs: dict, doc_field: str = "documents") -> str:
         """
-        For API parity with RAGManager: flatten the docs' text.
+        For API parity with RAGManager: deduplicated, source-tagged, token-budgeted context.
         """
         documents = docs.get(doc_field, [])
         if not documents:
             return ""
-        parts = []
-        for d in documents:
-            text = getattr(d, "page_content", "") or ""
-            if text:
-                parts.append(text)
-        return " ".join(parts)
+        return build_context(documents, token_budget=self._context_token_budget, tag_sources=self._tag_sources)
@@ -8,8 +8,9 @@ import asyncio
 
 
 class OpenAIAdapter(ModelAdapter):
-    def __init__(self, model_id="gpt-3.5-turbo", region=None, *args, **kwargs):
-        self.embeddings = OpenAIEmbeddings()
+    def __init__(self, model_id="gpt-3.5-turbo", region=None, embeddings=None, *args, **kwargs):
+        # main.py passes the configured embeddings (RAG_EMBEDDING_MODEL / RAG_EMBEDDING_DIMENSIONS)
+        self.embeddings = embeddings or OpenAIEmbeddings()
         self.model_id=model_id
         self.client = OpenAI()
         super().__init__(*args,**kwargs)
@@ -19,7 +19,17 @@ from fastapi.middleware.cors import CORSMiddleware  # ✅ ADDED: CORS middleware
 from managers.memory_manager import MemoryManager
 from managers.rag_manager import RAGManager
 from sources_verifier import should_show_sources
-from managers.pgvector_store import PgVectorStore
+from managers.pgvector_store import PgVectorStore, CONTENT_TSV_DDL, CONTENT_TSV_INDEX_DDL
+from managers.vector_index import VectorIndexManager
+from managers.vector_store import VectorStoreBase
+from managers.corpus_version import ensure_corpus_version_table
+from managers.compression import SENTENCE_EMBEDDINGS_DDL, SentenceCompressor
+from managers.facets import ensure_facet_columns
+from managers.document_index import ensure_document_table
+from managers.document_lifecycle import SOURCE_INDEX_DDL
+from managers.embeddings import default_spec, ensure_settings_table, get_active_spec, make_embeddings
+from managers.retrieval_cache import RetrievalCache
+from managers.invalidation_bus import InvalidationBus
 from managers.s3_manager import S3Manager
 
 from adapters.openai import OpenAIAdapter
@@ -233,7 +243,7 @@ TRANSCRIPT_BUCKET_NAME=os.getenv("TRANSCRIPT_BUCKET_NAME")
 
 # adapter choices
 ADAPTERS: dict[str, object] = {
-    "openai-gpt4.1": OpenAIAdapter("gpt-4.1"),
+    "openai-gpt4.1": OpenAIAdapter("gpt-4.1", embeddings=make_embeddings()),
 }
 
 # Set adapter choice
@@ -260,6 +270,61 @@ db_port = os.getenv("DB_PORT", "5432")
 
 POSTGRES_ENABLED = bool(DATABASE_URL) or all([db_host, db_user, db_password, db_name])
 
+# ANN index type (RAG_INDEX_TYPE=ivfflat|hnsw), query-time recall target (RAG_RECALL_TARGET)
+# and optional quantized candidate index with exact re-scoring (RAG_QUANTIZATION=halfvec|binary)
+VECTOR_INDEX = VectorIndexManager()
+
+# Hybrid lexical + vector retrieval (reciprocal rank fusion) for these locales, e.g. RAG_HYBRID_LOCALES=en,es
+RAG_HYBRID_LOCALES = [loc.strip() for loc in os.getenv("RAG_HYBRID_LOCALES", "").split(",") if loc.strip()]
+RAG_HYBRID_VECTOR_CANDIDATES = int(os.getenv("RAG_HYBRID_VECTOR_CANDIDATES", "40"))
+RAG_HYBRID_LEXICAL_CANDIDATES = int(os.getenv("RAG_HYBRID_LEXICAL_CANDIDATES", "40"))
+# Two-stage retrieval (off by default): pick this many documents by centroid (rag_documents), then search only their chunks
+RAG_DOCUMENT_CANDIDATES = int(os.getenv("RAG_DOCUMENT_CANDIDATES", "0"))
+
+# RAG_BACKEND=mmap serves vector search from memory-mapped per-locale snapshots of rag_chunks (Postgres stays the source of truth)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "pgvector").lower()
+RAG_SNAPSHOT_DIR = os.getenv("RAG_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_snapshots"))
+RAG_SNAPSHOT_DTYPE = os.getenv("RAG_SNAPSHOT_DTYPE", "float32")
+RAG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("RAG_SNAPSHOT_REFRESH_SECONDS", "30"))
+
+# Embedding model / dimensions (RAG_EMBEDDING_MODEL, RAG_EMBEDDING_DIMENSIONS) for new installs; after a
+# scripts/reembed_corpus.py swap the spec recorded in rag_settings wins.
+EMBEDDING_SPEC = default_spec()
+# How often workers re-read the active embedding spec (switched by scripts/reembed_corpus.py swap)
+RAG_EMBEDDING_SPEC_REFRESH_SECONDS = float(os.getenv("RAG_EMBEDDING_SPEC_REFRESH_SECONDS", "60"))
+
+# Retrieval result cache (0 entries disables); pgvector entries are dropped when the corpus version moves,
+# Bedrock KB entries only expire by TTL
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1024"))
+RAG_CACHE_TTL_SECONDS = float(os.getenv("RAG_CACHE_TTL_SECONDS", "3600"))
+RAG_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("RAG_CACHE_VERSION_CHECK_SECONDS", "5"))
+# Corpus changes are pushed to every worker over LISTEN/NOTIFY; this is the fallback poll interval
+RAG_INVALIDATION_POLL_SECONDS = float(os.getenv("RAG_INVALIDATION_POLL_SECONDS", "30"))
+
+# Adaptive k (off by default): drop chunks below a cosine similarity, allow up to RAG_MAX_K when they are
+# relevant, and stop adding chunks once the context token budget is spent
+RAG_MIN_SIMILARITY = float(os.getenv("RAG_MIN_SIMILARITY")) if os.getenv("RAG_MIN_SIMILARITY") else None
+RAG_MAX_K = int(os.getenv("RAG_MAX_K", "0"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "0"))
+# Prefix each kb_data passage with "[Source: <file>]"
+RAG_TAG_SOURCES = os.getenv("RAG_TAG_SOURCES", "true").lower() in ("1", "true", "yes")
+# Query-focused sentence compression of kb_data for these endpoints, e.g. RAG_COMPRESSION_ENDPOINTS=chat_api,riverbot_chat_api
+RAG_COMPRESSION_ENDPOINTS = {e.strip().strip("/") for e in os.getenv("RAG_COMPRESSION_ENDPOINTS", "").split(",") if e.strip()}
+RAG_COMPRESSION_TOKEN_BUDGET = int(os.getenv("RAG_COMPRESSION_TOKEN_BUDGET", "600"))
+RAG_COMPRESSION_MIN_SIMILARITY = (
+    float(os.getenv("RAG_COMPRESSION_MIN_SIMILARITY")) if os.getenv("RAG_COMPRESSION_MIN_SIMILARITY") else None
+)
+# Diversification (off by default): MMR over RAG_MMR_CANDIDATES over-fetched chunks, e.g. RAG_MMR_LAMBDA=0.7,
+# and/or at most RAG_MAX_CHUNKS_PER_SOURCE chunks from one PDF
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA")) if os.getenv("RAG_MMR_LAMBDA") else None
+RAG_MMR_CANDIDATES = int(os.getenv("RAG_MMR_CANDIDATES", "20"))
+RAG_MAX_CHUNKS_PER_SOURCE = int(os.getenv("RAG_MAX_CHUNKS_PER_SOURCE", "0"))
+RAG_DUPLICATE_SIMILARITY = float(os.getenv("RAG_DUPLICATE_SIMILARITY")) if os.getenv("RAG_DUPLICATE_SIMILARITY") else None
+# Facet pre-filtering (off by default): restrict the search to the regions / doc_type / publisher named in the
+# query, e.g. RAG_FACET_FILTERS=regions,publisher; below RAG_FACET_MIN_HITS results unfiltered ones are added
+RAG_FACET_FILTERS = [f.strip() for f in os.getenv("RAG_FACET_FILTERS", "").split(",") if f.strip()]
+RAG_FACET_MIN_HITS = int(os.getenv("RAG_FACET_MIN_HITS", "2"))
+
 DB_PARAMS = {
     "dbname": db_name,
     "user": db_user,
@@ -326,13 +391,13 @@ def _ensure_rag_chunks_table():
         cur = conn.cursor()
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
         logging.info("pgvector extension enabled (or already present).")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS rag_chunks (
                 id TEXT PRIMARY KEY,
                 doc_id TEXT,
                 chunk_index INT,
                 content TEXT NOT NULL,
-                embedding vector(1536),
+                embedding vector({int(EMBEDDING_SPEC.dimensions)}),
                 metadata JSONB,
                 content_hash TEXT,
                 locale TEXT NOT NULL,
@@ -343,19 +408,48 @@ def _ensure_rag_chunks_table():
             "CREATE INDEX IF NOT EXISTS idx_rag_chunks_doc_id ON rag_chunks (doc_id);",
             "CREATE INDEX IF NOT EXISTS idx_rag_chunks_metadata ON rag_chunks USING GIN (metadata);",
             "CREATE INDEX IF NOT EXISTS idx_rag_chunks_locale ON rag_chunks (locale);",
+            # metadata->>'source' lookups (delete by source); the GIN index only serves @>
+            SOURCE_INDEX_DDL,
+            # Full-text column + GIN index for hybrid (lexical + vector) retrieval
+            CONTENT_TSV_DDL,
+            CONTENT_TSV_INDEX_DDL,
         ):
             try:
                 cur.execute(idx)
             except Exception as idx_e:
                 logging.warning("Could not create RAG index (non-fatal): %s", idx_e)
         try:
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS rag_chunks_embedding_idx
-                ON rag_chunks USING ivfflat (embedding vector_cosine_ops)
-                WITH (lists = 100);
-            """)
-        except Exception as ivf_e:
-            logging.warning("Could not create ivfflat index (table may be empty): %s", ivf_e)
+            ensure_settings_table(cur)
+            active_spec = get_active_spec(cur)
+            if active_spec:
+                # The corpus was re-embedded; index expressions must use the live column size
+                VECTOR_INDEX.dimensions = active_spec.dimensions
+        except Exception as spec_e:
+            logging.warning("Could not read rag_settings (non-fatal): %s", spec_e)
+        try:
+            # One partial ANN index per locale; ivfflat is deferred until a locale has enough rows to train lists
+            VECTOR_INDEX.ensure_indexes(cur)
+        except Exception as ann_e:
+            logging.warning("Could not create ANN index (non-fatal): %s", ann_e)
+        try:
+            ensure_corpus_version_table(cur)
+        except Exception as ver_e:
+            logging.warning("Could not create rag_corpus_version table (non-fatal): %s", ver_e)
+        try:
+            cur.execute(SENTENCE_EMBEDDINGS_DDL)
+        except Exception as sent_e:
+            logging.warning("Could not create rag_sentence_embeddings table (non-fatal): %s", sent_e)
+        try:
+            # regions / doc_type / publisher columns for facet-filtered retrieval
+            ensure_facet_columns(cur)
+        except Exception as facet_e:
+            logging.warning("Could not add rag_chunks facet columns (non-fatal): %s", facet_e)
+        if RAG_DOCUMENT_CANDIDATES:
+            try:
+                # Built from the existing chunks on first start; writers keep it current afterwards
+                ensure_document_table(cur)
+            except Exception as doc_e:
+                logging.warning("Could not create rag_documents (non-fatal): %s", doc_e)
         cur.close()
         conn.close()
         logging.info("rag_chunks table ready.")
@@ -363,32 +457,138 @@ def _ensure_rag_chunks_table():
         logging.warning("Could not ensure rag_chunks table (non-fatal): %s", e)
 
 
+def _retrieval_cache(version_fn=None) -> RetrievalCache:
+    return RetrievalCache(
+        max_entries=RAG_CACHE_SIZE,
+        ttl_seconds=RAG_CACHE_TTL_SECONDS or None,
+        version_fn=version_fn,
+        version_check_interval=RAG_CACHE_VERSION_CHECK_SECONDS,
+    )
+
+
 # RAG backend selection: Bedrock KB if configured, else pgvector
 def get_vector_store_or_kb():
     if AWS_KB_ID:
         logging.info("Using Bedrock Knowledge Base %s (region=%s)", AWS_KB_ID, AWS_REGION)
-        return BedrockKnowledgeBase(kb_id=AWS_KB_ID, model_arn=AWS_KB_MODEL_ARN, region=AWS_REGION)
+        return BedrockKnowledgeBase(
+            kb_id=AWS_KB_ID,
+            model_arn=AWS_KB_MODEL_ARN,
+            region=AWS_REGION,
+            cache=_retrieval_cache(),
+            context_token_budget=RAG_CONTEXT_TOKEN_BUDGET,
+            tag_sources=RAG_TAG_SOURCES,
+        )
 
     if not POSTGRES_ENABLED:
         raise ValueError(
             "RAG requires PostgreSQL: set DATABASE_URL (RAG-only) or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME."
         )
+    store_kwargs = dict(
+        embedding_function=embeddings,
+        index_manager=VECTOR_INDEX,
+        hybrid_locales=RAG_HYBRID_LOCALES,
+        hybrid_vector_candidates=RAG_HYBRID_VECTOR_CANDIDATES,
+        hybrid_lexical_candidates=RAG_HYBRID_LEXICAL_CANDIDATES,
+        embedding_spec=EMBEDDING_SPEC,
+        spec_refresh_interval=RAG_EMBEDDING_SPEC_REFRESH_SECONDS,
+        document_candidates=RAG_DOCUMENT_CANDIDATES,
+    )
     if DATABASE_URL:
-        return PgVectorStore(db_url=DATABASE_URL, embedding_function=embeddings)
-    return PgVectorStore(db_params=DB_PARAMS, embedding_function=embeddings)
+        store = PgVectorStore(db_url=DATABASE_URL, **store_kwargs)
+    else:
+        store = PgVectorStore(db_params=DB_PARAMS, **store_kwargs)
+    if RAG_BACKEND == "mmap":
+        from managers.mmap_vector_store import MmapVectorStore
+
+        logging.info("Using memory-mapped vector snapshots in %s", RAG_SNAPSHOT_DIR)
+        return MmapVectorStore(
+            store,
+            snapshot_dir=RAG_SNAPSHOT_DIR,
+            dtype=RAG_SNAPSHOT_DTYPE,
+            refresh_interval=RAG_SNAPSHOT_REFRESH_SECONDS,
+        )
+    return store
 
 
 # Ensure rag_chunks table exists only when using pgvector
 if not AWS_KB_ID:
     _ensure_rag_chunks_table()
 
+retrieval_cache = None
 try:
     backend = get_vector_store_or_kb()
-    knowledge_base = RAGManager(backend) if isinstance(backend, PgVectorStore) else backend
+    if isinstance(backend, VectorStoreBase):
+        retrieval_cache = _retrieval_cache(getattr(backend, "aget_corpus_version", None))
+        knowledge_base = RAGManager(
+            backend,
+            cache=retrieval_cache,
+            min_similarity=RAG_MIN_SIMILARITY,
+            max_k=RAG_MAX_K,
+            token_budget=RAG_CONTEXT_TOKEN_BUDGET,
+            mmr_lambda=RAG_MMR_LAMBDA,
+            mmr_candidates=RAG_MMR_CANDIDATES,
+            max_per_source=RAG_MAX_CHUNKS_PER_SOURCE,
+            duplicate_similarity=RAG_DUPLICATE_SIMILARITY,
+            tag_sources=RAG_TAG_SOURCES,
+            facet_filters=RAG_FACET_FILTERS,
+            facet_min_hits=RAG_FACET_MIN_HITS,
+        )
+    else:
+        knowledge_base = backend
 except Exception as e:
     knowledge_base = None
     logging.warning("RAG disabled: %s", e)
 
+context_compressor = None
+if knowledge_base and RAG_COMPRESSION_ENDPOINTS:
+    _compression_source = getattr(backend, "source", backend)
+    context_compressor = SentenceCompressor(
+        # Sentence embeddings are cached in Postgres when there is one; Bedrock KB caches in memory
+        store=_compression_source if isinstance(_compression_source, PgVectorStore) else None,
+        embedding_function=embeddings,
+        token_budget=RAG_COMPRESSION_TOKEN_BUDGET,
+        min_similarity=RAG_COMPRESSION_MIN_SIMILARITY,
+    )
+
+
+async def _kb_context(endpoint: str, user_query: str, docs: dict) -> str:
+    """kb_data for an endpoint; reduced to the sentences most relevant to the query where enabled."""
+    if context_compressor and endpoint in RAG_COMPRESSION_ENDPOINTS and docs and docs.get("documents"):
+        docs = {**docs, "documents": await context_compressor.compress(user_query, docs["documents"])}
+    return await knowledge_base.knowledge_to_string(docs)
+
+
+def _invalidation_bus(backend) -> InvalidationBus:
+    """Evict this worker's corpus-derived caches as soon as any process changes rag_chunks."""
+    if DATABASE_URL:
+        bus = InvalidationBus(db_url=DATABASE_URL, poll_interval=RAG_INVALIDATION_POLL_SECONDS)
+    else:
+        bus = InvalidationBus(db_params=DB_PARAMS, poll_interval=RAG_INVALIDATION_POLL_SECONDS)
+    if retrieval_cache is not None:
+        bus.subscribe(lambda version, doc_ids: retrieval_cache.invalidate(version))
+    source = getattr(backend, "source", backend)
+    if hasattr(backend, "invalidate"):
+        bus.subscribe(lambda version, doc_ids: backend.invalidate())
+    if isinstance(source, PgVectorStore):
+        bus.subscribe(lambda version, doc_ids: source.expire_embedding_spec())
+    return bus
+
+
+# Only the Postgres-backed stores have a corpus version to listen for
+invalidation_bus = _invalidation_bus(backend) if retrieval_cache is not None else None
+
+
+@app.on_event("startup")
+async def startup_invalidation_bus():
+    if invalidation_bus:
+        invalidation_bus.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_invalidation_bus():
+    if invalidation_bus:
+        await invalidation_bus.stop()
+
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "supersecurepassword"
 
@@ -895,7 +1095,7 @@ async def riverbot_chat_action_items_api_post(request: Request, background_tasks
 
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL with pgvector.")
-    doc_content_str = await knowledge_base.knowledge_to_string({"documents": docs})
+    doc_content_str = await _kb_context("riverbot_chat_actionItems_api", user_query, {"documents": docs})
 
     llm_body=await llm_adapter.get_llm_nextsteps_body( kb_data=doc_content_str,user_query=user_query,bot_response=bot_response, endpoint_type="riverbot" )
     response_content = await llm_adapter.generate_response(llm_body=llm_body)
@@ -954,7 +1154,7 @@ async def chat_action_items_api_post(
 
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL with pgvector.")
-    doc_content_str = await knowledge_base.knowledge_to_string({"documents": docs})
+    doc_content_str = await _kb_context("chat_actionItems_api", user_query, {"documents": docs})
 
     llm_body=await llm_adapter.get_llm_nextsteps_body(
         kb_data=doc_content_str,
@@ -1011,7 +1211,7 @@ async def riverbot_chat_detailed_api_post(request: Request, background_tasks:Bac
 
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL with pgvector.")
-    doc_content_str = await knowledge_base.knowledge_to_string({"documents": docs})
+    doc_content_str = await _kb_context("riverbot_chat_detailed_api", user_query, {"documents": docs})
 
     llm_body=await llm_adapter.get_llm_detailed_body( kb_data=doc_content_str,user_query=user_query,bot_response=bot_response, endpoint_type="riverbot" )
     response_content = await llm_adapter.generate_response(llm_body=llm_body)
@@ -1070,7 +1270,7 @@ async def chat_detailed_api_post(
 
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL with pgvector.")
-    doc_content_str = await knowledge_base.knowledge_to_string({"documents": docs})
+    doc_content_str = await _kb_context("chat_detailed_api", user_query, {"documents": docs})
 
     llm_body=await llm_adapter.get_llm_detailed_body(
         kb_data=doc_content_str,
@@ -1180,7 +1380,7 @@ async def chat_api_post(
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL (DATABASE_URL or DB_*) with pgvector.")
     docs = await knowledge_base.ann_search(user_query, locale=language)
-    doc_content_str = await knowledge_base.knowledge_to_string(docs)
+    doc_content_str = await _kb_context("chat_api", user_query, docs)
     logging.info(f"🔍 RAG Search ({language}): Found {len(docs.get('documents', []))} documents, {len(docs.get('sources', []))} sources")
     
     if docs.get('sources'):
@@ -1275,7 +1475,7 @@ async def riverbot_chat_api_post(request: Request, user_query: Annotated[str, Fo
     if not knowledge_base:
         raise HTTPException(503, "RAG is not available. Configure PostgreSQL (DATABASE_URL or DB_*) with pgvector.")
     docs = await knowledge_base.ann_search(user_query, locale=language)
-    doc_content_str = await knowledge_base.knowledge_to_string(docs)
+    doc_content_str = await _kb_context("riverbot_chat_api", user_query, docs)
     logging.info(f"🔍 RAG Search ({language}): Found {len(docs.get('documents', []))} documents, {len(docs.get('sources', []))} sources")
     
     if docs.get('sources'):
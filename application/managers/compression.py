@@ -0,0 +1,268 @@
+"""
+Query-focused extractive compression of retrieved chunks.
+
+Most of a ~1,500-character chunk is unrelated to the question. Between retrieval
+and prompt building, chunks are split into sentences, every sentence is scored
+against the query embedding with one matrix-vector product, and only the best
+sentences (within a token budget) are kept, in their original order.
+
+Sentence embeddings are keyed by sentence hash and embedding spec in
+rag_sentence_embeddings. Ingestion fills that table when RAG_SENTENCE_EMBEDDINGS
+is on (PgVectorStore.add_documents): the missing sentences are embedded before
+the write transaction opens and only inserted inside it. At query time only the
+query and any sentences never seen before are embedded, in a single request. Overlapping
+chunks share sentences, so each is stored and scored once.
+"""
+import copy
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from managers.embeddings import EmbeddingSpec
+from managers.tokens import count_tokens
+
+SENTENCE_EMBEDDINGS_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_sentence_embeddings (
+        content_hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        dimensions INT NOT NULL,
+        embedding vector NOT NULL,
+        PRIMARY KEY (content_hash, model, dimensions)
+    );
+"""
+
+_SELECT_SQL = """
+    SELECT content_hash, embedding FROM rag_sentence_embeddings
+    WHERE model = %s AND dimensions = %s AND content_hash = ANY(%s);
+"""
+_INSERT_SQL = """
+    INSERT INTO rag_sentence_embeddings (content_hash, model, dimensions, embedding)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT DO NOTHING;
+"""
+
+# Sentence ends (Latin punctuation) or blank lines; Spanish ¿/¡ openers stay with their sentence
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+# Fragments shorter than this (list bullets, page numbers) are folded into the next sentence
+MIN_SENTENCE_CHARS = 25
+
+
+def sentence_embeddings_enabled() -> bool:
+    """Whether ingestion also stores sentence embeddings (read lazily, after .env is loaded)."""
+    return os.getenv("RAG_SENTENCE_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS) -> List[str]:
+    sentences: List[str] = []
+    pending = ""
+    for part in _SENTENCE_END_RE.split(text or ""):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def sentence_hash(sentence: str) -> str:
+    return hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+
+
+def _missing_sentences(texts: Sequence[str], known: set) -> Dict[str, str]:
+    missing: Dict[str, str] = {}
+    for text in texts:
+        for sentence in split_sentences(text):
+            h = sentence_hash(sentence)
+            if h not in known and h not in missing:
+                missing[h] = sentence
+    return missing
+
+
+def missing_sentences(cur, texts: Sequence[str], spec: EmbeddingSpec) -> Dict[str, str]:
+    """Sentences of texts (by hash) with no stored embedding for spec yet."""
+    hashes = list({sentence_hash(s) for t in texts for s in split_sentences(t)})
+    if not hashes:
+        return {}
+    cur.execute(_SELECT_SQL, (spec.model, spec.dimensions, hashes))
+    return _missing_sentences(texts, {row[0] for row in cur.fetchall()})
+
+
+async def amissing_sentences(cur, texts: Sequence[str], spec: EmbeddingSpec) -> Dict[str, str]:
+    hashes = list({sentence_hash(s) for t in texts for s in split_sentences(t)})
+    if not hashes:
+        return {}
+    await cur.execute(_SELECT_SQL, (spec.model, spec.dimensions, hashes))
+    return _missing_sentences(texts, {row[0] for row in await cur.fetchall()})
+
+
+def sentence_rows(missing: Dict[str, str], vectors: Sequence[Any]) -> List[Tuple[str, np.ndarray]]:
+    """(hash, embedding) rows for insert_sentence_embeddings from missing_sentences() and their vectors."""
+    return [(h, np.asarray(v, dtype=np.float32)) for h, v in zip(missing, vectors)]
+
+
+def insert_sentence_embeddings(cur, rows: Sequence[Tuple[str, Any]], spec: EmbeddingSpec) -> None:
+    """Store embedded sentences (no network calls: safe inside a write transaction)."""
+    if rows:
+        cur.executemany(_INSERT_SQL, [(h, spec.model, spec.dimensions, v) for h, v in rows])
+
+
+async def ainsert_sentence_embeddings(cur, rows: Sequence[Tuple[str, Any]], spec: EmbeddingSpec) -> None:
+    if rows:
+        await cur.executemany(_INSERT_SQL, [(h, spec.model, spec.dimensions, v) for h, v in rows])
+
+
+class SentenceCompressor:
+    """Keeps the sentences of retrieved chunks most similar to the query, within a token budget."""
+
+    def __init__(
+        self,
+        store: Optional[Any] = None,
+        embedding_function: Optional[Any] = None,
+        token_budget: int = 600,
+        min_similarity: Optional[float] = None,
+        memory_entries: int = 20000,
+    ):
+        """
+        store: PgVectorStore whose embedding function/spec are used and whose database holds the
+        sentence cache. Without one, embedding_function is used and sentences are cached in memory only.
+        """
+        if store is None and embedding_function is None:
+            raise ValueError("Provide a store or an embedding_function")
+        self._store = store
+        self._embedding_function = embedding_function
+        self._token_budget = token_budget
+        self._min_similarity = min_similarity
+        self._memory: "OrderedDict[Tuple[str, EmbeddingSpec], np.ndarray]" = OrderedDict()
+        self._memory_entries = memory_entries
+
+    def _embedder(self) -> Tuple[Any, Optional[EmbeddingSpec]]:
+        if self._store is not None:
+            return self._store.embedding_function, self._store.embedding_spec
+        return self._embedding_function, None
+
+    def _remember(self, key, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    async def _db_lookup(self, hashes: List[str], spec: EmbeddingSpec) -> Dict[str, np.ndarray]:
+        async with await self._store._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(_SELECT_SQL, (spec.model, spec.dimensions, hashes))
+                return {h: np.asarray(v, dtype=np.float32) for h, v in await cur.fetchall()}
+
+    async def _db_store(self, rows: List[Tuple[str, np.ndarray]], spec: EmbeddingSpec) -> None:
+        async with await self._store._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(_INSERT_SQL, [(h, spec.model, spec.dimensions, v) for h, v in rows])
+            await conn.commit()
+
+    async def _embed(self, query: str, sentences: Dict[str, str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Query vector and sentence vectors: memory, then the database, then one embeddings request."""
+        embedding_function, spec = self._embedder()
+        vectors: Dict[str, np.ndarray] = {}
+        for h in sentences:
+            cached = self._memory.get((h, spec))
+            if cached is not None:
+                vectors[h] = cached
+        if self._store is not None:
+            pending = [h for h in sentences if h not in vectors]
+            if pending:
+                try:
+                    vectors.update(await self._db_lookup(pending, spec))
+                except Exception as e:
+                    logging.warning("Sentence embedding cache unavailable: %s", e)
+        missing = [h for h in sentences if h not in vectors]
+        embedded = await embedding_function.aembed_documents([query] + [sentences[h] for h in missing])
+        query_vector = np.asarray(embedded[0], dtype=np.float32)
+        new_rows = [(h, np.asarray(v, dtype=np.float32)) for h, v in zip(missing, embedded[1:])]
+        vectors.update(new_rows)
+        for h, v in vectors.items():
+            self._remember((h, spec), v)
+        if new_rows and self._store is not None:
+            try:
+                await self._db_store(new_rows, spec)
+            except Exception as e:
+                logging.warning("Could not store %s sentence embedding(s): %s", len(new_rows), e)
+        return query_vector, vectors
+
+    async def _score(self, text: str, docs: List[Any]):
+        """(entries, sentences by hash, cosine score by hash) of docs' sentences against text, or None."""
+        entries: List[Tuple[int, str, str]] = []  # (doc position, hash, sentence)
+        sentences: Dict[str, str] = {}
+        for d, doc in enumerate(docs):
+            for sentence in split_sentences(getattr(doc, "page_content", "") or ""):
+                h = sentence_hash(sentence)
+                entries.append((d, h, sentence))
+                sentences.setdefault(h, sentence)
+        if not sentences:
+            return None
+        query_vector, vectors = await self._embed(text, sentences)
+        hashes = list(sentences)
+        matrix = np.stack([vectors[h] for h in hashes])
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        return entries, sentences, dict(zip(hashes, (matrix @ query_vector).tolist()))
+
+    async def sentence_scores(self, text: str, docs: List[Any]) -> Dict[str, float]:
+        """Cosine similarity of every sentence in docs to text (used by the compression benchmark)."""
+        scored = await self._score(text, docs)
+        if scored is None:
+            return {}
+        _, sentences, scores = scored
+        return {sentences[h]: score for h, score in scores.items()}
+
+    async def compress(self, query: str, docs: List[Any]) -> List[Any]:
+        """
+        Documents (same metadata, same order) holding only their selected sentences; documents with
+        no selected sentence are dropped. Returns docs unchanged if nothing can be scored.
+        """
+        try:
+            scored = await self._score(query, docs)
+        except Exception as e:
+            logging.error("Context compression failed, using full chunks: %s", e, exc_info=True)
+            return docs
+        if scored is None:
+            return docs
+        entries, sentences, scores = scored
+
+        kept = set()
+        used = 0
+        for h in sorted(sentences, key=scores.__getitem__, reverse=True):
+            if self._min_similarity is not None and scores[h] < self._min_similarity and kept:
+                break
+            tokens = count_tokens(sentences[h])
+            if kept and used + tokens > self._token_budget:
+                continue
+            kept.add(h)
+            used += tokens
+
+        # Rebuild in document order; a sentence shared by overlapping chunks is kept in the first only
+        texts: Dict[int, List[str]] = {}
+        emitted = set()
+        for d, h, sentence in entries:
+            if h in kept and h not in emitted:
+                emitted.add(h)
+                texts.setdefault(d, []).append(sentence)
+        compressed = []
+        for d, doc in enumerate(docs):
+            if d in texts:
+                doc = copy.copy(doc)
+                doc.page_content = " ".join(texts[d])
+                compressed.append(doc)
+        before = sum(count_tokens(getattr(doc, "page_content", "") or "") for doc in docs)
+        logging.info("Compressed context from ~%s to ~%s tokens (%s of %s sentences)", before, used, len(kept), len(sentences))
+        return compressed
@@ -0,0 +1,135 @@
+"""
+Build the kb_data prompt context from retrieved chunks.
+
+Chunks are split with chunk_overlap=150, so two adjacent chunks of one document
+repeat up to ~150 characters. The builder groups chunks by document, merges
+runs of adjacent chunk_index values into one passage with the overlapping text
+removed, orders passages by their best-ranked chunk, tags each with its source
+and stops at a token budget (truncating the passage that crosses it).
+
+Chunks without doc_id/chunk_index (e.g. Bedrock KB) are merged with an earlier
+passage of the same source only when their text provably overlaps it.
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from managers.tokens import count_tokens, truncate_to_tokens
+
+# Overlaps shorter than this are treated as coincidence, not chunk overlap
+MIN_OVERLAP_CHARS = 20
+# Look for overlaps up to this long (chunk_overlap plus separator slack)
+MAX_OVERLAP_CHARS = 400
+# A passage truncated to fewer tokens than this is dropped instead
+MIN_PASSAGE_TOKENS = 32
+
+PASSAGE_SEPARATOR = "\n\n"
+
+
+def overlap_length(left: str, right: str, max_chars: int = MAX_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    limit = min(len(left), len(right), max_chars)
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_text(left: str, right: str, min_overlap: int = 0) -> Optional[str]:
+    """left + right with their shared overlap kept once; None if the overlap is shorter than min_overlap."""
+    if right in left:
+        return left
+    size = overlap_length(left, right)
+    if size < max(min_overlap, 1):
+        return None if min_overlap else f"{left} {right}"
+    return left + right[size:]
+
+
+def default_label(metadata: Dict[str, Any]) -> str:
+    name = metadata.get("name") or os.path.basename(str(metadata.get("source") or ""))
+    return name or "unknown"
+
+
+class _Passage:
+    __slots__ = ("key", "label", "rank", "start", "end", "text")
+
+    def __init__(self, key, label: str, rank: int, index: Optional[int], text: str):
+        self.key = key
+        self.label = label
+        self.rank = rank
+        self.start = self.end = index
+        self.text = text
+
+
+def _passages(docs: List[Any], label_fn: Callable[[Dict[str, Any]], str]) -> List[_Passage]:
+    indexed: Dict[Any, List[tuple]] = {}
+    unindexed: List[tuple] = []
+    seen_texts = set()
+    for rank, doc in enumerate(docs):
+        text = (getattr(doc, "page_content", "") or "").strip()
+        if not text or text in seen_texts:
+            continue
+        seen_texts.add(text)
+        meta = getattr(doc, "metadata", {}) or {}
+        key = meta.get("doc_id") or meta.get("source") or f"#{rank}"
+        index = meta.get("chunk_index")
+        entry = (rank, index, text, label_fn(meta))
+        if isinstance(index, int):
+            indexed.setdefault(key, []).append(entry)
+        else:
+            unindexed.append((key,) + entry)
+
+    passages: List[_Passage] = []
+    for key, entries in indexed.items():
+        current = None
+        for rank, index, text, label in sorted(entries, key=lambda e: e[1]):
+            if current is not None and index == current.end + 1:
+                current.text = merge_text(current.text, text)
+                current.end = index
+                current.rank = min(current.rank, rank)
+                continue
+            current = _Passage(key, label, rank, index, text)
+            passages.append(current)
+
+    for key, rank, _, text, label in unindexed:
+        for passage in passages:
+            if passage.key != key:
+                continue
+            merged = merge_text(passage.text, text, MIN_OVERLAP_CHARS) or merge_text(text, passage.text, MIN_OVERLAP_CHARS)
+            if merged is not None:
+                passage.text = merged
+                passage.rank = min(passage.rank, rank)
+                break
+        else:
+            passages.append(_Passage(key, label, rank, None, text))
+
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def build_context(
+    docs: List[Any],
+    token_budget: Optional[int] = None,
+    tag_sources: bool = True,
+    label_fn: Callable[[Dict[str, Any]], str] = default_label,
+) -> str:
+    """
+    Merge, order, tag and budget retrieved chunks (given in relevance order) into one context string.
+    token_budget counts the tags and separators too; None or 0 means no cap.
+    """
+    parts: List[str] = []
+    used = 0
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    for passage in _passages(docs, label_fn):
+        header = f"[Source: {passage.label}]\n" if tag_sources else ""
+        part = header + passage.text
+        cost = count_tokens(part) + (separator_tokens if parts else 0)
+        if token_budget and used + cost > token_budget:
+            remaining = token_budget - used - count_tokens(header) - (separator_tokens if parts else 0)
+            if remaining >= MIN_PASSAGE_TOKENS or not parts:
+                text = truncate_to_tokens(passage.text, remaining)
+                if text:
+                    parts.append(header + text)
+            break
+        parts.append(part)
+        used += cost
+    return PASSAGE_SEPARATOR.join(parts)
@@ -0,0 +1,93 @@
+"""
+Monotonic version number for the RAG corpus (rag_chunks).
+
+Every writer bumps it in the same transaction as its change, so anything that
+caches corpus-derived data in process (vector snapshots, retrieval results) can
+tell cheaply whether it is stale. The bump also NOTIFYs CORPUS_CHANNEL with the new
+version (and the affected doc ids when they fit), delivered when the writer commits;
+managers/invalidation_bus.py turns that into immediate evictions in every worker.
+Helpers take any DB-API cursor; the a* variants take a psycopg async cursor.
+"""
+import json
+from typing import Iterable, Optional
+
+CORPUS_CHANNEL = "rag_corpus"
+# NOTIFY payloads must stay under 8000 bytes; larger doc id lists are left out
+_MAX_PAYLOAD_BYTES = 7000
+
+CORPUS_VERSION_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_corpus_version (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ DEFAULT now()
+    );
+"""
+CORPUS_VERSION_SEED_SQL = "INSERT INTO rag_corpus_version (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;"
+
+_GET_SQL = "SELECT version FROM rag_corpus_version WHERE id;"
+# Upsert so a missing seed row cannot make a writer fail; the row lock orders concurrent writers
+_BUMP_SQL = """
+    INSERT INTO rag_corpus_version (id, version) VALUES (TRUE, 1)
+    ON CONFLICT (id) DO UPDATE SET version = rag_corpus_version.version + 1, updated_at = now()
+    RETURNING version;
+"""
+_NOTIFY_SQL = "SELECT pg_notify(%s, %s);"
+
+
+def notify_payload(version: int, doc_ids: Optional[Iterable[str]] = None) -> str:
+    payload = {"version": version}
+    if doc_ids:
+        payload["doc_ids"] = sorted(set(doc_ids))
+        text = json.dumps(payload)
+        if len(text.encode("utf-8")) <= _MAX_PAYLOAD_BYTES:
+            return text
+        del payload["doc_ids"]
+    return json.dumps(payload)
+
+
+def parse_payload(payload: str) -> dict:
+    """{"version": int, "doc_ids": [...] or None}; tolerates a bare version number."""
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return {"version": None, "doc_ids": None}
+    if isinstance(data, int):
+        return {"version": data, "doc_ids": None}
+    return {"version": data.get("version"), "doc_ids": data.get("doc_ids")}
+
+
+def ensure_corpus_version_table(cur) -> None:
+    cur.execute(CORPUS_VERSION_TABLE_DDL)
+    cur.execute(CORPUS_VERSION_SEED_SQL)
+
+
+def get_corpus_version(cur) -> int:
+    cur.execute(_GET_SQL)
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def bump_corpus_version(cur, doc_ids: Optional[Iterable[str]] = None) -> int:
+    """Increment the version inside the caller's transaction and queue its NOTIFY; returns the new version."""
+    cur.execute(_BUMP_SQL)
+    version = cur.fetchone()[0]
+    cur.execute(_NOTIFY_SQL, (CORPUS_CHANNEL, notify_payload(version, doc_ids)))
+    return version
+
+
+async def aensure_corpus_version_table(cur) -> None:
+    await cur.execute(CORPUS_VERSION_TABLE_DDL)
+    await cur.execute(CORPUS_VERSION_SEED_SQL)
+
+
+async def aget_corpus_version(cur) -> int:
+    await cur.execute(_GET_SQL)
+    row = await cur.fetchone()
+    return row[0] if row else 0
+
+
+async def abump_corpus_version(cur, doc_ids: Optional[Iterable[str]] = None) -> int:
+    await cur.execute(_BUMP_SQL)
+    version = (await cur.fetchone())[0]
+    await cur.execute(_NOTIFY_SQL, (CORPUS_CHANNEL, notify_payload(version, doc_ids)))
+    return version
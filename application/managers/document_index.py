@@ -0,0 +1,188 @@
+"""
+Document-level index for two-stage retrieval.
+
+rag_documents holds one embedding per (doc_id, locale): the centroid (mean) of the
+document's chunk embeddings, computed in SQL from rag_chunks, so it costs no extra
+embedding calls and always matches the live embedding spec. Two-stage search
+first picks the top-N documents on a small per-locale HNSW index, then scores
+only those documents' chunks exactly (via idx_rag_chunks_doc_id) instead of
+running chunk-level ANN over the whole locale.
+
+Every rag_chunks writer calls refresh_documents() for the doc_ids it touched, in
+its own transaction, once the table exists. Measure recall and latency with
+scripts/benchmark_two_stage.py.
+"""
+import logging
+from typing import List, Optional, Sequence
+
+from managers.embeddings import default_spec
+from managers.vector_index import locale_literal, validate_locale
+
+DOCUMENT_INDEX_PREFIX = "rag_documents_embedding"
+
+_DOCUMENT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_documents (
+        doc_id TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        embedding vector({dimensions}) NOT NULL,
+        chunk_count INT NOT NULL,
+        updated_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (doc_id, locale)
+    );
+"""
+
+_TABLE_EXISTS_SQL = "SELECT to_regclass('rag_documents') IS NOT NULL;"
+_CHUNK_DIMENSIONS_SQL = "SELECT vector_dims(embedding) FROM rag_chunks WHERE embedding IS NOT NULL LIMIT 1;"
+
+# pgvector's avg(vector) is the centroid; cosine distance ignores its (shrunken) norm
+_REFRESH_SQL = """
+    INSERT INTO rag_documents (doc_id, locale, embedding, chunk_count, updated_at)
+    SELECT doc_id, locale, avg(embedding), count(*), now()
+    FROM rag_chunks
+    WHERE doc_id = ANY(%(doc_ids)s) AND embedding IS NOT NULL
+    GROUP BY doc_id, locale
+    ON CONFLICT (doc_id, locale) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        chunk_count = EXCLUDED.chunk_count,
+        updated_at = EXCLUDED.updated_at;
+"""
+_DELETE_STALE_SQL = """
+    DELETE FROM rag_documents d
+    WHERE d.doc_id = ANY(%(doc_ids)s)
+      AND NOT EXISTS (SELECT 1 FROM rag_chunks c WHERE c.doc_id = d.doc_id AND c.locale = d.locale);
+"""
+_REBUILD_SQL = """
+    INSERT INTO rag_documents (doc_id, locale, embedding, chunk_count)
+    SELECT doc_id, locale, avg(embedding), count(*)
+    FROM rag_chunks
+    WHERE doc_id IS NOT NULL AND embedding IS NOT NULL {where}
+    GROUP BY doc_id, locale;
+"""
+
+# Top-N documents from the document index, then exact distance over their chunks only.
+# MATERIALIZED keeps the planner from turning the chunk stage back into a filtered ANN scan.
+_TWO_STAGE_SEARCH_SQL = """
+    WITH documents AS (
+        SELECT doc_id
+        FROM rag_documents
+        WHERE locale = {locale}
+        ORDER BY embedding <=> %(embedding)s
+        LIMIT %(documents)s
+    ),
+    candidates AS MATERIALIZED (
+        SELECT id, doc_id, chunk_index, content, metadata, embedding, embedding <=> %(embedding)s AS distance
+        FROM rag_chunks
+        WHERE locale = {locale} AND doc_id IN (SELECT doc_id FROM documents){where}
+    )
+    SELECT {columns}, distance{extra}
+    FROM candidates
+    ORDER BY distance
+    LIMIT %(k)s;
+"""
+
+
+def document_index_name(locale: str) -> str:
+    return f"{DOCUMENT_INDEX_PREFIX}_{validate_locale(locale).replace('-', '_')}_idx"
+
+
+def two_stage_search_sql(
+    locale: str, columns: str = "content, metadata", with_embedding: bool = False, where: str = ""
+) -> str:
+    """
+    Document-then-chunk search. Named params: embedding, documents (top-N documents), k.
+    where is appended to the chunk stage's WHERE clause. Rows are (*columns, distance[, embedding]).
+    """
+    return _TWO_STAGE_SEARCH_SQL.format(
+        locale=locale_literal(locale),
+        where=where,
+        columns=columns,
+        extra=", embedding" if with_embedding else "",
+    )
+
+
+def document_table_exists(cur) -> bool:
+    cur.execute(_TABLE_EXISTS_SQL)
+    return bool(cur.fetchone()[0])
+
+
+async def adocument_table_exists(cur) -> bool:
+    await cur.execute(_TABLE_EXISTS_SQL)
+    return bool((await cur.fetchone())[0])
+
+
+def ensure_document_index(cur, locale: str, m: int = 16, ef_construction: int = 64) -> None:
+    """Partial HNSW index for one locale (HNSW needs no training data, so it is built right away)."""
+    cur.execute(
+        f"CREATE INDEX IF NOT EXISTS {document_index_name(locale)} ON rag_documents "
+        f"USING hnsw (embedding vector_cosine_ops) WITH (m = {int(m)}, ef_construction = {int(ef_construction)}) "
+        f"WHERE locale = {locale_literal(locale)};"
+    )
+
+
+def _locales(cur) -> List[str]:
+    cur.execute("SELECT DISTINCT locale FROM rag_documents;")
+    found = []
+    for (locale,) in cur.fetchall():
+        try:
+            found.append(validate_locale(locale))
+        except ValueError:
+            logging.warning("Skipping document index for invalid locale %r", locale)
+    return sorted(found)
+
+
+def _chunk_dimensions(cur) -> Optional[int]:
+    cur.execute(_CHUNK_DIMENSIONS_SQL)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def rebuild_documents(cur, dimensions: Optional[int] = None, locale: Optional[str] = None) -> int:
+    """
+    (Re)create rag_documents and fill it from rag_chunks (all locales, or only locale).
+    The embedding size defaults to that of the stored chunks. Run after a re-embedding
+    swap, which changes the size. Returns the number of documents.
+    """
+    dimensions = dimensions or _chunk_dimensions(cur) or default_spec().dimensions
+    if locale is None:
+        cur.execute("DROP TABLE IF EXISTS rag_documents;")
+        cur.execute(_DOCUMENT_TABLE_DDL.format(dimensions=int(dimensions)))
+        cur.execute(_REBUILD_SQL.format(where=""))
+    else:
+        cur.execute(_DOCUMENT_TABLE_DDL.format(dimensions=int(dimensions)))
+        cur.execute(f"DELETE FROM rag_documents WHERE locale = {locale_literal(locale)};")
+        cur.execute(_REBUILD_SQL.format(where=f"AND locale = {locale_literal(locale)}"))
+    count = cur.rowcount
+    for loc in _locales(cur):
+        ensure_document_index(cur, loc)
+    return count
+
+
+def ensure_document_table(cur, dimensions: Optional[int] = None) -> bool:
+    """
+    Create and fill rag_documents if it does not exist yet, else add any missing locale index.
+    Returns True when the table was built.
+    """
+    if document_table_exists(cur):
+        for locale in _locales(cur):
+            ensure_document_index(cur, locale)
+        return False
+    count = rebuild_documents(cur, dimensions)
+    logging.info("Built rag_documents with %s document(s)", count)
+    return True
+
+
+def refresh_documents(cur, doc_ids: Sequence[str]) -> None:
+    """Recompute the centroids of doc_ids and drop documents that no longer have chunks."""
+    doc_ids = sorted({d for d in doc_ids if d})
+    if not doc_ids:
+        return
+    cur.execute(_REFRESH_SQL, {"doc_ids": doc_ids})
+    cur.execute(_DELETE_STALE_SQL, {"doc_ids": doc_ids})
+
+
+async def arefresh_documents(cur, doc_ids: Sequence[str]) -> None:
+    doc_ids = sorted({d for d in doc_ids if d})
+    if not doc_ids:
+        return
+    await cur.execute(_REFRESH_SQL, {"doc_ids": doc_ids})
+    await cur.execute(_DELETE_STALE_SQL, {"doc_ids": doc_ids})
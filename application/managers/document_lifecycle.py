@@ -0,0 +1,145 @@
+"""
+Document lifecycle SQL for rag_chunks: delete whole documents and collect garbage.
+
+Deletes go by doc_id (idx_rag_chunks_doc_id) or by metadata source. The GIN index
+on metadata only serves containment (@>), not ->> equality, so source lookups get
+their own expression index, SOURCE_INDEX_DDL; without it a delete by source scans
+every chunk. Both take a list and delete in one statement (= ANY).
+
+Garbage is what an interrupted or pre-fingerprint writer can leave behind:
+chunks past their file's recorded chunk_count, fingerprints of files with no chunks
+left (the next sync re-ingests them; a file of only near-duplicates keeps its
+fingerprint) and rag_documents rows of deleted documents.
+The store's writers (managers/pgvector_store.py) call these inside their own
+transaction and bump the corpus version there.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SOURCE_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunks_source ON rag_chunks ((metadata->>'source'), locale);"
+)
+
+# locale NULL: every locale
+_LOCALE_FILTER = "(%(locale)s::text IS NULL OR {alias}locale = %(locale)s)"
+
+_DELETE_BY_DOC_ID_SQL = (
+    "DELETE FROM rag_chunks WHERE doc_id = ANY(%(doc_ids)s) AND " + _LOCALE_FILTER.format(alias="")
+    + " RETURNING doc_id, locale;"
+)
+_DELETE_BY_SOURCE_SQL = (
+    "DELETE FROM rag_chunks WHERE metadata->>'source' = ANY(%(sources)s) AND " + _LOCALE_FILTER.format(alias="")
+    + " RETURNING doc_id, locale;"
+)
+_DELETE_DOCUMENT_SQL = "DELETE FROM rag_chunks WHERE doc_id = %(doc_id)s AND locale = %(locale)s;"
+
+_STALE_CHUNKS_SQL = (
+    "DELETE FROM rag_chunks c USING rag_files f "
+    "WHERE c.doc_id = f.path AND c.locale = f.locale AND c.chunk_index >= f.chunk_count AND "
+    + _LOCALE_FILTER.format(alias="c.") + " RETURNING c.doc_id;"
+)
+_ORPHAN_FILES_SQL = (
+    "DELETE FROM rag_files f WHERE f.chunk_count > 0 AND " + _LOCALE_FILTER.format(alias="f.")
+    + " AND NOT EXISTS (SELECT 1 FROM rag_chunks c WHERE c.doc_id = f.path AND c.locale = f.locale);"
+)
+# A file whose every chunk is a near-duplicate has MinHash rows instead (managers/near_duplicates.py)
+_NOT_DEDUPLICATED = (
+    " AND NOT EXISTS (SELECT 1 FROM rag_chunk_minhash m WHERE m.doc_id = f.path AND m.locale = f.locale)"
+)
+_ORPHAN_DOCUMENTS_SQL = (
+    "DELETE FROM rag_documents d WHERE " + _LOCALE_FILTER.format(alias="d.")
+    + " AND NOT EXISTS (SELECT 1 FROM rag_chunks c WHERE c.doc_id = d.doc_id AND c.locale = d.locale);"
+)
+
+
+def ensure_source_index(cur) -> None:
+    cur.execute(SOURCE_INDEX_DDL)
+
+
+async def aensure_source_index(cur) -> None:
+    await cur.execute(SOURCE_INDEX_DDL)
+
+
+def _deleted(rows: Sequence[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """Deleted doc_ids by locale, from the RETURNING rows of a delete (one row per chunk)."""
+    by_locale: Dict[str, set] = {}
+    for doc_id, locale in rows:
+        by_locale.setdefault(locale, set()).add(doc_id)
+    return {locale: sorted(doc_ids) for locale, doc_ids in by_locale.items()}
+
+
+def _delete_params(doc_ids: Optional[Sequence[str]], sources: Optional[Sequence[str]], locale: Optional[str]):
+    if doc_ids and sources:
+        raise ValueError("Delete by doc_ids or by sources, not both")
+    if doc_ids:
+        return _DELETE_BY_DOC_ID_SQL, {"doc_ids": list(doc_ids), "locale": locale}
+    return _DELETE_BY_SOURCE_SQL, {"sources": list(sources or []), "locale": locale}
+
+
+def delete_documents(
+    cur, doc_ids: Optional[Sequence[str]] = None, sources: Optional[Sequence[str]] = None, locale: Optional[str] = None
+) -> Tuple[int, Dict[str, List[str]]]:
+    """Delete every chunk of the documents (by doc_id or metadata source); (chunks deleted, doc_ids by locale)."""
+    query, params = _delete_params(doc_ids, sources, locale)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    return len(rows), _deleted(rows)
+
+
+async def adelete_documents(
+    cur, doc_ids: Optional[Sequence[str]] = None, sources: Optional[Sequence[str]] = None, locale: Optional[str] = None
+) -> Tuple[int, Dict[str, List[str]]]:
+    query, params = _delete_params(doc_ids, sources, locale)
+    await cur.execute(query, params)
+    rows = await cur.fetchall()
+    return len(rows), _deleted(rows)
+
+
+def delete_document(cur, doc_id: str, locale: str) -> int:
+    """Delete one document's chunks ahead of writing its new ones; returns chunks deleted."""
+    cur.execute(_DELETE_DOCUMENT_SQL, {"doc_id": doc_id, "locale": locale})
+    return cur.rowcount
+
+
+async def adelete_document(cur, doc_id: str, locale: str) -> int:
+    await cur.execute(_DELETE_DOCUMENT_SQL, {"doc_id": doc_id, "locale": locale})
+    return cur.rowcount
+
+
+def _orphan_files_sql(minhash_table: bool) -> str:
+    return _ORPHAN_FILES_SQL[:-1] + _NOT_DEDUPLICATED + ";" if minhash_table else _ORPHAN_FILES_SQL
+
+
+def collect_garbage(
+    cur, locale: Optional[str] = None, documents_table: bool = False, minhash_table: bool = False
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Delete stale chunks, orphaned fingerprints and (with documents_table) orphaned
+    rag_documents rows; returns the counts and the doc_ids that lost chunks.
+    """
+    params = {"locale": locale}
+    cur.execute(_STALE_CHUNKS_SQL, params)
+    changed = sorted({row[0] for row in cur.fetchall()})
+    counts = {"stale_chunks": cur.rowcount}
+    cur.execute(_orphan_files_sql(minhash_table), params)
+    counts["orphaned_files"] = cur.rowcount
+    counts["orphaned_documents"] = 0
+    if documents_table:
+        cur.execute(_ORPHAN_DOCUMENTS_SQL, params)
+        counts["orphaned_documents"] = cur.rowcount
+    return counts, changed
+
+
+async def acollect_garbage(
+    cur, locale: Optional[str] = None, documents_table: bool = False, minhash_table: bool = False
+) -> Tuple[Dict[str, int], List[str]]:
+    params = {"locale": locale}
+    await cur.execute(_STALE_CHUNKS_SQL, params)
+    changed = sorted({row[0] for row in await cur.fetchall()})
+    counts = {"stale_chunks": cur.rowcount}
+    await cur.execute(_orphan_files_sql(minhash_table), params)
+    counts["orphaned_files"] = cur.rowcount
+    counts["orphaned_documents"] = 0
+    if documents_table:
+        await cur.execute(_ORPHAN_DOCUMENTS_SQL, params)
+        counts["orphaned_documents"] = cur.rowcount
+    return counts, changed
@@ -0,0 +1,316 @@
+"""
+Token-aware, concurrent, rate-limited embedding of document batches.
+
+EmbeddingBatcher wraps an embeddings object (OpenAIEmbeddings) and is used in its
+place by every ingestion path (PgVectorStore.add_documents, the pipelined loader,
+scripts/reembed_corpus.py):
+
+  packing      texts are packed, in order, into requests of at most max_request_tokens
+               tokens and max_request_size inputs (a text above the token ceiling goes
+               alone; OpenAIEmbeddings splits it further)
+  scheduling   requests run concurrently under requests/tokens per minute buckets
+  AIMD         the number of requests in flight grows by one per window of successful
+               requests and halves on a 429 (once per burst); a 429 also pauses every
+               request for its Retry-After (or an exponential backoff) before retrying
+  transient    5xx responses, timeouts and dropped connections are retried with
+               exponential backoff on that request alone (concurrency is unchanged)
+
+Results come back in the order of the input texts. Queries (embed_query) are passed
+straight through. Configure with make_ingestion_embeddings() / RAG_EMBED_* env vars.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from managers.embeddings import EmbeddingSpec, make_embeddings
+from managers.tokens import count_tokens
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A request larger than the bucket is let through once the bucket is full
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute; acquire() waits until both allow a request."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio primitives belong to one event loop; sync callers run a new loop per call
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait for capacity for one request of tokens; returns the seconds waited."""
+        waited = 0.0
+        async with self._get_lock():
+            while True:
+                wait = max(
+                    self._requests.wait_time(1) if self._requests else 0.0,
+                    self._tokens.wait_time(tokens) if self._tokens else 0.0,
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+                waited += wait
+            if self._requests:
+                self._requests.level -= 1
+            if self._tokens:
+                self._tokens.level -= tokens
+        return waited
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked to wait (Retry-After / retry-after-ms headers), if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return _status_code(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+# openai's exceptions for a request that never got a response
+_TRANSIENT_ERRORS = ("APIConnectionError", "APITimeoutError", "InternalServerError")
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Server errors, timeouts and connection failures: worth retrying as they are."""
+    code = _status_code(exc)
+    if code is not None:
+        return code >= 500 or code == 408
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in _TRANSIENT_ERRORS
+
+
+class EmbeddingBatcher:
+    """Drop-in embeddings wrapper that packs, schedules and throttles document embedding requests."""
+
+    def __init__(
+        self,
+        embeddings: Any,
+        max_request_tokens: int = 100_000,
+        max_request_size: Optional[int] = None,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        """
+        max_request_size defaults to the wrapped embeddings' chunk_size (OpenAIEmbeddings
+        sends at most that many inputs per HTTP request), else 1000. Concurrency starts at
+        max_concurrency and moves between min_concurrency and max_concurrency.
+        """
+        self.embeddings = embeddings
+        self._max_request_tokens = max_request_tokens
+        self._max_request_size = max_request_size or getattr(embeddings, "chunk_size", None) or 1000
+        self._max_concurrency = max(1, max_concurrency)
+        self._min_concurrency = max(1, min(min_concurrency, self._max_concurrency))
+        self._limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self.concurrency = float(self._max_concurrency)
+        self._in_flight = 0
+        self._epoch = 0  # bumped on every decrease so one 429 burst halves concurrency once
+        self._paused_until = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+        self.requests = self.tokens = self.retries = self.rate_limits = self.errors = 0
+        self.throttled_s = 0.0
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    def with_embeddings(self, embeddings: Any) -> "EmbeddingBatcher":
+        """Same scheduling state around another embeddings object (e.g. after a spec swap)."""
+        self.embeddings = embeddings
+        return self
+
+    def __getattr__(self, name: str) -> Any:
+        # model, dimensions, ... of the wrapped embeddings
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "retries": self.retries,
+            "rate_limits": self.rate_limits,
+            "errors": self.errors,
+            "throttled_s": round(self.throttled_s, 1),
+            "concurrency": round(self.concurrency, 2),
+        }
+
+    def pack(self, texts: List[str]) -> List[List[int]]:
+        """Indexes of texts grouped, in order, into requests under the token and size ceilings."""
+        requests: List[List[int]] = []
+        current: List[int] = []
+        tokens = 0
+        for i, text in enumerate(texts):
+            n = count_tokens(text)
+            if current and (tokens + n > self._max_request_tokens or len(current) >= self._max_request_size):
+                requests.append(current)
+                current, tokens = [], 0
+            current.append(i)
+            tokens += n
+        if current:
+            requests.append(current)
+        return requests
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._condition, self._loop, self._in_flight = asyncio.Condition(), loop, 0
+        return self._condition
+
+    async def _slot(self) -> int:
+        condition = self._get_condition()
+        async with condition:
+            while self._in_flight >= max(1, int(self.concurrency)):
+                await condition.wait()
+            self._in_flight += 1
+            return self._epoch
+
+    async def _release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+
+    def _succeeded(self) -> None:
+        # Additive increase: about +1 per window of `concurrency` successful requests
+        self.concurrency = min(self._max_concurrency, self.concurrency + 1.0 / self.concurrency)
+
+    def _rate_limited(self, epoch: int, exc: BaseException, attempt: int) -> float:
+        self.rate_limits += 1
+        if epoch == self._epoch:
+            self.concurrency = max(self._min_concurrency, self.concurrency / 2)
+            self._epoch += 1
+            logging.warning("Embedding rate limited; concurrency -> %.1f", self.concurrency)
+        delay = retry_after(exc)
+        if delay is None:
+            delay = self._backoff_delay(attempt)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return min(self._max_backoff, self._backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def _embed_request(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(count_tokens(t) for t in texts)
+        attempt = 0
+        backoff = 0.0
+        while True:
+            if backoff:
+                # A transient failure backs off this request only, outside any concurrency slot
+                await asyncio.sleep(backoff)
+                backoff = 0.0
+            self.throttled_s += await self._limiter.acquire(tokens)
+            epoch = await self._slot()
+            try:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self.throttled_s += pause
+                    await asyncio.sleep(pause)
+                vectors = await self.embeddings.aembed_documents(texts)
+            except Exception as e:
+                if attempt >= self._max_retries:
+                    raise
+                if is_rate_limited(e):
+                    self._rate_limited(epoch, e, attempt)
+                elif is_transient(e):
+                    self.errors += 1
+                    backoff = self._backoff_delay(attempt)
+                    logging.warning("Embedding request failed (%s); retrying in %.1fs", e, backoff)
+                else:
+                    raise
+                self.retries += 1
+                attempt += 1
+                continue
+            finally:
+                await self._release()
+            self._succeeded()
+            self.requests += 1
+            self.tokens += tokens
+            return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        groups = self.pack(texts)
+        results = await asyncio.gather(*(self._embed_request([texts[i] for i in group]) for group in groups))
+        return [vector for vectors in results for vector in vectors]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Blocking variant for scripts; must not be called from a running event loop."""
+        return asyncio.run(self.aembed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+def make_ingestion_embeddings(spec: Optional[EmbeddingSpec] = None, **overrides: Any) -> EmbeddingBatcher:
+    """
+    EmbeddingBatcher around make_embeddings(spec), configured from RAG_EMBED_MAX_REQUEST_TOKENS,
+    RAG_EMBED_CONCURRENCY, RAG_INGEST_REQUESTS_PER_MINUTE and RAG_INGEST_TOKENS_PER_MINUTE
+    (overrides win). The client's own retries are disabled so 429s reach the AIMD scheduler;
+    the batcher retries server errors, timeouts and connection failures itself.
+    """
+    options: Dict[str, Any] = {
+        "max_request_tokens": int(os.getenv("RAG_EMBED_MAX_REQUEST_TOKENS", "100000")),
+        "max_concurrency": int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+        "requests_per_minute": _env_float("RAG_INGEST_REQUESTS_PER_MINUTE"),
+        "tokens_per_minute": _env_float("RAG_INGEST_TOKENS_PER_MINUTE"),
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return EmbeddingBatcher(make_embeddings(spec, max_retries=0), **options)
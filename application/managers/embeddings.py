@@ -0,0 +1,117 @@
+"""
+Embedding model + output dimensions used for rag_chunks.
+
+The spec comes from RAG_EMBEDDING_MODEL / RAG_EMBEDDING_DIMENSIONS, but once a
+re-embedding migration (scripts/reembed_corpus.py) has swapped the corpus to a new
+spec, the active one is recorded in the rag_settings table and wins: query vectors
+must come from the same model and dimensions as the stored vectors. PgVectorStore
+re-reads it periodically so running workers follow a swap without a restart.
+
+text-embedding-3-* accept a `dimensions` parameter (Matryoshka truncation), so
+512 or 768 dimensions cut index size, memory and distance cost by 3x / 2x.
+"""
+import json
+import os
+from typing import NamedTuple, Optional
+
+from langchain_openai import OpenAIEmbeddings
+
+# Native output size; models not listed here cannot be shortened
+NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+SHORTENABLE_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+# pgvector cannot build ANN indexes on vector columns with more dimensions than this
+MAX_INDEXED_DIMENSIONS = 2000
+
+SPEC_KEY = "embedding_spec"
+
+SETTINGS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_settings (
+        key TEXT PRIMARY KEY,
+        value JSONB NOT NULL,
+        updated_at TIMESTAMPTZ DEFAULT now()
+    );
+"""
+_GET_SETTING_SQL = "SELECT value FROM rag_settings WHERE key = %s;"
+_SET_SETTING_SQL = """
+    INSERT INTO rag_settings (key, value) VALUES (%s, %s::jsonb)
+    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = now();
+"""
+
+
+class EmbeddingSpec(NamedTuple):
+    model: str
+    dimensions: int
+
+    @classmethod
+    def from_value(cls, value) -> "EmbeddingSpec":
+        if isinstance(value, str):
+            value = json.loads(value)
+        return cls(model=value["model"], dimensions=int(value["dimensions"]))
+
+
+def validate_spec(spec: EmbeddingSpec) -> EmbeddingSpec:
+    native = NATIVE_DIMENSIONS.get(spec.model)
+    if spec.dimensions <= 0:
+        raise ValueError(f"Embedding dimensions must be positive, got {spec.dimensions}")
+    if native is not None and spec.dimensions != native:
+        if spec.model not in SHORTENABLE_MODELS:
+            raise ValueError(f"{spec.model} always returns {native} dimensions")
+        if spec.dimensions > native:
+            raise ValueError(f"{spec.model} returns at most {native} dimensions, got {spec.dimensions}")
+    if spec.dimensions > MAX_INDEXED_DIMENSIONS:
+        raise ValueError(f"pgvector cannot index more than {MAX_INDEXED_DIMENSIONS} dimensions, got {spec.dimensions}")
+    return spec
+
+
+def default_spec() -> EmbeddingSpec:
+    """Spec from the environment (read at call time so .env files loaded after import apply)."""
+    return EmbeddingSpec(
+        model=os.getenv("RAG_EMBEDDING_MODEL", "text-embedding-ada-002"),
+        dimensions=int(os.getenv("RAG_EMBEDDING_DIMENSIONS", "1536")),
+    )
+
+
+def make_embeddings(spec: Optional[EmbeddingSpec] = None, **kwargs) -> OpenAIEmbeddings:
+    """OpenAIEmbeddings for the spec; `dimensions` is only sent when shortening. kwargs go to OpenAIEmbeddings."""
+    spec = validate_spec(spec or default_spec())
+    if spec.dimensions == NATIVE_DIMENSIONS.get(spec.model):
+        return OpenAIEmbeddings(model=spec.model, **kwargs)
+    return OpenAIEmbeddings(model=spec.model, dimensions=spec.dimensions, **kwargs)
+
+
+def ensure_settings_table(cur) -> None:
+    cur.execute(SETTINGS_TABLE_DDL)
+
+
+def get_setting(cur, key: str):
+    cur.execute(_GET_SETTING_SQL, (key,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_setting(cur, key: str, value) -> None:
+    cur.execute(_SET_SETTING_SQL, (key, json.dumps(value)))
+
+
+def delete_setting(cur, key: str) -> None:
+    cur.execute("DELETE FROM rag_settings WHERE key = %s;", (key,))
+
+
+def get_active_spec(cur) -> Optional[EmbeddingSpec]:
+    """Spec recorded by the last re-embedding swap, or None when the env default applies."""
+    value = get_setting(cur, SPEC_KEY)
+    return EmbeddingSpec.from_value(value) if value else None
+
+
+def set_active_spec(cur, spec: EmbeddingSpec) -> None:
+    set_setting(cur, SPEC_KEY, spec._asdict())
+
+
+async def aget_active_spec(cur) -> Optional[EmbeddingSpec]:
+    await cur.execute(_GET_SETTING_SQL, (SPEC_KEY,))
+    row = await cur.fetchone()
+    return EmbeddingSpec.from_value(row[0]) if row else None
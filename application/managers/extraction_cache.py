@@ -0,0 +1,266 @@
+"""
+Cache of extracted file text keyed by the file's SHA-256.
+
+Parsing PDFs (PyPDFLoader) is the most CPU-expensive step of ingestion. The cache
+keeps each file's normalized per-page text and page metadata, compressed, so
+re-chunking, re-embedding and locale re-runs of unchanged content skip parsing:
+
+  disk      one gzip'd JSON file per file hash under RAG_EXTRACTION_CACHE_DIR
+            (default application/.rag_extractions)
+  postgres  zlib-compressed JSON in rag_extractions, shared by every loader host
+
+Entries are also keyed by EXTRACTOR (the pypdf version and the normalization
+revision), so upgrading either re-parses instead of serving stale text; old entries
+are dropped with clear(keep_current=True). Keys are content hashes, not paths, so a
+moved or copied file hits the cache too; the path-dependent metadata (source, name,
+id) is filled in by the loader.
+
+Choose the backend with RAG_EXTRACTION_CACHE=disk|postgres|off (default disk).
+scripts/extraction_cache.py warms the cache in parallel, shows stats and invalidates it.
+Cache objects only hold paths/connection settings so they can be sent to the
+extraction worker processes.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psycopg
+
+Page = Tuple[str, Dict[str, Any]]  # (normalized text, page metadata)
+
+# Bump when normalize_text changes so cached text is re-extracted
+NORMALIZATION_REVISION = 1
+
+
+def _extractor() -> str:
+    try:
+        import pypdf
+
+        version = pypdf.__version__
+    except ImportError:
+        version = "unknown"
+    return f"pypdf-{version}-n{NORMALIZATION_REVISION}"
+
+
+EXTRACTOR = _extractor()
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_extractions")
+
+EXTRACTION_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_extractions (
+        sha256 TEXT NOT NULL,
+        extractor TEXT NOT NULL,
+        pages BYTEA NOT NULL,
+        page_count INT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (sha256, extractor)
+    );
+"""
+_SELECT_SQL = "SELECT pages FROM rag_extractions WHERE sha256 = %s AND extractor = %s;"
+_UPSERT_SQL = """
+    INSERT INTO rag_extractions (sha256, extractor, pages, page_count) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (sha256, extractor) DO UPDATE SET
+        pages = EXCLUDED.pages, page_count = EXCLUDED.page_count, created_at = now();
+"""
+_DELETE_SQL = "DELETE FROM rag_extractions WHERE sha256 = ANY(%s);"
+_CLEAR_SQL = "DELETE FROM rag_extractions WHERE NOT (%s AND extractor = %s);"
+_STATS_SQL = """
+    SELECT count(*) FILTER (WHERE extractor = %(extractor)s),
+           coalesce(sum(octet_length(pages)) FILTER (WHERE extractor = %(extractor)s), 0),
+           count(*) FILTER (WHERE extractor <> %(extractor)s)
+    FROM rag_extractions;
+"""
+
+# Metadata that belongs to a path rather than to the content
+_PATH_METADATA = ("source", "id", "name", "file_path")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC (ligatures, full-width forms), no NULs, \\n line ends, no trailing spaces, at most one blank line."""
+    text = unicodedata.normalize("NFKC", text).replace("\x00", "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def normalize_pages(documents: Iterable[Any]) -> List[Page]:
+    """Loader documents -> cacheable (text, metadata) pages."""
+    return [
+        (normalize_text(doc.page_content or ""), {k: v for k, v in doc.metadata.items() if k not in _PATH_METADATA})
+        for doc in documents
+    ]
+
+
+def _encode(pages: List[Page]) -> bytes:
+    return json.dumps([[text, meta] for text, meta in pages], ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _decode(data: bytes) -> List[Page]:
+    return [(text, meta) for text, meta in json.loads(data.decode("utf-8"))]
+
+
+class DiskExtractionCache:
+    """<directory>/<extractor>/<sha256[:2]>/<sha256>.json.gz"""
+
+    backend = "disk"
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, extractor: str = EXTRACTOR):
+        self.directory = directory
+        self.extractor = extractor
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.directory, self.extractor, sha256[:2], f"{sha256}.json.gz")
+
+    def get(self, sha256: str) -> Optional[List[Page]]:
+        try:
+            with open(self._path(sha256), "rb") as f:
+                return _decode(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable extraction cache entry %s: %s", sha256, e)
+            return None
+
+    def put(self, sha256: str, pages: List[Page]) -> None:
+        path = self._path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent warmers and readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(_encode(pages), compresslevel=6))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def delete(self, sha256s: Iterable[str]) -> int:
+        deleted = 0
+        for sha256 in sha256s:
+            try:
+                os.unlink(self._path(sha256))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def clear(self, keep_current: bool = False) -> int:
+        """Drop every entry (keep_current: only those of other extractor versions); returns entries removed."""
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for name in os.listdir(self.directory):
+            if keep_current and name == self.extractor:
+                continue
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                removed += sum(len(files) for _, _, files in os.walk(path))
+                shutil.rmtree(path)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = size = stale = 0
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                for root, _, files in os.walk(os.path.join(self.directory, name)):
+                    if name != self.extractor:
+                        stale += len(files)
+                        continue
+                    entries += len(files)
+                    size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return {"backend": self.backend, "extractor": self.extractor, "entries": entries, "bytes": size, "stale_entries": stale}
+
+
+class PgExtractionCache:
+    """rag_extractions rows; each call opens its own short connection (worker processes share nothing)."""
+
+    backend = "postgres"
+
+    def __init__(self, db_url: Optional[str] = None, db_params: Optional[Dict[str, str]] = None, extractor: str = EXTRACTOR):
+        if not db_url and not db_params:
+            raise ValueError("Provide either db_params or db_url")
+        self._db_url = db_url
+        self._db_params = db_params
+        self.extractor = extractor
+        self._ready = False
+
+    def _connect(self):
+        conn = psycopg.connect(self._db_url) if self._db_url else psycopg.connect(**self._db_params)
+        if not self._ready:
+            with conn.cursor() as cur:
+                cur.execute(EXTRACTION_TABLE_DDL)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def get(self, sha256: str) -> Optional[List[Page]]:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_SELECT_SQL, (sha256, self.extractor))
+                row = cur.fetchone()
+        return _decode(zlib.decompress(row[0])) if row else None
+
+    def put(self, sha256: str, pages: List[Page]) -> None:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_UPSERT_SQL, (sha256, self.extractor, zlib.compress(_encode(pages), 6), len(pages)))
+            conn.commit()
+
+    def delete(self, sha256s: Iterable[str]) -> int:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_DELETE_SQL, (list(sha256s),))
+                deleted = cur.rowcount
+            conn.commit()
+        return deleted
+
+    def clear(self, keep_current: bool = False) -> int:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_CLEAR_SQL, (keep_current, self.extractor))
+                removed = cur.rowcount
+            conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_STATS_SQL, {"extractor": self.extractor})
+                entries, size, stale = cur.fetchone()
+        return {"backend": self.backend, "extractor": self.extractor, "entries": entries, "bytes": size, "stale_entries": stale}
+
+
+def make_extraction_cache(backend: Optional[str] = None, directory: Optional[str] = None) -> Optional[Any]:
+    """
+    Cache from RAG_EXTRACTION_CACHE (disk | postgres | off; default disk) and
+    RAG_EXTRACTION_CACHE_DIR. postgres connects with DATABASE_URL or DB_HOST, DB_USER,
+    DB_PASSWORD, DB_NAME (DB_PORT). Returns None when off.
+    """
+    backend = (backend or os.getenv("RAG_EXTRACTION_CACHE", "disk")).strip().lower()
+    if backend in ("off", "none", "0", "false"):
+        return None
+    if backend == "disk":
+        return DiskExtractionCache(directory or os.getenv("RAG_EXTRACTION_CACHE_DIR") or DEFAULT_CACHE_DIR)
+    if backend == "postgres":
+        database_url = os.getenv("DATABASE_URL")
+        if database_url:
+            return PgExtractionCache(db_url=database_url)
+        params = {
+            "dbname": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "host": os.getenv("DB_HOST"),
+            "port": os.getenv("DB_PORT", "5432"),
+        }
+        if not all(params.values()):
+            raise ValueError("RAG_EXTRACTION_CACHE=postgres requires DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME")
+        return PgExtractionCache(db_params=params)
+    raise ValueError(f"Unknown RAG_EXTRACTION_CACHE backend {backend!r} (use disk, postgres or off)")
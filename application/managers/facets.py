@@ -0,0 +1,230 @@
+"""
+Structured retrieval facets: region, document type and publisher.
+
+Ingestion tags every chunk of a document with facets extracted from its file
+name, knowledge_sources entry and text (rag_chunks.regions / doc_type /
+publisher, indexed). The loaders compute them once over the whole document, and
+every write copies a document's facets to all of its rows, so rewriting only
+some chunks never leaves one document with mixed facets. At query time
+detect_facets() finds the same facets in the user's question with precompiled
+gazetteer regexes (no LLM call) and the ANN search is restricted to matching
+chunks. A city expands to its county, so a Tucson question also matches Pima
+County fact sheets.
+
+The gazetteer lives in mappings/facets.py.
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from mappings.facets import ACRONYMS, CITIES, COUNTIES, DOC_TYPES, PUBLISHERS, QUERY_DOC_TYPES
+from mappings.knowledge_sources import knowledge_sources
+
+FACETS = ("regions", "doc_type", "publisher")
+
+FACET_COLUMNS_DDL = (
+    "ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS regions TEXT[];",
+    "ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS doc_type TEXT;",
+    "ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS publisher TEXT;",
+)
+FACET_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunks_regions ON rag_chunks USING GIN (regions);",
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunks_doc_type ON rag_chunks (locale, doc_type);",
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunks_publisher ON rag_chunks (locale, publisher);",
+)
+# Copy each written chunk's facets to the other rows of its document
+_COPY_FACETS_SQL = """
+    UPDATE rag_chunks c
+    SET regions = w.regions, doc_type = w.doc_type, publisher = w.publisher
+    FROM rag_chunks w
+    WHERE w.id = ANY(%(chunk_ids)s) AND c.doc_id = w.doc_id AND c.locale = w.locale AND c.id <> w.id
+      AND (c.regions, c.doc_type, c.publisher) IS DISTINCT FROM (w.regions, w.doc_type, w.publisher);
+"""
+_FACET_COLUMNS_EXIST_SQL = """
+    SELECT count(*) FROM information_schema.columns
+    WHERE table_name = 'rag_chunks' AND column_name IN ('regions', 'doc_type', 'publisher');
+"""
+
+# A document mentioning more counties than this is statewide and gets no region
+MAX_DOCUMENT_COUNTIES = 3
+# Mentions in the file name / description outweigh mentions in the text
+_TITLE_WEIGHT = 10
+
+
+def _fold(text: str) -> str:
+    """Lower-case and strip accents ("Tucsón" -> "tucson")."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _alternation(aliases: Iterable[str]) -> str:
+    # Longest first so "prescott valley" wins over "prescott"
+    return "|".join(re.escape(a) for a in sorted(set(aliases), key=len, reverse=True))
+
+
+# alias -> canonical regions: the county, preceded by the city when the alias names one
+_REGION_ALIASES: Dict[str, Tuple[str, ...]] = {}
+for _county, _names in COUNTIES.items():
+    for _alias in _names:
+        _REGION_ALIASES[_fold(_alias)] = (_county,)
+for _city, (_county, _names) in CITIES.items():
+    for _alias in _names:
+        _REGION_ALIASES[_fold(_alias)] = tuple(dict.fromkeys((_city, _county)))
+_PUBLISHER_ALIASES = {_fold(a): p for p, (_, names) in PUBLISHERS.items() for a in names}
+_QUERY_DOC_TYPE_ALIASES = {_fold(a): t for t, names in QUERY_DOC_TYPES.items() for a in names}
+
+
+def _word_re(aliases: Iterable[str]) -> "re.Pattern":
+    # Word boundaries that also treat "_" and "-" (file names) as separators
+    return re.compile(r"(?<![a-z0-9])(" + _alternation(aliases) + r")(?![a-z0-9])")
+
+
+# Separate patterns so "Tucson Water" is both a region and a publisher
+_REGION_RE = _word_re(_REGION_ALIASES)
+_PUBLISHER_RE = _word_re(_PUBLISHER_ALIASES)
+_ACRONYM_RE = re.compile(r"\b(" + _alternation(ACRONYMS) + r")\b")
+_QUERY_DOC_TYPE_RE = _word_re(_QUERY_DOC_TYPE_ALIASES)
+_DOC_TYPE_RES = [(doc_type, re.compile(pattern)) for doc_type, pattern in DOC_TYPES]
+_DOMAIN_PUBLISHERS = {domain: p for p, (domains, _) in PUBLISHERS.items() for domain in domains}
+
+
+def _separators_to_spaces(text: str) -> str:
+    return re.sub(r"[_\-]+", " ", text)
+
+
+def _matches(text: str) -> List[Tuple[str, Tuple[str, ...]]]:
+    folded = _fold(_separators_to_spaces(text))
+    found = [("regions", _REGION_ALIASES[m.group(1)]) for m in _REGION_RE.finditer(folded)]
+    found.extend(("publisher", (_PUBLISHER_ALIASES[m.group(1)],)) for m in _PUBLISHER_RE.finditer(folded))
+    found.extend(("publisher", (ACRONYMS[m.group(1)],)) for m in _ACRONYM_RE.finditer(text or ""))
+    return found
+
+
+def detect_facets(query: str, kinds: Sequence[str] = FACETS) -> Dict[str, Any]:
+    """Facets named in a user query: {"regions": [...], "doc_type": str, "publisher": str} (only those found)."""
+    facets: Dict[str, Any] = {}
+    regions: List[str] = []
+    publishers: List[str] = []
+    for kind, values in _matches(query):
+        target = regions if kind == "regions" else publishers
+        target.extend(v for v in values if v not in target)
+    if regions and "regions" in kinds:
+        facets["regions"] = regions
+    # More than one publisher or document type is ambiguous; do not filter on it
+    if len(publishers) == 1 and "publisher" in kinds:
+        facets["publisher"] = publishers[0]
+    if "doc_type" in kinds:
+        doc_types = {_QUERY_DOC_TYPE_ALIASES[m.group(1)] for m in _QUERY_DOC_TYPE_RE.finditer(_fold(query))}
+        if len(doc_types) == 1:
+            facets["doc_type"] = doc_types.pop()
+    return facets
+
+
+def _publisher_for_url(url: str) -> Optional[str]:
+    host = urlparse(url or "").netloc.lower()
+    host = host[4:] if host.startswith("www.") else host
+    for domain, publisher in _DOMAIN_PUBLISHERS.items():
+        if host == domain or host.endswith("." + domain):
+            return publisher
+    return None
+
+
+def document_facets(source: str, texts: Sequence[str]) -> Dict[str, Any]:
+    """Facets of one document from its source path, knowledge_sources entry and chunk texts."""
+    filename = re.split(r"[\\/]", source or "")[-1]
+    entry = knowledge_sources.get(filename, {})
+    title = f"{filename} {entry.get('description', '')}"
+
+    county_counts: Counter = Counter()
+    city_counts: Counter = Counter()
+    publisher_counts: Counter = Counter()
+    for text, weight in [(title, _TITLE_WEIGHT)] + [(t, 1) for t in texts]:
+        for kind, values in _matches(text):
+            if kind == "publisher":
+                publisher_counts[values[0]] += weight
+                continue
+            county_counts[values[-1]] += weight
+            if len(values) > 1:
+                city_counts[values[0]] += weight
+
+    regions: List[str] = []
+    if county_counts:
+        top = county_counts.most_common(1)[0][1]
+        counties = [c for c, n in county_counts.items() if n >= 2 and n >= 0.3 * top]
+        if 0 < len(counties) <= MAX_DOCUMENT_COUNTIES:
+            cities = [c for c, n in city_counts.items() if n >= 2 and CITIES[c][0] in counties]
+            regions = sorted(set(counties) | set(cities))
+
+    folded_title = _fold(_separators_to_spaces(title))
+    doc_type = next((t for t, pattern in _DOC_TYPE_RES if pattern.search(folded_title)), None)
+    publisher = _publisher_for_url(entry.get("url", ""))
+    if publisher is None and publisher_counts:
+        name, count = publisher_counts.most_common(1)[0]
+        publisher = name if count >= _TITLE_WEIGHT else None
+    return {"regions": regions or None, "doc_type": doc_type, "publisher": publisher}
+
+
+def facets_by_doc(
+    doc_ids: Sequence[str],
+    sources: Sequence[str],
+    texts: Sequence[str],
+    known: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    document_facets for each doc_id, over all of its chunks in this batch; known holds
+    facets a loader already computed over the whole document.
+    """
+    grouped: Dict[str, Tuple[str, List[str]]] = {}
+    for doc_id, source, text in zip(doc_ids, sources, texts):
+        if doc_id not in (known or {}):
+            grouped.setdefault(doc_id, (source, []))[1].append(text or "")
+    facets = {doc_id: document_facets(source, chunk_texts) for doc_id, (source, chunk_texts) in grouped.items()}
+    facets.update(known or {})
+    return facets
+
+
+def facet_filter_sql(facets: Optional[Dict[str, Any]], alias: str = "") -> Tuple[str, Dict[str, Any]]:
+    """' AND ...' conditions (named params) restricting a rag_chunks scan to the facets."""
+    if not facets:
+        return "", {}
+    clauses, params = [], {}
+    if facets.get("regions"):
+        clauses.append(f"{alias}regions && %(facet_regions)s::text[]")
+        params["facet_regions"] = list(facets["regions"])
+    for column in ("doc_type", "publisher"):
+        if facets.get(column):
+            clauses.append(f"{alias}{column} = %(facet_{column})s")
+            params[f"facet_{column}"] = facets[column]
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def copy_document_facets(cur, chunk_ids: Sequence[str]) -> None:
+    """Give every other row of the documents of chunk_ids (one per document) the same facets."""
+    if chunk_ids:
+        cur.execute(_COPY_FACETS_SQL, {"chunk_ids": list(chunk_ids)})
+
+
+async def acopy_document_facets(cur, chunk_ids: Sequence[str]) -> None:
+    if chunk_ids:
+        await cur.execute(_COPY_FACETS_SQL, {"chunk_ids": list(chunk_ids)})
+
+
+def ensure_facet_columns(cur) -> None:
+    """Add the facet columns and indexes if missing (checked first: ALTER TABLE takes an exclusive lock)."""
+    cur.execute(_FACET_COLUMNS_EXIST_SQL)
+    if cur.fetchone()[0] < len(FACET_COLUMNS_DDL):
+        for ddl in FACET_COLUMNS_DDL:
+            cur.execute(ddl)
+    for ddl in FACET_INDEX_DDL:
+        cur.execute(ddl)
+
+
+async def aensure_facet_columns(cur) -> None:
+    await cur.execute(_FACET_COLUMNS_EXIST_SQL)
+    if (await cur.fetchone())[0] < len(FACET_COLUMNS_DDL):
+        for ddl in FACET_COLUMNS_DDL:
+            await cur.execute(ddl)
+    for ddl in FACET_INDEX_DDL:
+        await cur.execute(ddl)
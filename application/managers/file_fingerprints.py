@@ -0,0 +1,119 @@
+"""
+File fingerprints for incremental ingestion.
+
+rag_files records, per (path, locale), the size, mtime and SHA-256 of every file the
+loader ingested and how many chunks it produced. A sync skips a file whose size and
+mtime are unchanged without opening it, and one whose SHA-256 is unchanged (e.g. a
+fresh checkout) without parsing it. path is the chunks' doc_id, so fingerprints of
+files that vanished from disk lead straight to the chunks to delete.
+
+Fingerprints are written in the same transaction as the file's chunks, so a file
+whose write failed is retried on the next run.
+"""
+import hashlib
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+FILE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_files (
+        path TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        size BIGINT NOT NULL,
+        mtime DOUBLE PRECISION NOT NULL,
+        sha256 TEXT NOT NULL,
+        chunk_count INT NOT NULL,
+        ingested_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (path, locale)
+    );
+"""
+
+_SELECT_SQL = """
+    SELECT path, size, mtime, sha256, chunk_count FROM rag_files
+    WHERE locale = %(locale)s AND (%(prefix)s::text IS NULL OR starts_with(path, %(prefix)s));
+"""
+_UPSERT_SQL = """
+    INSERT INTO rag_files (path, locale, size, mtime, sha256, chunk_count, ingested_at)
+    VALUES (%s, %s, %s, %s, %s, %s, now())
+    ON CONFLICT (path, locale) DO UPDATE SET
+        size = EXCLUDED.size,
+        mtime = EXCLUDED.mtime,
+        sha256 = EXCLUDED.sha256,
+        chunk_count = EXCLUDED.chunk_count,
+        ingested_at = EXCLUDED.ingested_at;
+"""
+_DELETE_SQL = "DELETE FROM rag_files WHERE path = ANY(%(paths)s) AND (%(locale)s::text IS NULL OR locale = %(locale)s);"
+
+
+class FileFingerprint(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    chunk_count: int = 0
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stat_unchanged(path: str, known: Optional[FileFingerprint]) -> bool:
+    """True when path has the recorded size and mtime (the file need not be read)."""
+    if known is None:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == known.size and st.st_mtime == known.mtime
+
+
+def ensure_file_table(cur) -> None:
+    cur.execute(FILE_TABLE_DDL)
+
+
+async def aensure_file_table(cur) -> None:
+    await cur.execute(FILE_TABLE_DDL)
+
+
+def _fingerprints(rows) -> Dict[str, FileFingerprint]:
+    return {row[0]: FileFingerprint(*row) for row in rows}
+
+
+def file_fingerprints(cur, locale: str, prefix: Optional[str] = None) -> Dict[str, FileFingerprint]:
+    """Recorded files of locale (only paths starting with prefix, when given) by path."""
+    cur.execute(_SELECT_SQL, {"locale": locale, "prefix": prefix})
+    return _fingerprints(cur.fetchall())
+
+
+async def afile_fingerprints(cur, locale: str, prefix: Optional[str] = None) -> Dict[str, FileFingerprint]:
+    await cur.execute(_SELECT_SQL, {"locale": locale, "prefix": prefix})
+    return _fingerprints(await cur.fetchall())
+
+
+def _rows(files: Iterable[FileFingerprint], locale: str) -> List[tuple]:
+    return [(f.path, locale, f.size, f.mtime, f.sha256, f.chunk_count) for f in files]
+
+
+def record_files(cur, files: Iterable[FileFingerprint], locale: str) -> None:
+    rows = _rows(files, locale)
+    if rows:
+        cur.executemany(_UPSERT_SQL, rows)
+
+
+async def arecord_files(cur, files: Iterable[FileFingerprint], locale: str) -> None:
+    rows = _rows(files, locale)
+    if rows:
+        await cur.executemany(_UPSERT_SQL, rows)
+
+
+def forget_files(cur, paths: List[str], locale: Optional[str] = None) -> None:
+    """Drop fingerprints (all locales unless locale is given) so the files are ingested again."""
+    cur.execute(_DELETE_SQL, {"paths": list(paths), "locale": locale})
+
+
+async def aforget_files(cur, paths: List[str], locale: Optional[str] = None) -> None:
+    await cur.execute(_DELETE_SQL, {"paths": list(paths), "locale": locale})
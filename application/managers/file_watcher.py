@@ -0,0 +1,197 @@
+"""
+Watch a directory tree for new, changed and removed .pdf/.txt files.
+
+  InotifyWatcher   Linux inotify through libc (no extra dependency): a file is
+                   reported when it is closed after writing, moved in or out, or
+                   deleted; new subdirectories are watched as they appear
+  PollingWatcher   fallback (macOS, network mounts, containers without inotify):
+                   compares size/mtime snapshots every poll_interval seconds
+
+Both put changed paths on an asyncio queue. RESCAN is reported instead when the
+kernel queue overflowed or a whole directory disappeared, i.e. when the consumer
+should compare the full listing again. debounced() groups bursts of changes (a
+copy of many files, an editor's save dance) into one batch once the directory has
+been quiet for `debounce` seconds, or at the latest max_delay seconds after the
+first change.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import time
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from managers.ingestion import SUPPORTED_EXTENSIONS
+
+RESCAN = "<rescan>"
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; followed by len bytes of NUL-padded name
+
+
+def _supported(path: str) -> bool:
+    return path.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch") else None
+
+
+class PollingWatcher:
+    kind = "polling"
+
+    def __init__(self, directory: str, poll_interval: float = 5.0):
+        self.directory = directory
+        self._interval = poll_interval
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if not _supported(path):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    async def _poll(self) -> None:
+        previous = await asyncio.to_thread(self._snapshot)
+        while True:
+            await asyncio.sleep(self._interval)
+            current = await asyncio.to_thread(self._snapshot)
+            for path in sorted(set(previous) | set(current)):
+                if previous.get(path) != current.get(path):
+                    self.queue.put_nowait(path)
+            previous = current
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._poll())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+
+class InotifyWatcher:
+    kind = "inotify"
+
+    def __init__(self, directory: str, libc=None):
+        self.directory = directory
+        self._libc = libc or _libc()
+        if self._libc is None:
+            raise OSError("inotify is not available")
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._fd = -1
+        self._dirs: Dict[int, str] = {}
+
+    def _add_tree(self, directory: str, report: bool = False) -> None:
+        """Watch directory and its subdirectories; report=True queues the files already in it (moved-in trees)."""
+        for root, _, files in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), _WATCH_MASK)
+            if wd < 0:
+                logging.warning("Cannot watch %s: %s", root, os.strerror(ctypes.get_errno()))
+                continue
+            self._dirs[wd] = root
+            if report:
+                for name in files:
+                    path = os.path.join(root, name)
+                    if _supported(path):
+                        self.queue.put_nowait(path)
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & _IN_Q_OVERFLOW:
+            self.queue.put_nowait(RESCAN)
+            return
+        if mask & _IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return
+        parent = self._dirs.get(wd)
+        if parent is None:
+            return
+        if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            # A watched directory went away: which files went with it is only known from a new listing
+            self.queue.put_nowait(RESCAN)
+            return
+        path = os.path.join(parent, name)
+        if mask & _IN_ISDIR:
+            if mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._add_tree(path, report=True)
+            elif mask & _IN_MOVED_FROM:
+                self.queue.put_nowait(RESCAN)
+            return
+        if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_DELETE) and _supported(path):
+            self.queue.put_nowait(path)
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size: offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            self._handle(wd, mask, os.fsdecode(name))
+
+    def start(self) -> None:
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._add_tree(self.directory)
+        asyncio.get_running_loop().add_reader(self._fd, self._read)
+
+    def stop(self) -> None:
+        if self._fd >= 0:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(directory: str, poll_interval: float = 5.0, polling: bool = False):
+    """InotifyWatcher where the platform has inotify (unless polling), else PollingWatcher."""
+    if not polling:
+        libc = _libc()
+        if libc is not None:
+            return InotifyWatcher(directory, libc)
+    return PollingWatcher(directory, poll_interval)
+
+
+async def debounced(queue: asyncio.Queue, debounce: float = 2.0, max_delay: float = 30.0) -> AsyncIterator[Set[str]]:
+    """Batches of distinct paths (or RESCAN) from queue, each emitted once changes pause for debounce seconds."""
+    while True:
+        batch = {await queue.get()}
+        deadline = time.monotonic() + max_delay
+        while True:
+            timeout = min(debounce, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                batch.add(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        yield batch
@@ -0,0 +1,226 @@
+"""
+Persistent ingestion manifest: per-file state of a loader run, so a run can resume
+where it stopped and several workers can share one run.
+
+rag_ingest_manifest holds one row per (path, locale) with its state
+
+  pending -> extracted -> embedded -> written
+                 (any) -> failed
+
+plus the number of attempts, the last error, and the worker holding the file with
+the time it last reported progress. Workers claim pending files in batches with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never take the same file.
+A worker refreshes its claims (heartbeat) while it works; files whose claim is older
+than lease_seconds (the worker died) go back to the pool, and after max_attempts
+claims such a file is marked failed instead of being retried forever.
+
+A new run (enqueue) starts only when the locale has no unfinished files; otherwise
+the loader resumes the existing run. retry_failed() puts only the failed files back.
+Marking a file written happens after its chunks are committed: a crash in between
+re-processes the file, which the incremental loader makes cheap.
+"""
+import asyncio
+import os
+import socket
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+STATES = ("pending", "extracted", "embedded", "written", "failed")
+
+MANIFEST_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS rag_ingest_manifest (
+        path TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending'
+            CHECK (state IN ('pending', 'extracted', 'embedded', 'written', 'failed')),
+        attempts INT NOT NULL DEFAULT 0,
+        error TEXT,
+        worker TEXT,
+        claimed_at TIMESTAMPTZ,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (path, locale)
+    );
+    CREATE INDEX IF NOT EXISTS rag_ingest_manifest_state_idx ON rag_ingest_manifest (locale, state);
+"""
+
+# Serializes "resume or start a new run" between workers starting at the same time
+_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('rag_ingest_manifest:' || %s));"
+_UNFINISHED_SQL = "SELECT count(*) FROM rag_ingest_manifest WHERE locale = %s AND state NOT IN ('written', 'failed');"
+_ENQUEUE_SQL = """
+    INSERT INTO rag_ingest_manifest (path, locale, state, attempts, error, worker, claimed_at, updated_at)
+    SELECT path, %(locale)s, 'pending', 0, NULL, NULL, NULL, now() FROM unnest(%(paths)s::text[]) AS path
+    ON CONFLICT (path, locale) DO UPDATE SET
+        state = 'pending', attempts = 0, error = NULL, worker = NULL, claimed_at = NULL, updated_at = now();
+"""
+_DROP_UNLISTED_SQL = """
+    DELETE FROM rag_ingest_manifest
+    WHERE locale = %(locale)s AND starts_with(path, %(prefix)s) AND NOT path = ANY(%(paths)s);
+"""
+_RETRY_FAILED_SQL = """
+    UPDATE rag_ingest_manifest SET state = 'pending', attempts = 0, worker = NULL, claimed_at = NULL, updated_at = now()
+    WHERE locale = %s AND state = 'failed';
+"""
+_ABANDON_SQL = """
+    UPDATE rag_ingest_manifest
+    SET state = 'failed', worker = NULL, updated_at = now(),
+        error = 'Abandoned after ' || attempts || ' attempt(s): ' || coalesce(error, 'worker stopped')
+    WHERE locale = %(locale)s AND state IN ('pending', 'extracted', 'embedded')
+        AND attempts >= %(max_attempts)s AND claimed_at < now() - make_interval(secs => %(lease)s);
+"""
+_CLAIM_SQL = """
+    UPDATE rag_ingest_manifest m
+    SET state = 'pending', worker = %(worker)s, claimed_at = now(), attempts = m.attempts + 1, updated_at = now()
+    FROM (
+        SELECT path FROM rag_ingest_manifest
+        WHERE locale = %(locale)s AND state IN ('pending', 'extracted', 'embedded')
+            AND (worker IS NULL OR claimed_at < now() - make_interval(secs => %(lease)s))
+            AND attempts < %(max_attempts)s
+        ORDER BY path
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ) claimed
+    WHERE m.locale = %(locale)s AND m.path = claimed.path
+    RETURNING m.path;
+"""
+_OUTSTANDING_SQL = """
+    SELECT count(*) FROM rag_ingest_manifest
+    WHERE locale = %s AND state IN ('pending', 'extracted', 'embedded') AND worker IS DISTINCT FROM %s;
+"""
+_MARK_SQL = """
+    UPDATE rag_ingest_manifest
+    SET state = %(state)s, error = %(error)s, claimed_at = now(), updated_at = now()
+    WHERE locale = %(locale)s AND path = ANY(%(paths)s) AND worker = %(worker)s;
+"""
+_HEARTBEAT_SQL = """
+    UPDATE rag_ingest_manifest SET claimed_at = now()
+    WHERE locale = %s AND worker = %s AND state IN ('pending', 'extracted', 'embedded');
+"""
+_STATUS_SQL = "SELECT state, count(*) FROM rag_ingest_manifest WHERE locale = %s GROUP BY state;"
+_FAILURES_SQL = """
+    SELECT path, attempts, error FROM rag_ingest_manifest
+    WHERE locale = %s AND state = 'failed' ORDER BY path LIMIT %s;
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class IngestManifest:
+    """rag_ingest_manifest of one locale, as seen by one worker. Every call is its own transaction."""
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        locale: str = "en",
+        worker: Optional[str] = None,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+        poll_interval: float = 10.0,
+    ):
+        """
+        connect: coroutine function returning a psycopg AsyncConnection (PgVectorStore._aconnect).
+        lease_seconds: a claim not refreshed for this long is taken over by another worker;
+        heartbeat() should run at least every lease_seconds / 3.
+        poll_interval: how long next_batch() waits while other workers still hold files.
+        """
+        self._connect = connect
+        self.locale = locale
+        self.worker = worker or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._ready = False
+
+    async def _ensure(self, cur) -> None:
+        if not self._ready:
+            await cur.execute(MANIFEST_TABLE_DDL)
+            self._ready = True
+
+    async def _execute(self, statements: Sequence[Tuple[str, Any]], fetch: bool = False) -> Any:
+        async with await self._connect() as conn:
+            async with conn.cursor() as cur:
+                await self._ensure(cur)
+                result = None
+                for query, params in statements:
+                    await cur.execute(query, params)
+                    result = await cur.fetchall() if fetch and cur.description else cur.rowcount
+            await conn.commit()
+        return result
+
+    async def enqueue(self, paths: Sequence[str], prefix: Optional[str] = None, restart: bool = False) -> Tuple[bool, int]:
+        """
+        Start a new run over paths unless the locale has unfinished files (then resume
+        it; restart=True starts over regardless). With prefix (the listed directory),
+        rows of files under it that are no longer listed are dropped from the manifest.
+        Returns (started, files pending or unfinished).
+        """
+        async with await self._connect() as conn:
+            async with conn.cursor() as cur:
+                await self._ensure(cur)
+                await cur.execute(_LOCK_SQL, (self.locale,))
+                await cur.execute(_UNFINISHED_SQL, (self.locale,))
+                unfinished = (await cur.fetchone())[0]
+                if unfinished and not restart:
+                    await conn.commit()
+                    return False, unfinished
+                paths = list(paths)
+                if prefix is not None:
+                    await cur.execute(_DROP_UNLISTED_SQL, {"locale": self.locale, "prefix": prefix, "paths": paths})
+                await cur.execute(_ENQUEUE_SQL, {"locale": self.locale, "paths": paths})
+            await conn.commit()
+        return True, len(paths)
+
+    async def retry_failed(self) -> int:
+        """Put the locale's failed files back to pending; returns how many."""
+        return await self._execute([(_RETRY_FAILED_SQL, (self.locale,))])
+
+    async def claim(self, limit: int) -> List[str]:
+        """Claim up to limit pending (or abandoned) files for this worker, skipping rows other workers are claiming."""
+        params = {
+            "locale": self.locale,
+            "worker": self.worker,
+            "lease": self.lease_seconds,
+            "max_attempts": self._max_attempts,
+            "limit": limit,
+        }
+        rows = await self._execute([(_ABANDON_SQL, params), (_CLAIM_SQL, params)], fetch=True)
+        return sorted(row[0] for row in rows)
+
+    async def outstanding(self) -> int:
+        """Unfinished files held (or still pending) outside this worker."""
+        rows = await self._execute([(_OUTSTANDING_SQL, (self.locale, self.worker))], fetch=True)
+        return rows[0][0]
+
+    async def next_batch(self, limit: int) -> List[str]:
+        """
+        The next claimed batch; empty once the run is drained. While other workers still
+        hold files it polls, so a dead worker's files are taken over when its lease expires.
+        """
+        while True:
+            paths = await self.claim(limit)
+            if paths or not await self.outstanding():
+                return paths
+            await asyncio.sleep(self.poll_interval)
+
+    async def mark(self, paths: Sequence[str], state: str, error: Optional[str] = None) -> None:
+        """Move this worker's files to state (refreshing their claim); error is kept for failed files."""
+        if state not in STATES:
+            raise ValueError(f"Unknown manifest state {state!r}")
+        if not paths:
+            return
+        params = {"locale": self.locale, "paths": list(paths), "state": state, "error": error, "worker": self.worker}
+        await self._execute([(_MARK_SQL, params)])
+
+    async def heartbeat(self) -> None:
+        await self._execute([(_HEARTBEAT_SQL, (self.locale, self.worker))])
+
+    async def status(self, failures: int = 20) -> Dict[str, Any]:
+        """File counts per state and the first failed files with their errors."""
+        counts = dict(await self._execute([(_STATUS_SQL, (self.locale,))], fetch=True))
+        failed = await self._execute([(_FAILURES_SQL, (self.locale, failures))], fetch=True)
+        return {
+            "locale": self.locale,
+            "states": {state: counts.get(state, 0) for state in STATES},
+            "failed": [{"path": p, "attempts": a, "error": e} for p, a, e in failed],
+        }
+
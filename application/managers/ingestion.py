@@ -0,0 +1,575 @@
+"""
+Pipelined ingestion of files into PgVectorStore.
+
+Three stages connected by bounded asyncio queues, so a slow stage throttles the
+ones before it instead of buffering the whole corpus in memory:
+
+  extract  a process pool loads and splits files (PyPDFLoader parsing is CPU-bound
+           and holds the GIL, so threads would not help); with an extraction cache
+           (managers/extraction_cache.py) files parsed before are only split
+  embed    whole files are packed into jobs of about embed_batch_size chunks, embedded
+           by embed_concurrency workers sharing one EmbeddingBatcher (token-packed,
+           rate-limited, AIMD-throttled requests; managers/embedding_batcher.py)
+  write    one writer upserts the embedded chunks in bulk (one transaction per
+           write batch); a file's chunks are never split across write batches
+
+Runs are incremental: files whose size and mtime (or SHA-256) match their rag_files
+fingerprint are skipped, a changed file's chunks whose content_hash is unchanged at
+the same chunk index are left alone, moved chunks reuse their stored embedding, and
+only new text is embedded. With prune_prefix, chunks of fingerprinted files under
+that path that are no longer on disk are deleted.
+
+With an IngestManifest (managers/ingest_manifest.py) the files come from batches
+claimed in rag_ingest_manifest instead of the paths given to run(), and each file's
+progress (extracted, embedded, written, failed with its error) is recorded there, so
+an interrupted run resumes with the files it had not written and several loaders can
+work through one run. Claims are refreshed every lease_seconds / 3 while it runs.
+
+With a NearDuplicateIndex (managers/near_duplicates.py) new chunks that near-duplicate
+a stored chunk or one written earlier in the run are neither embedded nor written;
+their sources are added to the canonical chunk's alternate_sources instead.
+
+Progress, throughput (files, pages, chunks, tokens per second) and per-stage
+backpressure (time spent waiting on a full downstream queue or an empty upstream
+one, and the embedder's throttling) are logged every progress_interval seconds and
+returned by run().
+"""
+import asyncio
+import functools
+import logging
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from managers.embedding_batcher import EmbeddingBatcher
+from managers.extraction_cache import Page, normalize_pages
+from managers.facets import document_facets
+from managers.file_fingerprints import FileFingerprint, file_sha256, stat_unchanged
+from managers.ingest_manifest import IngestManifest
+from managers.near_duplicates import ChunkRef, NearDuplicateIndex, SignatureRow
+from managers.pgvector_store import DocLike, chunk_id, content_hash
+from managers.tokens import count_tokens
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+
+class ExtractedFile(NamedTuple):
+    path: str
+    pages: int
+    chunks: List[Tuple[str, Dict[str, Any]]]  # (text, metadata)
+    error: Optional[str] = None
+    fingerprint: Optional[FileFingerprint] = None
+    unchanged: bool = False  # SHA-256 matched known_sha256; not parsed
+    cached: bool = False  # pages came from the extraction cache; not parsed
+
+
+def load_pages(path: str) -> List[Page]:
+    """Parse a .pdf/.txt file into normalized (text, metadata) pages."""
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
+    if re.match(r".*\.txt$", path, re.IGNORECASE):
+        loader = TextLoader(path, encoding="utf-8")
+    elif re.match(r".*\.pdf$", path, re.IGNORECASE):
+        loader = PyPDFLoader(path)
+    else:
+        raise ValueError("Unsupported file type")
+    return normalize_pages(loader.load())
+
+
+def cached_pages(path: str, sha256: str, cache: Optional[Any]) -> Tuple[List[Page], bool]:
+    """path's pages from cache (by content hash) or parsed and cached; returns (pages, hit)."""
+    pages = None
+    if cache is not None:
+        try:
+            pages = cache.get(sha256)
+        except Exception as e:
+            logging.warning("Extraction cache lookup for %s failed: %s", path, e)
+    if pages is not None:
+        return pages, True
+    pages = load_pages(path)
+    if cache is not None and pages:
+        try:
+            cache.put(sha256, pages)
+        except Exception as e:
+            logging.warning("Could not cache extraction of %s: %s", path, e)
+    return pages, False
+
+
+def extract_file(
+    path: str,
+    chunk_size: int = 1500,
+    chunk_overlap: int = 150,
+    known_sha256: Optional[str] = None,
+    cache: Optional[Any] = None,
+) -> ExtractedFile:
+    """
+    Load and split one .pdf/.txt file into (text, metadata) chunks. Runs in a worker
+    process. With an extraction cache (managers/extraction_cache.py) a file whose
+    content was parsed before is only split.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    try:
+        if not os.path.exists(path):
+            return ExtractedFile(path, 0, [], "File does not exist")
+        st = os.stat(path)
+        if st.st_size == 0:
+            return ExtractedFile(path, 0, [], "File is empty (0 bytes)")
+        fingerprint = FileFingerprint(path, st.st_size, st.st_mtime, file_sha256(path))
+        if fingerprint.sha256 == known_sha256:
+            return ExtractedFile(path, 0, [], fingerprint=fingerprint, unchanged=True)
+        if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+            return ExtractedFile(path, 0, [], "Unsupported file type")
+        pages, hit = cached_pages(path, fingerprint.sha256, cache)
+        if not pages:
+            return ExtractedFile(path, 0, [], "No content extracted")
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        name = os.path.basename(path)
+        chunks = []
+        for text, page_metadata in pages:
+            if not text.strip():
+                continue
+            metadata = {**page_metadata, "id": str(uuid.uuid4()), "source": path, "name": name}
+            for chunk in splitter.split_text(text):
+                chunks.append((chunk, dict(metadata)))
+        return ExtractedFile(
+            path, len(pages), chunks, fingerprint=fingerprint._replace(chunk_count=len(chunks)), cached=hit
+        )
+    except Exception as e:
+        return ExtractedFile(path, 0, [], f"Error - {e}")
+
+
+def warm_file(path: str, cache: Any) -> Tuple[str, str]:
+    """Make sure path's extraction is cached; returns (path, "cached" | "extracted" | error). Runs in a worker process."""
+    try:
+        sha256 = file_sha256(path)
+        if cache.get(sha256) is not None:
+            return path, "cached"
+        cached_pages(path, sha256, cache)
+        return path, "extracted"
+    except Exception as e:
+        return path, f"Error - {e}"
+
+
+def list_files(directory: str) -> List[str]:
+    """Supported files under directory, sorted for a reproducible order."""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+class _Job:
+    """Whole files' changed chunks and fingerprints travelling through the embed and write stages together."""
+
+    __slots__ = ("docs", "tokens", "vectors", "reused", "files", "paths", "signatures", "sentences")
+
+    def __init__(self):
+        self.docs: List[DocLike] = []  # to embed
+        self.tokens = 0
+        self.vectors: List[Any] = []
+        self.reused: List[Tuple[DocLike, Any]] = []  # moved chunks with their stored embedding
+        self.files: List[FileFingerprint] = []
+        self.paths: List[str] = []
+        self.signatures: List[SignatureRow] = []  # MinHash rows of the new chunks, near-duplicates included
+        self.sentences: List[Tuple[str, Any]] = []  # new sentence embeddings for compression
+
+    def size(self) -> int:
+        return len(self.docs) + len(self.reused) + len(self.files)
+
+
+class PipelineStats:
+    STAGES = ("extract", "embed", "write")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.files = self.files_skipped = self.files_unchanged = self.files_deleted = self.files_cached = self.pages = 0
+        self.chunks_extracted = self.chunks_embedded = self.chunks_written = self.chunks_failed = 0
+        self.chunks_unchanged = self.chunks_reused = self.chunks_deleted = self.chunks_duplicate = 0
+        self.duplicates_released = 0
+        self.tokens_embedded = 0
+        # Seconds each stage spent working, blocked on its full output queue, idle on its empty input queue
+        self.busy = dict.fromkeys(self.STAGES, 0.0)
+        self.blocked = dict.fromkeys(self.STAGES, 0.0)
+        self.idle = dict.fromkeys(self.STAGES, 0.0)
+        self.queue_depth: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "files": self.files,
+            "files_skipped": self.files_skipped,
+            "files_unchanged": self.files_unchanged,
+            "files_deleted": self.files_deleted,
+            "files_cached": self.files_cached,
+            "pages": self.pages,
+            "chunks_extracted": self.chunks_extracted,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_written": self.chunks_written,
+            "chunks_failed": self.chunks_failed,
+            "chunks_unchanged": self.chunks_unchanged,
+            "chunks_reused": self.chunks_reused,
+            "chunks_deleted": self.chunks_deleted,
+            "chunks_duplicate": self.chunks_duplicate,
+            "duplicates_released": self.duplicates_released,
+            "tokens_embedded": self.tokens_embedded,
+            "pages_per_s": round(self.pages / elapsed, 2),
+            "chunks_per_s": round(self.chunks_written / elapsed, 2),
+            "tokens_per_s": round(self.tokens_embedded / elapsed, 1),
+            "busy_s": {k: round(v, 1) for k, v in self.busy.items()},
+            "blocked_s": {k: round(v, 1) for k, v in self.blocked.items()},
+            "idle_s": {k: round(v, 1) for k, v in self.idle.items()},
+            "queue_depth": dict(self.queue_depth),
+        }
+
+
+class IngestionPipeline:
+    """Extract (process pool) -> embed (concurrent, rate limited) -> write (single bulk writer)."""
+
+    def __init__(
+        self,
+        store: Any,
+        locale: str = "en",
+        workers: Optional[int] = None,
+        chunk_size: int = 1500,
+        chunk_overlap: int = 150,
+        embed_batch_size: int = 256,
+        embed_concurrency: int = 4,
+        write_batch_size: int = 1000,
+        queue_size: int = 4,
+        progress_interval: float = 10.0,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        extract: Callable[..., ExtractedFile] = extract_file,
+        incremental: bool = True,
+        manifest: Optional[IngestManifest] = None,
+        claim_batch_size: int = 32,
+        extraction_cache: Optional[Any] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+    ):
+        """
+        store: PgVectorStore (uses its embedding_function, aadd_embedded_documents and,
+        when incremental, afile_fingerprints / achunk_state / adelete_files). An
+        embedding_function that is not an EmbeddingBatcher is wrapped in one with
+        max_concurrency=embed_concurrency.
+        queue_size bounds each inter-stage queue (in files for extract -> embed, in batches after).
+        on_progress receives each periodic stats snapshot (default: logged).
+        extract runs in the worker processes, so it must be a picklable top-level function.
+        incremental=False re-embeds every chunk (fingerprints are still recorded).
+        manifest: take files claim_batch_size at a time from the manifest and record their states.
+        extraction_cache is passed to extract (cache=...) so cached files are not parsed again.
+        near_duplicates: skip new chunks that near-duplicate another chunk (store.near_duplicate_index()).
+        """
+        self._store = store
+        self._locale = locale
+        self._workers = workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._embed_batch_size = embed_batch_size
+        self._embed_concurrency = embed_concurrency
+        embedding_function = store.embedding_function
+        if not isinstance(embedding_function, EmbeddingBatcher):
+            embedding_function = EmbeddingBatcher(embedding_function, max_concurrency=embed_concurrency)
+        self._embedder = embedding_function
+        self._write_batch_size = write_batch_size
+        self._queue_size = queue_size
+        self._progress_interval = progress_interval
+        self._on_progress = on_progress or (lambda s: logging.info("Ingestion progress: %s", s))
+        self._extract_file = functools.partial(extract, cache=extraction_cache) if extraction_cache else extract
+        self._incremental = incremental
+        self._manifest = manifest
+        self._claim_batch_size = claim_batch_size
+        self._near_duplicates = near_duplicates
+        # Sentence embeddings (RAG_SENTENCE_EMBEDDINGS) are requested here, not inside the write transaction
+        self._sentences = bool(getattr(store, "sentence_embeddings", False))
+        self._known: Dict[str, FileFingerprint] = {}
+        self.stats = PipelineStats()
+
+    async def _put(self, queue: asyncio.Queue, item: Any, stage: str) -> None:
+        start = time.monotonic()
+        await queue.put(item)
+        self.stats.blocked[stage] += time.monotonic() - start
+
+    async def _get(self, queue: asyncio.Queue, stage: str) -> Any:
+        start = time.monotonic()
+        item = await queue.get()
+        self.stats.idle[stage] += time.monotonic() - start
+        return item
+
+    async def _mark(self, paths: Sequence[str], state: str, error: Optional[str] = None) -> None:
+        """Record a manifest transition; a lost update only means the file is redone after its lease."""
+        if self._manifest is None or not paths:
+            return
+        try:
+            await self._manifest.mark(paths, state, error)
+        except Exception as e:
+            logging.warning("Could not mark %s file(s) %s in the ingest manifest: %s", len(paths), state, e)
+
+    async def _paths(self, paths: Sequence[str]) -> AsyncIterator[str]:
+        if self._manifest is None:
+            for path in paths:
+                yield path
+            return
+        while True:
+            batch = await self._manifest.next_batch(self._claim_batch_size)
+            if not batch:
+                return
+            for path in batch:
+                yield path
+
+    async def _extract(self, pool: ProcessPoolExecutor, paths: Sequence[str], out: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        pending = set()
+        started: Dict[Any, float] = {}
+        unchanged: List[str] = []
+
+        async def drain(return_when):
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for future in done:
+                self.stats.busy["extract"] += time.monotonic() - started.pop(future)
+                await self._put(out, future.result(), "extract")
+
+        async for path in self._paths(paths):
+            known = self._known.get(path)
+            if stat_unchanged(path, known):
+                self.stats.files_unchanged += 1
+                unchanged.append(path)
+                if len(unchanged) >= self._claim_batch_size:
+                    await self._mark(unchanged, "written")
+                    unchanged = []
+                continue
+            # Keep every worker busy with one file queued behind it, no more
+            if len(pending) >= 2 * self._workers:
+                await drain(asyncio.FIRST_COMPLETED)
+            future = loop.run_in_executor(
+                pool, self._extract_file, path, self._chunk_size, self._chunk_overlap, known.sha256 if known else None
+            )
+            started[future] = time.monotonic()
+            pending.add(future)
+        while pending:
+            await drain(asyncio.FIRST_COMPLETED)
+        await self._mark(unchanged, "written")
+        await out.put(None)
+
+    async def _deduplicate(
+        self, item: ExtractedFile, new: List[Tuple[DocLike, str]], job: _Job
+    ) -> List[Tuple[DocLike, str]]:
+        """Drop item's near-duplicate chunks from new; the MinHash rows of all of them go to the writer."""
+        refs = [
+            ChunkRef(chunk_id(item.path, doc.metadata["chunk_index"]), item.path, doc.metadata["chunk_index"],
+                     doc.page_content, hash_, doc.metadata.get("source"))
+            for doc, hash_ in new
+        ]
+        try:
+            rows = await self._near_duplicates.assign(refs, {item.path: len(item.chunks)})
+        except Exception as e:
+            logging.warning("Near-duplicate detection for %s failed, keeping every chunk: %s", item.path, e)
+            return new
+        job.signatures.extend(rows)
+        kept = [entry for entry, row in zip(new, rows) if row.canonical_id is None]
+        self.stats.chunks_duplicate += len(new) - len(kept)
+        return kept
+
+    async def _diff(self, item: ExtractedFile, job: _Job) -> None:
+        """Add item's new and moved chunks to job; chunks stored unchanged at the same index are left out."""
+        stored = await self._store.achunk_state(item.path, self._locale) if self._incremental else []
+        by_index = {index: hash_ for index, hash_, _ in stored}
+        by_hash = {hash_: embedding for _, hash_, embedding in stored}
+        # Over the whole document, not just the chunks that get rewritten (the writer copies them to the rest)
+        source = item.chunks[0][1].get("source", item.path)
+        facets = document_facets(source, [text for text, _ in item.chunks])
+        new = []
+        for index, (text, metadata) in enumerate(item.chunks):
+            hash_ = content_hash(text)
+            if by_index.get(index) == hash_:
+                self.stats.chunks_unchanged += 1
+                continue
+            new.append((DocLike(text, {**metadata, "chunk_index": index, "facets": facets}), hash_))
+        if self._near_duplicates is not None and new:
+            new = await self._deduplicate(item, new, job)
+        for doc, hash_ in new:
+            if hash_ in by_hash:
+                job.reused.append((doc, by_hash[hash_]))
+                self.stats.chunks_reused += 1
+            else:
+                job.docs.append(doc)
+                job.tokens += count_tokens(doc.page_content)
+
+    async def _pack(self, extracted: asyncio.Queue, out: asyncio.Queue) -> None:
+        """Group whole files into embedding jobs of about embed_batch_size chunks."""
+        job = _Job()
+        while True:
+            item: Optional[ExtractedFile] = await self._get(extracted, "embed")
+            if item is None:
+                break
+            if item.unchanged:
+                # Touched but identical: record the new mtime so the next run skips it on stat alone
+                self.stats.files_unchanged += 1
+                job.files.append(item.fingerprint._replace(chunk_count=self._known[item.path].chunk_count))
+            elif item.error or not item.chunks:
+                self.stats.files_skipped += 1
+                logging.warning("Skipping %s: %s", item.path, item.error or "no text")
+                await self._mark([item.path], "failed", item.error or "No text")
+                continue
+            else:
+                self.stats.files += 1
+                self.stats.files_cached += item.cached
+                self.stats.pages += item.pages
+                self.stats.chunks_extracted += len(item.chunks)
+                await self._diff(item, job)
+                if item.fingerprint:
+                    job.files.append(item.fingerprint)
+            job.paths.append(item.path)
+            if job.size() >= self._embed_batch_size:
+                await self._mark(job.paths, "extracted")
+                await self._put(out, job, "extract")
+                job = _Job()
+        if job.size():
+            await self._mark(job.paths, "extracted")
+            await self._put(out, job, "extract")
+        for _ in range(self._embed_concurrency):
+            await out.put(None)
+
+    async def _embed(self, jobs: asyncio.Queue, out: asyncio.Queue) -> None:
+        while True:
+            job: Optional[_Job] = await self._get(jobs, "embed")
+            if job is None:
+                await out.put(None)
+                return
+            start = time.monotonic()
+            try:
+                if job.docs:
+                    job.vectors = await self._embedder.aembed_documents([d.page_content for d in job.docs])
+                    if self._sentences:
+                        # Best effort: failures are logged and left to query time
+                        job.sentences = await self._store.aembed_sentences([d.page_content for d in job.docs])
+                self.stats.chunks_embedded += len(job.docs)
+                self.stats.tokens_embedded += job.tokens
+            except Exception as e:
+                logging.error("Embedding %s chunk(s) failed: %s", len(job.docs), e)
+                self.stats.chunks_failed += len(job.docs) + len(job.reused)
+                await self._mark(job.paths, "failed", f"Embedding failed: {e}")
+                continue
+            finally:
+                self.stats.busy["embed"] += time.monotonic() - start
+            await self._mark(job.paths, "embedded")
+            for doc, embedding in job.reused:
+                job.docs.append(doc)
+                job.vectors.append(embedding)
+            await self._put(out, job, "embed")
+
+    async def _write_batch(
+        self,
+        docs: List[DocLike],
+        vectors: List[Any],
+        files: List[FileFingerprint],
+        paths: List[str],
+        signatures: List[SignatureRow],
+        sentences: List[Tuple[str, Any]],
+    ) -> None:
+        start = time.monotonic()
+        # Only a deduplicating pipeline passes signatures (the store's parameter is optional)
+        extra = {"signatures": signatures} if self._near_duplicates is not None else {}
+        if self._sentences:
+            extra["sentences"] = sentences
+        try:
+            await self._store.aadd_embedded_documents(docs, vectors, locale=self._locale, files=files, **extra)
+            self.stats.chunks_written += len(docs)
+        except Exception as e:
+            logging.error("Writing %s chunk(s) of %s file(s) failed: %s", len(docs), len(files), e)
+            self.stats.chunks_failed += len(docs)
+            await self._mark(paths, "failed", f"Write failed: {e}")
+        else:
+            await self._mark(paths, "written")
+        self.stats.busy["write"] += time.monotonic() - start
+
+    async def _write(self, jobs: asyncio.Queue) -> None:
+        docs: List[DocLike] = []
+        vectors: List[Any] = []
+        files: List[FileFingerprint] = []
+        paths: List[str] = []
+        signatures: List[SignatureRow] = []
+        sentences: List[Tuple[str, Any]] = []
+        finished = 0
+        while finished < self._embed_concurrency:
+            job: Optional[_Job] = await self._get(jobs, "write")
+            if job is None:
+                finished += 1
+                continue
+            docs.extend(job.docs)
+            vectors.extend(job.vectors)
+            files.extend(job.files)
+            paths.extend(job.paths)
+            signatures.extend(job.signatures)
+            sentences.extend(job.sentences)
+            if len(docs) + len(files) >= self._write_batch_size:
+                await self._write_batch(docs, vectors, files, paths, signatures, sentences)
+                docs, vectors, files, paths, signatures, sentences = [], [], [], [], [], []
+        if docs or files or paths:
+            await self._write_batch(docs, vectors, files, paths, signatures, sentences)
+
+    async def _prune(self, paths: Sequence[str], prefix: str) -> None:
+        present = set(paths)
+        vanished = sorted(p for p in self._known if p.startswith(prefix) and p not in present)
+        if not vanished:
+            return
+        self.stats.chunks_deleted = await self._store.adelete_files(vanished, self._locale)
+        self.stats.files_deleted = len(vanished)
+        logging.info("Deleted %s chunk(s) of %s vanished file(s)", self.stats.chunks_deleted, len(vanished))
+
+    async def _report(self, queues: Dict[str, asyncio.Queue]) -> None:
+        while True:
+            await asyncio.sleep(self._progress_interval)
+            self.stats.queue_depth = {name: q.qsize() for name, q in queues.items()}
+            self._on_progress(self._snapshot())
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self._manifest.lease_seconds / 3)
+            try:
+                await self._manifest.heartbeat()
+            except Exception as e:
+                logging.warning("Ingest manifest heartbeat failed: %s", e)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {**self.stats.snapshot(), "embedding": self._embedder.stats()}
+
+    async def run(self, paths: Sequence[str], prune_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ingest paths (with a manifest: the files claimed from it); returns the final
+        stats snapshot. With prune_prefix (the directory paths were listed from),
+        fingerprinted files under it that are not in paths are deleted; an empty listing
+        never prunes.
+        """
+        self.stats = PipelineStats()
+        self._known = await self._store.afile_fingerprints(self._locale) if self._incremental else {}
+        extracted: asyncio.Queue = asyncio.Queue(self._queue_size * self._workers)
+        to_embed: asyncio.Queue = asyncio.Queue(self._queue_size)
+        to_write: asyncio.Queue = asyncio.Queue(self._queue_size)
+        background = [asyncio.create_task(self._report({"extracted": extracted, "to_embed": to_embed, "to_write": to_write}))]
+        if self._manifest is not None:
+            background.append(asyncio.create_task(self._heartbeat()))
+        try:
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                await asyncio.gather(
+                    self._extract(pool, paths, extracted),
+                    self._pack(extracted, to_embed),
+                    *(self._embed(to_embed, to_write) for _ in range(self._embed_concurrency)),
+                    self._write(to_write),
+                )
+        finally:
+            for task in background:
+                task.cancel()
+        if self._incremental and prune_prefix is not None and paths:
+            await self._prune(paths, prune_prefix)
+        if self._near_duplicates is not None:
+            # Duplicates of canonical chunks whose write failed, or that this run changed
+            self.stats.duplicates_released = await self._store.arelease_duplicates(self._locale)
+        return self._snapshot()
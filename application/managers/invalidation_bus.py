@@ -0,0 +1,126 @@
+"""
+Cross-process cache invalidation over Postgres LISTEN/NOTIFY.
+
+Writers bump the corpus version (managers/corpus_version.py), which NOTIFYs
+CORPUS_CHANNEL on commit. Each app process keeps one listener connection and
+calls its subscribers (retrieval cache, vector snapshots, ...) with the new
+version and affected doc ids, so every ECS task evicts within milliseconds of
+an ingestion or delete instead of waiting for its own staleness checks.
+
+If the listener connection drops (or LISTEN is unavailable, e.g. behind a
+transaction-pooling proxy) the bus falls back to polling the version every
+`poll_interval` seconds and keeps trying to re-listen. On every (re)connect the
+current version is read, so notifications missed while disconnected still evict.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import psycopg
+from psycopg import sql
+
+from managers.corpus_version import CORPUS_CHANNEL, aget_corpus_version, parse_payload
+
+# subscriber(version, doc_ids); doc_ids is None when unknown (poll, reconnect, large batch)
+Subscriber = Callable[[int, Optional[List[str]]], None]
+
+
+class InvalidationBus:
+    """One LISTEN connection per process fanning corpus-version changes out to in-process caches."""
+
+    def __init__(
+        self,
+        db_url: Optional[str] = None,
+        db_params: Optional[Dict[str, str]] = None,
+        channel: str = CORPUS_CHANNEL,
+        poll_interval: float = 30.0,
+        max_backoff: Optional[float] = None,
+    ):
+        if not db_params and not db_url:
+            raise ValueError("Provide either db_params or db_url")
+        self._db_url = db_url
+        self._db_params = db_params
+        self._channel = channel
+        self._poll_interval = poll_interval
+        # Reconnect attempts back off up to the poll interval, so polling never gets rarer than that
+        self._max_backoff = max_backoff or poll_interval
+        self._subscribers: List[Subscriber] = []
+        self._version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.listening = False
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.append(subscriber)
+
+    async def _connect(self) -> psycopg.AsyncConnection:
+        if self._db_url:
+            return await psycopg.AsyncConnection.connect(self._db_url, autocommit=True)
+        params = {k: str(v) for k, v in self._db_params.items() if v}
+        return await psycopg.AsyncConnection.connect(autocommit=True, **params)
+
+    def dispatch(self, version: Optional[int], doc_ids: Optional[List[str]] = None) -> None:
+        """Call subscribers when the version moved forward (or on the first version seen)."""
+        if version is None or (self._version is not None and version <= self._version):
+            return
+        self._version = version
+        for subscriber in self._subscribers:
+            try:
+                subscriber(version, doc_ids)
+            except Exception as e:
+                logging.error("Invalidation subscriber failed: %s", e, exc_info=True)
+
+    async def _read_version(self, conn) -> None:
+        async with conn.cursor() as cur:
+            self.dispatch(await aget_corpus_version(cur))
+
+    async def _listen(self) -> None:
+        """Listen until the connection fails; doubles as a poll every poll_interval of silence."""
+        async with await self._connect() as conn:
+            await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self._channel)))
+            self.listening = True
+            logging.info("Listening for corpus invalidations on channel %s", self._channel)
+            await self._read_version(conn)
+            while True:
+                async for notify in conn.notifies(timeout=self._poll_interval):
+                    payload = parse_payload(notify.payload)
+                    self.dispatch(payload["version"], payload["doc_ids"])
+                # Timed out: cheap query confirms the connection is alive and catches anything missed
+                await self._read_version(conn)
+
+    async def _poll_once(self) -> None:
+        try:
+            async with await self._connect() as conn:
+                await self._read_version(conn)
+        except Exception as e:
+            logging.debug("Invalidation poll failed: %s", e)
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.listening:
+                    backoff = 1.0
+                logging.warning("Invalidation listener lost (%s); polling every %.0fs until it reconnects", e, backoff)
+            self.listening = False
+            await self._poll_once()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+
+    def start(self) -> None:
+        """Start the listener task on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.listening = False
@@ -0,0 +1,322 @@
+"""
+In-process, memory-mapped vector index over rag_chunks.
+
+Postgres stays the source of truth: each locale is snapshotted into a matrix of
+L2-normalised embeddings (float32 or float16 .npy) plus a JSON-lines file of
+content/metadata with an offsets array. All three are memory-mapped read-only,
+so every uvicorn worker on the host shares one copy through the page cache.
+A query is one matrix-vector product and an argpartition top-k: no DB round trip.
+
+Snapshots are named by the corpus version read in the export's own transaction.
+The store checks the version at most every `refresh_interval` seconds and rebuilds
+in the background when it moves, serving the previous snapshot until the new one
+is ready. Retrieval is vector-only (the hybrid full-text mode needs Postgres).
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import mmap
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import psycopg
+
+from managers.corpus_version import get_corpus_version
+from managers.pgvector_store import DocLike, PgVectorStore
+from managers.vector_index import validate_locale
+from managers.vector_store import VectorStoreBase
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+# float16 snapshots are scored in blocks so the float32 upcast never copies the whole matrix
+_SCORE_BLOCK_ROWS = 8192
+
+
+class _Snapshot:
+    """One locale at one corpus version, memory-mapped from disk."""
+
+    def __init__(self, base_path: str, version: int):
+        self.version = version
+        self.vectors = np.load(base_path + ".vectors.npy", mmap_mode="r")
+        self.offsets = np.load(base_path + ".offsets.npy", mmap_mode="r")
+        self._docs_file = open(base_path + ".docs.jsonl", "rb")
+        size = os.fstat(self._docs_file.fileno()).st_size
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def doc(self, row: int) -> DocLike:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record = json.loads(self._docs[start:end])
+        return DocLike(page_content=record["content"], metadata=record["metadata"])
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _SCORE_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ query
+        return out
+
+    def top_k(self, query: np.ndarray, k: int) -> List[DocLike]:
+        return [doc for doc, _ in self.top_k_scored(query, k)]
+
+    def top_k_scored(self, query: np.ndarray, k: int) -> List[Tuple[DocLike, float]]:
+        """(document, cosine distance) pairs, nearest first; vectors are unit length so distance = 1 - dot."""
+        scores, idx = self._top_rows(query, k)
+        return [(self.doc(int(i)), 1.0 - float(scores[i])) for i in idx]
+
+    def top_k_with_vectors(self, query: np.ndarray, k: int) -> List[Tuple[DocLike, float, np.ndarray]]:
+        scores, idx = self._top_rows(query, k)
+        return [(self.doc(int(i)), 1.0 - float(scores[i]), np.asarray(self.vectors[i], dtype=np.float32)) for i in idx]
+
+    def _top_rows(self, query: np.ndarray, k: int):
+        n = len(self)
+        if n == 0 or k <= 0:
+            return None, []
+        scores = self.scores(query)
+        k = min(k, n)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return scores, idx[np.argsort(-scores[idx])]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_snapshot(base_path: str, rows: Iterable, count: int, dim: int, dtype: str, manifest: Dict[str, Any]) -> None:
+    """
+    Write `count` (content, metadata, embedding) rows as a snapshot at base_path.
+    Files are written under .tmp names and renamed; the manifest goes last, so a
+    snapshot whose manifest exists is always complete.
+    """
+    vectors = np.lib.format.open_memmap(base_path + ".vectors.npy.tmp", mode="w+", dtype=DTYPES[dtype], shape=(count, dim))
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    with open(base_path + ".docs.jsonl.tmp", "wb") as docs:
+        for row, (content, metadata, embedding) in enumerate(rows):
+            if row >= count:
+                break
+            vectors[row] = _normalize(np.asarray(embedding, dtype=np.float32))
+            docs.write(json.dumps({"content": content or "", "metadata": metadata or {}}).encode("utf-8"))
+            docs.write(b"\n")
+            offsets[row + 1] = docs.tell()
+    vectors.flush()
+    del vectors
+    with open(base_path + ".offsets.npy.tmp", "wb") as f:
+        np.save(f, offsets)
+    for suffix in (".vectors.npy", ".offsets.npy", ".docs.jsonl"):
+        os.replace(base_path + suffix + ".tmp", base_path + suffix)
+    with open(base_path + ".json.tmp", "w") as f:
+        json.dump(dict(manifest, rows=count, dim=dim, dtype=dtype), f)
+    os.replace(base_path + ".json.tmp", base_path + ".json")
+
+
+class MmapVectorStore(VectorStoreBase):
+    """VectorStoreBase backed by per-locale memory-mapped snapshots of a PgVectorStore."""
+
+    def __init__(
+        self,
+        source: PgVectorStore,
+        snapshot_dir: str,
+        dtype: str = "float32",
+        refresh_interval: float = 30.0,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(DTYPES)}, got {dtype!r}")
+        self._source = source
+        self._dir = snapshot_dir
+        self._dtype = dtype
+        self._refresh_interval = refresh_interval
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        os.makedirs(self._dir, exist_ok=True)
+        logging.info("MmapVectorStore initialized (dir=%s, dtype=%s)", self._dir, self._dtype)
+
+    # ------------------------------------------------------------------
+    # Snapshot files
+    # ------------------------------------------------------------------
+    def _base_path(self, locale: str, version: int) -> str:
+        return os.path.join(self._dir, f"{validate_locale(locale)}-v{version}-{self._dtype}")
+
+    def _open(self, locale: str, version: int) -> _Snapshot:
+        """
+        Map the snapshot for (locale, version), building it unless another worker already did.
+        Files are opened under the lock, so another worker's _remove_older cannot delete them
+        first (once open they stay readable after the unlink).
+        """
+        with open(os.path.join(self._dir, f"{locale}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            base = self._base_path(locale, version)
+            if os.path.exists(base + ".json"):
+                return _Snapshot(base, version)
+            return self._build(locale)
+
+    def _build(self, locale: str) -> _Snapshot:
+        """Export locale at the current corpus version; the caller holds the locale lock."""
+        started = time.time()
+        with self._source._connect() as conn:
+            # The version is read in the export's snapshot, so it names exactly the rows written
+            conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+            with conn.cursor() as cur:
+                version = get_corpus_version(cur)
+                base = self._base_path(locale, version)
+                if os.path.exists(base + ".json"):
+                    return _Snapshot(base, version)
+                cur.execute(
+                    "SELECT count(*), max(vector_dims(embedding)) FROM rag_chunks WHERE locale = %s AND embedding IS NOT NULL;",
+                    (locale,),
+                )
+                count, dim = cur.fetchone()
+            with conn.cursor(name="rag_snapshot") as cur:
+                cur.itersize = 2000
+                cur.execute(
+                    "SELECT content, COALESCE(metadata, jsonb_build_object())"
+                    " || jsonb_build_object('doc_id', doc_id, 'chunk_index', chunk_index), embedding"
+                    " FROM rag_chunks WHERE locale = %s AND embedding IS NOT NULL ORDER BY id;",
+                    (locale,),
+                )
+                write_snapshot(base, cur, count, dim or 0, self._dtype, {"locale": locale, "version": version})
+        snapshot = _Snapshot(base, version)
+        self._remove_older(locale, version)
+        logging.info("Snapshot %s built: %s rows in %.2fs", os.path.basename(base), count, time.time() - started)
+        return snapshot
+
+    def _remove_older(self, locale: str, version: int) -> None:
+        """Delete superseded snapshot files (workers still mapping them keep their pages until they reload)."""
+        for path in glob.glob(os.path.join(self._dir, f"{locale}-v*-{self._dtype}.*")):
+            try:
+                file_version = int(os.path.basename(path).split("-v", 1)[1].split("-", 1)[0])
+            except (IndexError, ValueError):
+                continue
+            if file_version < version:
+                os.remove(path)
+
+    def _load(self, locale: str, version: int) -> _Snapshot:
+        snapshot = self._open(locale, version)
+        self._snapshots[locale] = snapshot
+        return snapshot
+
+    # ------------------------------------------------------------------
+    # Freshness
+    # ------------------------------------------------------------------
+    def _due(self, locale: str) -> bool:
+        return time.monotonic() - self._checked_at.get(locale, 0.0) >= self._refresh_interval
+
+    def _snapshot(self, locale: str) -> _Snapshot:
+        current = self._snapshots.get(locale)
+        if current is None or self._due(locale):
+            self._checked_at[locale] = time.monotonic()
+            version = self._source.get_corpus_version()
+            if current is None or current.version != version:
+                # A re-embedding swap bumps the version too; pick up its model/dimensions
+                self._source.refresh_embedding_spec(force=True)
+                current = self._load(locale, version)
+        return current
+
+    async def _refresh(self, locale: str, version: int) -> None:
+        try:
+            await asyncio.to_thread(self._load, locale, version)
+        except Exception as e:
+            logging.error("Snapshot refresh failed for locale=%s: %s", locale, e, exc_info=True)
+        finally:
+            self._refreshing.pop(locale, None)
+
+    async def _asnapshot(self, locale: str) -> _Snapshot:
+        """Current snapshot; a version bump is picked up in the background while the old one keeps serving."""
+        current = self._snapshots.get(locale)
+        if current is not None and not self._due(locale):
+            return current
+        self._checked_at[locale] = time.monotonic()
+        version = await self._source.aget_corpus_version()
+        spec_changed = False
+        if current is None or current.version != version:
+            # A re-embedding swap bumps the version too; pick up its model/dimensions
+            spec_changed = await self._source.arefresh_embedding_spec(force=True)
+        if current is None or spec_changed:
+            # Query vectors from the new spec cannot be scored against the old snapshot
+            return await asyncio.to_thread(self._load, locale, version)
+        if current.version != version and locale not in self._refreshing:
+            self._refreshing[locale] = asyncio.create_task(self._refresh(locale, version))
+        return current
+
+    # ------------------------------------------------------------------
+    # VectorStoreBase
+    # ------------------------------------------------------------------
+    def _query_vector(self, embedding: List[float]) -> np.ndarray:
+        return _normalize(np.asarray(embedding, dtype=np.float32))
+
+    def similarity_search(self, query: str, k: int = 4, locale: str = "en") -> List[Any]:
+        embedding = self._source.embedding_function.embed_query(query)
+        if not embedding:
+            return []
+        return self._snapshot(locale).top_k(self._query_vector(embedding), k)
+
+    async def asimilarity_search(self, query: str, k: int = 4, locale: str = "en") -> List[Any]:
+        embedding = await self._source.embedding_function.aembed_query(query)
+        if not embedding:
+            return []
+        snapshot = await self._asnapshot(locale)
+        return snapshot.top_k(self._query_vector(embedding), k)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, locale: str = "en") -> List[Tuple[Any, Optional[float]]]:
+        embedding = self._source.embedding_function.embed_query(query)
+        if not embedding:
+            return []
+        return self._snapshot(locale).top_k_scored(self._query_vector(embedding), k)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, locale: str = "en"
+    ) -> List[Tuple[Any, Optional[float]]]:
+        embedding = await self._source.embedding_function.aembed_query(query)
+        if not embedding:
+            return []
+        snapshot = await self._asnapshot(locale)
+        return snapshot.top_k_scored(self._query_vector(embedding), k)
+
+    async def asimilarity_search_with_vectors(
+        self, query: str, k: int = 4, locale: str = "en"
+    ) -> List[Tuple[Any, Optional[float], Any]]:
+        embedding = await self._source.embedding_function.aembed_query(query)
+        if not embedding:
+            return []
+        snapshot = await self._asnapshot(locale)
+        return snapshot.top_k_with_vectors(self._query_vector(embedding), k)
+
+    async def asimilarity_search_batch(self, queries: List[str], k: int = 4, locale: str = "en") -> List[List[Any]]:
+        if not queries:
+            return []
+        embeddings = await self._source.embedding_function.aembed_documents(list(queries))
+        snapshot = await self._asnapshot(locale)
+        return [snapshot.top_k(self._query_vector(e), k) for e in embeddings]
+
+    def add_documents(self, documents: List[Any], locale: str = "en") -> None:
+        """Writes go to Postgres; the version bump makes every worker refresh its snapshot."""
+        self._source.add_documents(documents, locale=locale)
+        self._checked_at.pop(locale, None)
+
+    async def aadd_documents(self, documents: List[Any], locale: str = "en") -> None:
+        await self._source.aadd_documents(documents, locale=locale)
+        self._checked_at.pop(locale, None)
+
+    @property
+    def source(self) -> PgVectorStore:
+        return self._source
+
+    async def aget_corpus_version(self) -> int:
+        return await self._source.aget_corpus_version()
+
+    def invalidate(self, locale: Optional[str] = None) -> None:
+        """Force a version check on the next query (all locales when locale is None)."""
+        if locale is None:
+            self._checked_at.clear()
+        else:
+            self._checked_at.pop(locale, None)
@@ -0,0 +1,73 @@
+"""
+Maximal marginal relevance (MMR) selection over retrieved candidates.
+
+Chunks overlap by 150 characters and many fact sheets repeat the same facts, so
+the nearest k chunks are often near-duplicates. MMR picks greedily by
+
+    lambda * sim(query, d) - (1 - lambda) * max(sim(d, s) for s already selected)
+
+using one candidate-by-candidate cosine matrix (NumPy), so each chunk added to
+the context carries new information. A per-source cap stops one PDF from
+filling the window.
+"""
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(
+    relevance: Sequence[Optional[float]],
+    vectors: Optional[Sequence[Any]],
+    k: int,
+    lambda_mult: float = 0.5,
+    sources: Optional[Sequence[str]] = None,
+    max_per_source: Optional[int] = None,
+    duplicate_similarity: Optional[float] = None,
+) -> List[int]:
+    """
+    Indices of up to k candidates in selection order.
+
+    relevance: query similarity per candidate (None entries fall back to rank order).
+    vectors: candidate embeddings; without them only the per-source cap applies.
+    duplicate_similarity: candidates at least this similar to a selected one are never picked.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    if any(r is None for r in relevance):
+        # No scores: earlier results are more relevant
+        rel = np.linspace(1.0, 0.5, n, dtype=np.float32)
+    else:
+        rel = np.asarray(relevance, dtype=np.float32)
+
+    sim = None
+    if vectors is not None and all(v is not None for v in vectors):
+        matrix = _unit_rows(np.asarray([np.asarray(v, dtype=np.float32) for v in vectors]))
+        sim = matrix @ matrix.T
+
+    available = np.ones(n, dtype=bool)
+    max_sim = np.zeros(n, dtype=np.float32)  # max similarity to anything selected so far
+    per_source = {}
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        score = lambda_mult * rel - (1.0 - lambda_mult) * max_sim if selected and sim is not None else rel.copy()
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        available[best] = False
+        source = sources[best] if sources is not None else None
+        if max_per_source and source:
+            if per_source.get(source, 0) >= max_per_source:
+                continue
+            per_source[source] = per_source.get(source, 0) + 1
+        selected.append(best)
+        if sim is not None:
+            np.maximum(max_sim, sim[:, best], out=max_sim)
+            if duplicate_similarity is not None:
+                available &= max_sim < duplicate_similarity
+    return selected
@@ -0,0 +1,479 @@
+"""
+Near-duplicate chunk detection at ingestion time (MinHash + LSH).
+
+Overlapping fact sheets and repeated boilerplate (disclaimers, headers, footers)
+would otherwise be embedded, indexed and retrieved once per copy. Each new chunk is
+shingled (SHINGLE_SIZE-word windows of its normalized text) and MinHashed with
+PERMUTATIONS hash functions; the signature is cut into BANDS bands whose hashes are
+the chunk's LSH buckets. Chunks sharing a bucket are candidates, and a candidate
+whose estimated Jaccard similarity (share of equal signature values) reaches the
+threshold is a near-duplicate. 16 bands of 8 rows find pairs above about 0.75
+similarity with high probability, so thresholds below that miss duplicates.
+
+Signatures and buckets of every chunk seen live in rag_chunk_minhash (GIN index on
+buckets), so duplicates are found across the whole locale, not only within a run.
+A near-duplicate is not embedded or written to rag_chunks: its row points at the
+canonical chunk (canonical_id, and the canonical's content_hash when it was matched),
+and the canonical's metadata "alternate_sources" lists the sources of its duplicates
+so citations keep them. When a canonical chunk is deleted or changes, its duplicates
+are released: their rows are dropped and their files' fingerprints forgotten, so the
+next sync ingests them again.
+
+NearDuplicateIndex (PgVectorStore.near_duplicate_index) assigns chunks during a run;
+the store writes its rows in the write transaction. The loaders deduplicate with
+RAG_DEDUP=true (or --dedup) at RAG_DEDUP_THRESHOLD (default 0.85); `ingest.py dedup`
+signs and deduplicates chunks stored before. SQL helpers take a cursor; the
+a* variants take a psycopg async cursor.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.85
+SHINGLE_SIZE = 5
+PERMUTATIONS = 128
+BANDS = 16
+_ROWS = PERMUTATIONS // BANDS
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed so signatures stored by earlier runs stay comparable
+_SEED = 20240611
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+MINHASH_TABLE_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS rag_chunk_minhash (
+        chunk_id TEXT PRIMARY KEY,
+        doc_id TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        chunk_index INT NOT NULL,
+        source TEXT,
+        signature BYTEA NOT NULL,
+        buckets BIGINT[] NOT NULL,
+        canonical_id TEXT,
+        canonical_hash TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_buckets ON rag_chunk_minhash USING GIN (buckets);",
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_doc_id ON rag_chunk_minhash (doc_id, locale);",
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_source ON rag_chunk_minhash (source, locale);",
+    "CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_canonical ON rag_chunk_minhash (canonical_id) "
+    "WHERE canonical_id IS NOT NULL;",
+)
+_TABLE_EXISTS_SQL = "SELECT to_regclass('rag_chunk_minhash') IS NOT NULL;"
+
+# Only canonical chunks still stored are candidates; content_hash is what a duplicate records
+_CANDIDATES_SQL = """
+    SELECT m.chunk_id, m.doc_id, m.chunk_index, m.source, m.signature, m.buckets, c.content_hash
+    FROM rag_chunk_minhash m JOIN rag_chunks c ON c.id = m.chunk_id
+    WHERE m.locale = %(locale)s AND m.canonical_id IS NULL AND m.buckets && %(buckets)s;
+"""
+_UPSERT_SQL = """
+    INSERT INTO rag_chunk_minhash
+        (chunk_id, doc_id, locale, chunk_index, source, signature, buckets, canonical_id, canonical_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (chunk_id) DO UPDATE SET
+        doc_id = EXCLUDED.doc_id,
+        locale = EXCLUDED.locale,
+        chunk_index = EXCLUDED.chunk_index,
+        source = EXCLUDED.source,
+        signature = EXCLUDED.signature,
+        buckets = EXCLUDED.buckets,
+        canonical_id = EXCLUDED.canonical_id,
+        canonical_hash = EXCLUDED.canonical_hash;
+"""
+_DELETE_TRAILING_SQL = (
+    "DELETE FROM rag_chunk_minhash WHERE doc_id = %s AND locale = %s AND chunk_index >= %s RETURNING canonical_id;"
+)
+# A duplicate's id may hold the chunk's previous (different) text
+_DELETE_DUPLICATE_CHUNKS_SQL = "DELETE FROM rag_chunks WHERE id = ANY(%(chunk_ids)s) RETURNING doc_id;"
+_DELETE_DOCUMENTS_SQL = """
+    DELETE FROM rag_chunk_minhash
+    WHERE doc_id = ANY(%(doc_ids)s) AND (%(locale)s::text IS NULL OR locale = %(locale)s)
+    RETURNING chunk_id, canonical_id;
+"""
+# Documents stored only as near-duplicates have no rag_chunks row to match their source on
+_SOURCE_DOCUMENTS_SQL = """
+    SELECT DISTINCT doc_id, locale FROM rag_chunk_minhash
+    WHERE source = ANY(%(sources)s) AND (%(locale)s::text IS NULL OR locale = %(locale)s);
+"""
+# Canonical metadata lists its duplicates' sources (not its own: a document repeating its boilerplate)
+_REFRESH_ALTERNATES_SQL = """
+    UPDATE rag_chunks c
+    SET metadata = (coalesce(c.metadata, '{}'::jsonb) - 'alternate_sources') || coalesce(
+        (SELECT jsonb_build_object('alternate_sources', jsonb_agg(DISTINCT d.source ORDER BY d.source))
+         FROM rag_chunk_minhash d
+         WHERE d.canonical_id = c.id AND d.source IS NOT NULL AND d.source IS DISTINCT FROM c.metadata->>'source'
+         HAVING count(*) > 0),
+        '{}'::jsonb)
+    WHERE c.id = ANY(%(chunk_ids)s)
+    RETURNING c.doc_id;
+"""
+_RELEASE_CANONICALS_SQL = """
+    DELETE FROM rag_chunk_minhash WHERE canonical_id = ANY(%(chunk_ids)s)
+    RETURNING doc_id, locale, canonical_id;
+"""
+_RELEASE_ORPHANS_SQL = """
+    DELETE FROM rag_chunk_minhash d
+    WHERE d.canonical_id IS NOT NULL AND (%(locale)s::text IS NULL OR d.locale = %(locale)s)
+      AND NOT EXISTS (SELECT 1 FROM rag_chunks c WHERE c.id = d.canonical_id AND c.content_hash = d.canonical_hash)
+    RETURNING d.doc_id, d.locale, d.canonical_id;
+"""
+_STALE_CANONICALS_SQL = """
+    DELETE FROM rag_chunk_minhash m
+    WHERE m.canonical_id IS NULL AND (%(locale)s::text IS NULL OR m.locale = %(locale)s)
+      AND NOT EXISTS (SELECT 1 FROM rag_chunks c WHERE c.id = m.chunk_id);
+"""
+_STALE_DUPLICATES_SQL = """
+    DELETE FROM rag_chunk_minhash m USING rag_files f
+    WHERE m.doc_id = f.path AND m.locale = f.locale AND m.chunk_index >= f.chunk_count
+      AND (%(locale)s::text IS NULL OR m.locale = %(locale)s)
+    RETURNING m.canonical_id;
+"""
+
+
+def near_duplicates_enabled() -> bool:
+    """Whether the loaders skip near-duplicate chunks (read lazily, after .env is loaded)."""
+    return os.getenv("RAG_DEDUP", "false").lower() in ("1", "true", "yes")
+
+
+def near_duplicate_threshold() -> float:
+    return float(os.getenv("RAG_DEDUP_THRESHOLD", str(DEFAULT_THRESHOLD)))
+
+
+class ChunkRef(NamedTuple):
+    """A chunk about to be written: its rag_chunks id and what a duplicate of it records."""
+
+    chunk_id: str
+    doc_id: str
+    chunk_index: int
+    text: str
+    content_hash: str
+    source: Optional[str]
+
+
+class SignatureRow(NamedTuple):
+    """One rag_chunk_minhash row; canonical_id set means the chunk is a near-duplicate and not stored."""
+
+    chunk_id: str
+    doc_id: str
+    chunk_index: int
+    source: Optional[str]
+    signature: bytes
+    buckets: List[int]
+    canonical_id: Optional[str] = None
+    canonical_hash: Optional[str] = None
+
+
+class _Canonical(NamedTuple):
+    chunk_id: str
+    doc_id: str
+    chunk_index: int
+    source: Optional[str]
+    signature: np.ndarray
+    content_hash: str
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Overlapping size-word windows of text's lower-cased words (one shingle for shorter texts)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i: i + size]) for i in range(len(words) - size + 1)]
+
+
+def _permutations() -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.RandomState(_SEED)
+    a = rng.randint(1, 1 << 61, size=PERMUTATIONS, dtype=np.uint64)
+    b = rng.randint(0, 1 << 61, size=PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+
+_A, _B = _permutations()
+
+
+def minhash(text: str) -> np.ndarray:
+    """PERMUTATIONS-value MinHash signature (uint32) of text's shingles."""
+    values = shingles(text)
+    if not values:
+        return np.full(PERMUTATIONS, _MAX_HASH, dtype=np.uint32)
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in values],
+        dtype=np.uint64,
+    )
+    # (a * h + b) mod p, truncated to 32 bits; a * h wraps at 2**64 like other MinHash implementations
+    permuted = ((hashes[:, None] * _A + _B) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def lsh_buckets(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket per band; the band number is hashed in so buckets of different bands never meet."""
+    buckets = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(
+            band.to_bytes(2, "little") + signature[band * _ROWS: (band + 1) * _ROWS].tobytes(), digest_size=8
+        ).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Jaccard similarity estimated from two signatures."""
+    return float(np.mean(left == right))
+
+
+def _signature(value: Any) -> Optional[np.ndarray]:
+    signature = np.frombuffer(bytes(value), dtype=np.uint32)
+    return signature if signature.size == PERMUTATIONS else None
+
+
+class NearDuplicateIndex:
+    """
+    Assigns a run's chunks to canonical chunks: candidates come from rag_chunk_minhash
+    (chunks stored by earlier runs) and from the chunks this index made canonical.
+    """
+
+    def __init__(self, connect: Callable[[], Any], locale: str = "en", threshold: float = DEFAULT_THRESHOLD):
+        """connect: async factory of psycopg async connections (PgVectorStore._aconnect)."""
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self._connect = connect
+        self.locale = locale
+        self.threshold = threshold
+        self._table_ready = False
+        self._canonicals: Dict[int, List[_Canonical]] = {}
+
+    async def _stored_candidates(self, buckets: List[int]) -> Dict[int, List[_Canonical]]:
+        async with await self._connect() as conn:
+            async with conn.cursor() as cur:
+                if not self._table_ready:
+                    await aensure_minhash_table(cur)
+                    self._table_ready = True
+                await cur.execute(_CANDIDATES_SQL, {"locale": self.locale, "buckets": buckets})
+                rows = await cur.fetchall()
+            await conn.commit()
+        by_bucket: Dict[int, List[_Canonical]] = {}
+        for chunk_id, doc_id, chunk_index, source, signature, row_buckets, hash_ in rows:
+            signature = _signature(signature)
+            if signature is None:
+                continue
+            canonical = _Canonical(chunk_id, doc_id, chunk_index, source, signature, hash_)
+            for bucket in row_buckets:
+                by_bucket.setdefault(bucket, []).append(canonical)
+        return by_bucket
+
+    def _match(self, signature: np.ndarray, buckets: List[int], stored, replaced) -> Optional[_Canonical]:
+        best, best_score = None, self.threshold
+        seen = set()
+        for bucket in buckets:
+            # This run's canonicals first: a stored chunk with the same id is its old version
+            candidates = self._canonicals.get(bucket, []) + [c for c in stored.get(bucket, []) if not replaced(c)]
+            for canonical in candidates:
+                if canonical.chunk_id in seen:
+                    continue
+                seen.add(canonical.chunk_id)
+                score = similarity(signature, canonical.signature)
+                if score >= best_score:
+                    best, best_score = canonical, score
+        return best
+
+    async def assign(self, chunks: Sequence[ChunkRef], chunk_counts: Optional[Dict[str, int]] = None) -> List[SignatureRow]:
+        """
+        One SignatureRow per chunk, in order; a chunk matching an earlier canonical chunk
+        (stored, or earlier in this run or in chunks) gets that chunk's canonical_id.
+        chunk_counts are the new chunk counts of the documents being rewritten: their
+        chunks past that count and the ids in chunks are about to be replaced, so they
+        are no candidates.
+        """
+        if not chunks:
+            return []
+        signatures = await asyncio.to_thread(lambda: [minhash(chunk.text) for chunk in chunks])
+        buckets = [lsh_buckets(signature) for signature in signatures]
+        stored = await self._stored_candidates(sorted({b for row in buckets for b in row}))
+        rewritten = {chunk.chunk_id for chunk in chunks}
+        counts = chunk_counts or {}
+
+        def replaced(canonical: _Canonical) -> bool:
+            if canonical.chunk_id in rewritten:
+                return True
+            return canonical.doc_id in counts and canonical.chunk_index >= counts[canonical.doc_id]
+
+        rows: List[SignatureRow] = []
+        for chunk, signature, chunk_buckets in zip(chunks, signatures, buckets):
+            row = SignatureRow(
+                chunk.chunk_id, chunk.doc_id, chunk.chunk_index, chunk.source, signature.tobytes(), chunk_buckets
+            )
+            match = self._match(signature, chunk_buckets, stored, replaced)
+            if match is not None:
+                row = row._replace(canonical_id=match.chunk_id, canonical_hash=match.content_hash)
+            else:
+                canonical = _Canonical(
+                    chunk.chunk_id, chunk.doc_id, chunk.chunk_index, chunk.source, signature, chunk.content_hash
+                )
+                for bucket in chunk_buckets:
+                    self._canonicals.setdefault(bucket, []).append(canonical)
+            rows.append(row)
+        return rows
+
+
+def ensure_minhash_table(cur) -> None:
+    for ddl in MINHASH_TABLE_DDL:
+        cur.execute(ddl)
+
+
+async def aensure_minhash_table(cur) -> None:
+    for ddl in MINHASH_TABLE_DDL:
+        await cur.execute(ddl)
+
+
+def minhash_table_exists(cur) -> bool:
+    cur.execute(_TABLE_EXISTS_SQL)
+    return bool(cur.fetchone()[0])
+
+
+async def aminhash_table_exists(cur) -> bool:
+    await cur.execute(_TABLE_EXISTS_SQL)
+    return bool((await cur.fetchone())[0])
+
+
+def _row_params(rows: Iterable[SignatureRow], locale: str) -> List[tuple]:
+    return [
+        (r.chunk_id, r.doc_id, locale, r.chunk_index, r.source, r.signature, r.buckets, r.canonical_id, r.canonical_hash)
+        for r in rows
+    ]
+
+
+def _touched(rows: Sequence[SignatureRow]) -> List[str]:
+    """Chunk ids whose alternate_sources may change: the canonicals written and the ones matched."""
+    return sorted({r.canonical_id or r.chunk_id for r in rows})
+
+
+def store_signatures(cur, rows: Sequence[SignatureRow], locale: str, chunk_counts: Dict[str, int]) -> List[str]:
+    """
+    Write rows (after their chunks): delete the duplicates' stored chunks, drop rows past
+    each document's chunk count and refresh the affected canonicals' alternate_sources.
+    Returns the doc_ids whose chunks changed.
+    """
+    touched = set(_touched(rows))
+    cur.execute(_DELETE_DUPLICATE_CHUNKS_SQL, {"chunk_ids": [r.chunk_id for r in rows if r.canonical_id]})
+    changed = {doc_id for (doc_id,) in cur.fetchall()}
+    for doc_id, count in chunk_counts.items():
+        cur.execute(_DELETE_TRAILING_SQL, (doc_id, locale, count))
+        touched.update(c for (c,) in cur.fetchall() if c)
+    cur.executemany(_UPSERT_SQL, _row_params(rows, locale))
+    return sorted(changed | set(refresh_alternates(cur, sorted(touched))))
+
+
+async def astore_signatures(cur, rows: Sequence[SignatureRow], locale: str, chunk_counts: Dict[str, int]) -> List[str]:
+    touched = set(_touched(rows))
+    await cur.execute(_DELETE_DUPLICATE_CHUNKS_SQL, {"chunk_ids": [r.chunk_id for r in rows if r.canonical_id]})
+    changed = {doc_id for (doc_id,) in await cur.fetchall()}
+    for doc_id, count in chunk_counts.items():
+        await cur.execute(_DELETE_TRAILING_SQL, (doc_id, locale, count))
+        touched.update(c for (c,) in await cur.fetchall() if c)
+    await cur.executemany(_UPSERT_SQL, _row_params(rows, locale))
+    return sorted(changed | set(await arefresh_alternates(cur, sorted(touched))))
+
+
+def refresh_alternates(cur, chunk_ids: List[str]) -> List[str]:
+    """Rewrite alternate_sources of these (canonical) chunks; returns the doc_ids of those still stored."""
+    if not chunk_ids:
+        return []
+    cur.execute(_REFRESH_ALTERNATES_SQL, {"chunk_ids": chunk_ids})
+    return sorted({row[0] for row in cur.fetchall()})
+
+
+async def arefresh_alternates(cur, chunk_ids: List[str]) -> List[str]:
+    if not chunk_ids:
+        return []
+    await cur.execute(_REFRESH_ALTERNATES_SQL, {"chunk_ids": chunk_ids})
+    return sorted({row[0] for row in await cur.fetchall()})
+
+
+def _by_locale(rows) -> Dict[str, List[str]]:
+    by_locale: Dict[str, set] = {}
+    for doc_id, locale in rows:
+        by_locale.setdefault(locale, set()).add(doc_id)
+    return {loc: sorted(ids) for loc, ids in by_locale.items()}
+
+
+def _released(rows) -> Tuple[Dict[str, List[str]], List[str]]:
+    return _by_locale((doc_id, locale) for doc_id, locale, _ in rows), sorted({row[2] for row in rows})
+
+
+def source_documents(cur, sources: Sequence[str], locale: Optional[str]) -> Dict[str, List[str]]:
+    """doc_ids by locale of the signatures recorded for sources (resolves a delete by source)."""
+    cur.execute(_SOURCE_DOCUMENTS_SQL, {"sources": list(sources), "locale": locale})
+    return _by_locale(cur.fetchall())
+
+
+async def asource_documents(cur, sources: Sequence[str], locale: Optional[str]) -> Dict[str, List[str]]:
+    await cur.execute(_SOURCE_DOCUMENTS_SQL, {"sources": list(sources), "locale": locale})
+    return _by_locale(await cur.fetchall())
+
+
+def release_duplicates(
+    cur, locale: Optional[str], doc_ids: Optional[Sequence[str]] = None
+) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    After chunks were deleted or rewritten: drop the signatures of deleted doc_ids and
+    release duplicates whose canonical chunk is gone or changed (only those of doc_ids'
+    chunks when doc_ids are given). Returns the released duplicates' doc_ids by locale
+    (their fingerprints must be forgotten) and the doc_ids whose alternate_sources changed.
+    """
+    canonicals: List[str] = []
+    matched: List[str] = []
+    if doc_ids:
+        cur.execute(_DELETE_DOCUMENTS_SQL, {"doc_ids": list(doc_ids), "locale": locale})
+        for chunk_id, canonical_id in cur.fetchall():
+            (matched if canonical_id else canonicals).append(canonical_id or chunk_id)
+        cur.execute(_RELEASE_CANONICALS_SQL, {"chunk_ids": canonicals})
+    else:
+        cur.execute(_RELEASE_ORPHANS_SQL, {"locale": locale})
+    released, released_from = _released(cur.fetchall())
+    return released, refresh_alternates(cur, sorted(set(matched) | set(released_from)))
+
+
+async def arelease_duplicates(
+    cur, locale: Optional[str], doc_ids: Optional[Sequence[str]] = None
+) -> Tuple[Dict[str, List[str]], List[str]]:
+    canonicals: List[str] = []
+    matched: List[str] = []
+    if doc_ids:
+        await cur.execute(_DELETE_DOCUMENTS_SQL, {"doc_ids": list(doc_ids), "locale": locale})
+        for chunk_id, canonical_id in await cur.fetchall():
+            (matched if canonical_id else canonicals).append(canonical_id or chunk_id)
+        await cur.execute(_RELEASE_CANONICALS_SQL, {"chunk_ids": canonicals})
+    else:
+        await cur.execute(_RELEASE_ORPHANS_SQL, {"locale": locale})
+    released, released_from = _released(await cur.fetchall())
+    return released, await arefresh_alternates(cur, sorted(set(matched) | set(released_from)))
+
+
+def collect_signature_garbage(cur, locale: Optional[str]) -> Tuple[int, Dict[str, List[str]], List[str]]:
+    """
+    Drop signatures of chunks no longer stored and of duplicates past their file's chunk
+    count, then release orphaned duplicates; (signatures dropped, released, alternates changed).
+    """
+    cur.execute(_STALE_CANONICALS_SQL, {"locale": locale})
+    dropped = cur.rowcount
+    cur.execute(_STALE_DUPLICATES_SQL, {"locale": locale})
+    matched = [c for (c,) in cur.fetchall() if c]
+    dropped += len(matched)
+    released, changed = release_duplicates(cur, locale)
+    return dropped, released, sorted(set(changed) | set(refresh_alternates(cur, sorted(set(matched)))))
+
+
+async def acollect_signature_garbage(cur, locale: Optional[str]) -> Tuple[int, Dict[str, List[str]], List[str]]:
+    await cur.execute(_STALE_CANONICALS_SQL, {"locale": locale})
+    dropped = cur.rowcount
+    await cur.execute(_STALE_DUPLICATES_SQL, {"locale": locale})
+    matched = [c for (c,) in await cur.fetchall() if c]
+    dropped += len(matched)
+    released, changed = await arelease_duplicates(cur, locale)
+    return dropped, released, sorted(set(changed) | set(await arefresh_alternates(cur, sorted(set(matched)))))
@@ -4,17 +4,101 @@ pgvector-backed vector store for RAG. Replaces ChromaDB with a single Postgres t
 import hashlib
 import json
 import logging
+import time
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import psycopg
-from pgvector.psycopg import register_vector
+from psycopg import sql
+from pgvector.psycopg import register_vector, register_vector_async
 
 try:
     from pgvector.psycopg import Vector
 except ImportError:
     from pgvector import Vector  # type: ignore[attr-defined]
 
+from managers.corpus_version import (
+    abump_corpus_version,
+    aensure_corpus_version_table,
+    aget_corpus_version,
+    bump_corpus_version,
+    ensure_corpus_version_table,
+    get_corpus_version,
+)
+from managers.compression import (
+    SENTENCE_EMBEDDINGS_DDL,
+    ainsert_sentence_embeddings,
+    amissing_sentences,
+    insert_sentence_embeddings,
+    missing_sentences,
+    sentence_embeddings_enabled,
+    sentence_rows,
+)
+from managers.document_index import (
+    adocument_table_exists,
+    arefresh_documents,
+    document_table_exists,
+    refresh_documents,
+    two_stage_search_sql,
+)
+from managers.document_lifecycle import (
+    acollect_garbage,
+    adelete_document,
+    adelete_documents,
+    aensure_source_index,
+    collect_garbage,
+    delete_document,
+    delete_documents,
+    ensure_source_index,
+)
+from managers.embedding_batcher import EmbeddingBatcher
+from managers.embeddings import (
+    EmbeddingSpec,
+    aget_active_spec,
+    default_spec,
+    ensure_settings_table,
+    get_active_spec,
+    make_embeddings,
+    set_setting,
+)
+from managers.file_fingerprints import (
+    FileFingerprint,
+    aensure_file_table,
+    afile_fingerprints,
+    aforget_files,
+    arecord_files,
+    ensure_file_table,
+    forget_files,
+    record_files,
+)
+from managers.facets import (
+    acopy_document_facets,
+    aensure_facet_columns,
+    copy_document_facets,
+    ensure_facet_columns,
+    facet_filter_sql,
+    facets_by_doc,
+)
+from managers.ingest_manifest import IngestManifest
+from managers.near_duplicates import (
+    DEFAULT_THRESHOLD,
+    ChunkRef,
+    NearDuplicateIndex,
+    SignatureRow,
+    acollect_signature_garbage,
+    aensure_minhash_table,
+    aminhash_table_exists,
+    arelease_duplicates,
+    asource_documents,
+    astore_signatures,
+    collect_signature_garbage,
+    ensure_minhash_table,
+    minhash_table_exists,
+    release_duplicates,
+    source_documents,
+    store_signatures,
+)
+from managers.vector_index import SET_SEARCH_PARAMS_SQL, VectorIndexManager, quantized_search_sql, validate_locale
 from managers.vector_store import VectorStoreBase
 
 
@@ -28,6 +112,140 @@ class DocLike:
         self.metadata = metadata
 
 
+# Every search returns (content, metadata, cosine distance); similarity is 1 - distance.
+# doc_id and chunk_index ride along in metadata so the context builder can merge adjacent chunks.
+_METADATA_COLUMN = (
+    "COALESCE(metadata, jsonb_build_object()) || jsonb_build_object('doc_id', doc_id, 'chunk_index', chunk_index)"
+)
+
+_SEARCH_SQL = sql.SQL("""
+    SELECT content, """ + _METADATA_COLUMN + """, embedding <=> %(embedding)s AS distance{extra}
+    FROM rag_chunks
+    WHERE locale = {locale}{filter}
+    ORDER BY embedding <=> %(embedding)s
+    LIMIT %(k)s;
+""")
+
+# Text-search configuration per locale; locales not listed here cannot use hybrid mode.
+# Must stay in sync with CONTENT_TSV_DDL (the generated column) below.
+TEXT_SEARCH_CONFIGS = {"en": "english", "es": "spanish"}
+
+CONTENT_TSV_DDL = """
+    ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector(CASE locale WHEN 'es' THEN 'spanish'::regconfig ELSE 'english'::regconfig END, content)
+    ) STORED;
+"""
+CONTENT_TSV_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_rag_chunks_content_tsv ON rag_chunks USING GIN (content_tsv);"
+
+# Vector and lexical candidate lists fused with RRF: score = sum(1 / (rrf_k + rank)), so exact
+# terms (CAP, AMA, Prop 400, county names) are not lost to embedding similarity.
+# The lexical query ORs the query's lexemes (plainto_tsquery ANDs them, which rarely matches a question).
+_HYBRID_SEARCH_SQL = sql.SQL("""
+    WITH vec AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rnk
+        FROM (
+            SELECT id, embedding <=> %(embedding)s AS distance
+            FROM rag_chunks
+            WHERE locale = {locale}{filter}
+            ORDER BY embedding <=> %(embedding)s
+            LIMIT %(vector_k)s
+        ) v
+    ),
+    tsq AS (
+        SELECT replace(plainto_tsquery({config}, %(query)s)::text, ' & ', ' | ')::tsquery AS q
+    ),
+    lex AS (
+        SELECT id, row_number() OVER (ORDER BY rank DESC) AS rnk
+        FROM (
+            SELECT id, ts_rank_cd(content_tsv, tsq.q) AS rank
+            FROM rag_chunks, tsq
+            WHERE locale = {locale}{filter} AND content_tsv @@ tsq.q
+            ORDER BY rank DESC
+            LIMIT %(lexical_k)s
+        ) l
+    ),
+    fused AS (
+        SELECT COALESCE(vec.id, lex.id) AS id,
+               COALESCE(1.0 / (%(rrf_k)s + vec.rnk), 0) + COALESCE(1.0 / (%(rrf_k)s + lex.rnk), 0) AS score
+        FROM vec FULL OUTER JOIN lex ON vec.id = lex.id
+    )
+    SELECT c.content,
+           COALESCE(c.metadata, jsonb_build_object()) || jsonb_build_object('doc_id', c.doc_id, 'chunk_index', c.chunk_index),
+           c.embedding <=> %(embedding)s AS distance{extra}
+    FROM fused JOIN rag_chunks c ON c.id = fused.id
+    ORDER BY fused.score DESC
+    LIMIT %(k)s;
+""")
+
+_CHUNK_COLUMNS = "id, doc_id, chunk_index, content, embedding, metadata, content_hash, locale, regions, doc_type, publisher"
+_ON_CONFLICT_SQL = """
+    ON CONFLICT (id)
+    DO UPDATE SET
+        content = EXCLUDED.content,
+        embedding = EXCLUDED.embedding,
+        metadata = EXCLUDED.metadata,
+        content_hash = EXCLUDED.content_hash,
+        regions = EXCLUDED.regions,
+        doc_type = EXCLUDED.doc_type,
+        publisher = EXCLUDED.publisher;
+"""
+_UPSERT_SQL = (
+    "INSERT INTO rag_chunks (" + _CHUNK_COLUMNS + ") VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s)"
+    + _ON_CONFLICT_SQL
+)
+
+# Bulk path: binary COPY of _UPSERT_SQL rows into a per-connection temp table, then one
+# INSERT ... SELECT ... ON CONFLICT per batch. ord keeps the last of duplicate ids in a
+# batch, as the row-by-row upsert would.
+_STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS rag_chunks_staging (
+        id TEXT, doc_id TEXT, chunk_index INT, content TEXT, embedding vector, metadata TEXT,
+        content_hash TEXT, locale TEXT, regions TEXT[], doc_type TEXT, publisher TEXT, ord INT
+    ) ON COMMIT DELETE ROWS;
+"""
+_STAGING_TYPES = ["text", "text", "int4", "text", "vector", "text", "text", "text", "text[]", "text", "text", "int4"]
+_COPY_STAGING_SQL = "COPY rag_chunks_staging (" + _CHUNK_COLUMNS + ", ord) FROM STDIN (FORMAT BINARY)"
+_MERGE_STAGING_SQL = (
+    "INSERT INTO rag_chunks (" + _CHUNK_COLUMNS + ") "
+    "SELECT DISTINCT ON (id) id, doc_id, chunk_index, content, embedding, metadata::jsonb, content_hash, locale, "
+    "regions, doc_type, publisher FROM rag_chunks_staging ORDER BY id, ord DESC"
+    + _ON_CONFLICT_SQL
+)
+_TRUNCATE_STAGING_SQL = "TRUNCATE rag_chunks_staging;"
+
+# Rows past a re-added document's last chunk (it got shorter)
+_DELETE_TRAILING_SQL = "DELETE FROM rag_chunks WHERE doc_id = %s AND locale = %s AND chunk_index >= %s;"
+_CORPUS_STATS_SQL = """
+    SELECT count(*), count(DISTINCT doc_id), coalesce(sum(length(content)), 0)
+    FROM rag_chunks WHERE locale = %(locale)s;
+"""
+_FILE_STATS_SQL = "SELECT count(*), max(ingested_at) FROM rag_files WHERE locale = %(locale)s;"
+_UNSIGNED_CHUNKS_SQL = """
+    SELECT c.id, c.doc_id, c.chunk_index, c.content, c.content_hash, c.metadata->>'source'
+    FROM rag_chunks c
+    WHERE c.locale = %(locale)s AND c.id > %(after)s
+      AND NOT EXISTS (SELECT 1 FROM rag_chunk_minhash m WHERE m.chunk_id = c.id)
+    ORDER BY c.id
+    LIMIT %(limit)s;
+"""
+_CHUNK_STATE_SQL = """
+    SELECT chunk_index, content_hash, embedding FROM rag_chunks
+    WHERE doc_id = %(doc_id)s AND locale = %(locale)s
+    ORDER BY chunk_index;
+"""
+
+
+def chunk_id(doc_id: str, index: int) -> str:
+    """rag_chunks.id of a document's chunk_index-th chunk."""
+    return hashlib.sha256(f"{doc_id}:{index}".encode()).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """rag_chunks.content_hash of a chunk's text (as stored, i.e. without NUL)."""
+    return hashlib.sha256(_strip_nul(text).encode("utf-8")).hexdigest()
+
+
 def _filter_params(params: Dict[str, Optional[str]]) -> Dict[str, str]:
     """Filter out None/empty so psycopg.connect(**params) works."""
     return {k: str(v) for k, v in params.items() if v is not None and v != ""}
@@ -51,21 +269,264 @@ def _strip_nul_meta(val: Any) -> Any:
     return val
 
 
+def _metadata_json(meta: Any) -> str:
+    """Serialize chunk metadata for the jsonb column; only metadata that contains NUL is walked."""
+    if not isinstance(meta, dict):
+        return "{}"
+    text = json.dumps({k: v for k, v in meta.items() if isinstance(k, str)}, default=str)
+    if "\\u0000" in text:
+        text = json.dumps(_strip_nul_meta(json.loads(text)))
+    return text
+
+
+def _batches(rows: List[tuple], batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def _document_heads(rows: List[tuple]) -> List[str]:
+    """One written chunk id per (doc_id, locale): the source of that document's facets."""
+    return list({(row[1], row[7]): row[0] for row in rows}.values())
+
+
+def upsert_rows(cur, rows: List[tuple], batch_size: int = 5000) -> None:
+    """
+    Write _UPSERT_SQL rows: binary COPY into a staging table and one merge per batch_size
+    rows, or one INSERT ... ON CONFLICT per row when batch_size is 0. The documents' rows
+    that were not rewritten then get the written rows' facets.
+    """
+    if not rows:
+        return
+    if not batch_size:
+        cur.executemany(_UPSERT_SQL, rows)
+    else:
+        cur.execute(_STAGING_DDL)
+        for batch in _batches(rows, batch_size):
+            with cur.copy(_COPY_STAGING_SQL) as copy:
+                copy.set_types(_STAGING_TYPES)
+                for ord_, row in enumerate(batch):
+                    copy.write_row(row + (ord_,))
+            cur.execute(_MERGE_STAGING_SQL)
+            cur.execute(_TRUNCATE_STAGING_SQL)
+    copy_document_facets(cur, _document_heads(rows))
+
+
+async def aupsert_rows(cur, rows: List[tuple], batch_size: int = 5000) -> None:
+    if not rows:
+        return
+    if not batch_size:
+        await cur.executemany(_UPSERT_SQL, rows)
+    else:
+        await cur.execute(_STAGING_DDL)
+        for batch in _batches(rows, batch_size):
+            async with cur.copy(_COPY_STAGING_SQL) as copy:
+                copy.set_types(_STAGING_TYPES)
+                for ord_, row in enumerate(batch):
+                    await copy.write_row(row + (ord_,))
+            await cur.execute(_MERGE_STAGING_SQL)
+            await cur.execute(_TRUNCATE_STAGING_SQL)
+    await acopy_document_facets(cur, _document_heads(rows))
+
+
+def _search_sql(locale: str, with_embedding: bool = False, where: str = "") -> sql.Composed:
+    """Inline the (quoted) locale so the planner can match the per-locale partial ANN index."""
+    return _SEARCH_SQL.format(
+        locale=sql.Literal(locale),
+        filter=sql.SQL(where),
+        extra=sql.SQL(", embedding" if with_embedding else ""),
+    )
+
+
+def _quantized_search_sql(
+    locale: str, quantization: str, dimensions: int, with_embedding: bool = False, where: str = ""
+) -> sql.SQL:
+    # quantized_search_sql validates and quotes the locale itself
+    return sql.SQL(
+        quantized_search_sql(
+            locale,
+            quantization,
+            dimensions,
+            columns=f"content, {_METADATA_COLUMN}",
+            with_embedding=with_embedding,
+            where=where,
+        )
+    )
+
+
+def _two_stage_search_sql(locale: str, with_embedding: bool = False, where: str = "") -> sql.SQL:
+    # two_stage_search_sql validates and quotes the locale itself
+    return sql.SQL(
+        two_stage_search_sql(locale, columns=f"content, {_METADATA_COLUMN}", with_embedding=with_embedding, where=where)
+    )
+
+
+def _hybrid_search_sql(locale: str, with_embedding: bool = False, where: str = "") -> sql.Composed:
+    return _HYBRID_SEARCH_SQL.format(
+        locale=sql.Literal(locale),
+        config=sql.SQL("{}::regconfig").format(sql.Literal(TEXT_SEARCH_CONFIGS[locale])),
+        filter=sql.SQL(where),
+        extra=sql.SQL(", c.embedding" if with_embedding else ""),
+    )
+
+
+def _to_docs(rows) -> List[DocLike]:
+    return [
+        DocLike(
+            page_content=row[0] or "",
+            metadata=dict(row[1]) if row[1] else {},
+        )
+        for row in rows
+    ]
+
+
+def _to_scored(rows) -> List[Tuple[DocLike, Optional[float]]]:
+    """(document, cosine distance) pairs; distance is None for rows without one."""
+    return [
+        (doc, float(row[2]) if len(row) > 2 and row[2] is not None else None)
+        for doc, row in zip(_to_docs(rows), rows)
+    ]
+
+
+def _to_scored_with_vectors(rows) -> List[Tuple[DocLike, Optional[float], Any]]:
+    """(document, cosine distance, embedding) triples from rows searched with_embedding."""
+    return [(doc, distance, row[3]) for (doc, distance), row in zip(_to_scored(rows), rows)]
+
+
+def _document_rows(
+    documents: List[Any], embeddings: List[List[float]], locale: str, owner: Optional[str] = None
+) -> List[tuple]:
+    """
+    Build _UPSERT_SQL parameter tuples for LangChain-style documents and their embeddings.
+    chunk_index counts within each document (metadata "chunk_index" overrides it when a
+    caller writes only some of a document's chunks), so ids are stable across runs.
+    Likewise metadata "facets" (computed by the loader over the whole document) overrides
+    the facets computed from this batch's chunks.
+    With owner set, every document is a chunk of the document with that doc_id.
+    """
+    rows = []
+    doc_ids = []
+    known_facets: Dict[str, Dict[str, Any]] = {}
+    for doc in documents:
+        meta = getattr(doc, "metadata", {}) or {}
+        doc_ids.append(owner or meta.get("doc_id") or meta.get("source") or str(uuid.uuid4()))
+        if isinstance(meta.get("facets"), dict):
+            known_facets[doc_ids[-1]] = meta["facets"]
+    facets = facets_by_doc(
+        doc_ids,
+        [(getattr(doc, "metadata", {}) or {}).get("source", "") for doc in documents],
+        [getattr(doc, "page_content", str(doc)) for doc in documents],
+        known_facets,
+    )
+    positions: Dict[str, int] = {}
+    for doc, embedding, doc_id in zip(documents, embeddings, doc_ids):
+        meta = getattr(doc, "metadata", {}) or {}
+        index = meta.get("chunk_index")
+        if not isinstance(index, int):
+            index = positions.get(doc_id, 0)
+        positions[doc_id] = index + 1
+        # chunk_index and the facets have their own columns
+        if "chunk_index" in meta or "facets" in meta:
+            meta = {k: v for k, v in meta.items() if k not in ("chunk_index", "facets")}
+        # Unique id per chunk (metadata "id" from LangChain is often same for all chunks from one doc)
+        content = _strip_nul(getattr(doc, "page_content", str(doc)))
+        rows.append(
+            (
+                chunk_id(doc_id, index),
+                doc_id,
+                index,
+                content,
+                embedding,
+                _metadata_json(meta),
+                content_hash(content),
+                locale,
+                facets[doc_id]["regions"],
+                facets[doc_id]["doc_type"],
+                facets[doc_id]["publisher"],
+            )
+        )
+    return rows
+
+
+def _chunk_counts(rows: List[tuple], files: Optional[List[FileFingerprint]]) -> Dict[str, int]:
+    """Chunks per written document: the files' counts where given, else one past the highest index written."""
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row[1]] = max(counts.get(row[1], 0), row[2] + 1)
+    for f in files or []:
+        counts[f.path] = f.chunk_count
+    return counts
+
+
+def _merge_deleted(deleted: Dict[str, List[str]], more: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    merged = {loc: set(ids) for loc, ids in deleted.items()}
+    for loc, ids in more.items():
+        merged.setdefault(loc, set()).update(ids)
+    return {loc: sorted(ids) for loc, ids in merged.items()}
+
+
 class PgVectorStore(VectorStoreBase):
     """Vector store using PostgreSQL pgvector. Uses same DB as messages (DB_PARAMS)."""
 
+    supports_filters = True
+
     def __init__(
         self,
         db_params: Optional[Dict[str, Optional[str]]] = None,
         db_url: Optional[str] = None,
         embedding_function: Optional[Any] = None,
+        index_manager: Optional[VectorIndexManager] = None,
+        hybrid_locales: Optional[List[str]] = None,
+        hybrid_vector_candidates: int = 40,
+        hybrid_lexical_candidates: int = 40,
+        rrf_k: int = 60,
+        embedding_spec: Optional[EmbeddingSpec] = None,
+        spec_refresh_interval: Optional[float] = None,
+        sentence_embeddings: Optional[bool] = None,
+        document_candidates: int = 0,
+        bulk_batch_size: int = 5000,
     ):
+        """
+        embedding_spec describes embedding_function (model + dimensions). With spec_refresh_interval
+        set, the active spec in rag_settings is re-read at most that often and embedding_function is
+        replaced when a re-embedding migration has swapped the corpus to a new spec.
+        sentence_embeddings (default: RAG_SENTENCE_EMBEDDINGS) also caches per-sentence embeddings
+        of added chunks for query-time context compression (managers/compression.py).
+        document_candidates > 0 makes vector-only searches two-stage over that many documents.
+        bulk_batch_size rows are written per binary COPY + merge; 0 writes one upsert per row.
+        """
         if not db_params and not db_url:
             raise ValueError("Provide either db_params or db_url")
         self._db_params = db_params
         self._db_url = db_url
         self._embedding_function = embedding_function
-        logging.info("PgVectorStore initialized (pgvector backend)")
+        self._index_manager = index_manager
+        # IVFFlat lists of each locale's live index, read once per process for probes sizing
+        self._index_lists: Dict[str, Optional[int]] = {}
+        # Whether the server can run the quantized search (None: not checked yet)
+        self._quantization_supported: Optional[bool] = None
+        unsupported = [loc for loc in hybrid_locales or [] if loc not in TEXT_SEARCH_CONFIGS]
+        if unsupported:
+            raise ValueError(f"No text-search configuration for hybrid locales {unsupported}")
+        self._hybrid_locales = set(hybrid_locales or [])
+        self._hybrid_vector_candidates = hybrid_vector_candidates
+        self._hybrid_lexical_candidates = hybrid_lexical_candidates
+        self._rrf_k = rrf_k
+        self._version_table_ready = False
+        self._facet_columns_ready = False
+        self._file_table_ready = False
+        self._source_index_ready = False
+        # Whether rag_documents exists (None: not checked yet); writers keep it current once it does
+        self._documents_table: Optional[bool] = None
+        # Whether rag_chunk_minhash exists (None: not checked yet); deletes release near-duplicates once it does
+        self._minhash_table: Optional[bool] = None
+        self._document_candidates = document_candidates
+        self._bulk_batch_size = bulk_batch_size
+        self._sentence_embeddings = sentence_embeddings_enabled() if sentence_embeddings is None else sentence_embeddings
+        self._sentence_table_ready = False
+        self._spec = embedding_spec or default_spec()
+        self._spec_refresh_interval = spec_refresh_interval
+        self._spec_checked_at = 0.0
+        logging.info("PgVectorStore initialized (pgvector backend, hybrid locales=%s)", sorted(self._hybrid_locales) or "none")
 
     def _connect(self):
         if self._db_url:
@@ -75,7 +536,362 @@ class PgVectorStore(VectorStoreBase):
         register_vector(conn)
         return conn
 
-    def similarity_search(self, query: str, k: int = 4, locale: str = "en") -> List[Any]:
+    async def _aconnect(self):
+        if self._db_url:
+            conn = await psycopg.AsyncConnection.connect(self._db_url)
+        else:
+            conn = await psycopg.AsyncConnection.connect(**_filter_params(self._db_params or {}))
+        await register_vector_async(conn)
+        return conn
+
+    @property
+    def embedding_function(self) -> Optional[Any]:
+        return self._embedding_function
+
+    @property
+    def embedding_spec(self) -> EmbeddingSpec:
+        return self._spec
+
+    def _spec_due(self, force: bool) -> bool:
+        if force:
+            return True
+        if self._spec_refresh_interval is None:
+            return False
+        return time.monotonic() - self._spec_checked_at >= self._spec_refresh_interval
+
+    def _apply_spec(self, spec: Optional[EmbeddingSpec]) -> bool:
+        if spec is None or spec == self._spec:
+            return False
+        logging.info("Embedding spec changed %s -> %s; switching query embeddings", self._spec, spec)
+        if isinstance(self._embedding_function, EmbeddingBatcher):
+            # Keep the ingestion scheduler (and its learned concurrency) around the new model
+            self._embedding_function = self._embedding_function.with_embeddings(make_embeddings(spec, max_retries=0))
+        else:
+            self._embedding_function = make_embeddings(spec)
+        self._spec = spec
+        return True
+
+    def expire_embedding_spec(self) -> None:
+        """Make the next search re-read the active spec (e.g. on a corpus-version notification)."""
+        self._spec_checked_at = 0.0
+
+    def refresh_embedding_spec(self, force: bool = False) -> bool:
+        """Follow a re-embedding swap; returns True when the spec changed."""
+        if not self._spec_due(force):
+            return False
+        self._spec_checked_at = time.monotonic()
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    spec = get_active_spec(cur)
+        except psycopg.Error as e:
+            # No rag_settings table yet: the configured spec applies
+            logging.debug("Could not read active embedding spec: %s", e)
+            return False
+        return self._apply_spec(spec)
+
+    async def arefresh_embedding_spec(self, force: bool = False) -> bool:
+        if not self._spec_due(force):
+            return False
+        self._spec_checked_at = time.monotonic()
+        try:
+            async with await self._aconnect() as conn:
+                async with conn.cursor() as cur:
+                    spec = await aget_active_spec(cur)
+        except psycopg.Error as e:
+            logging.debug("Could not read active embedding spec: %s", e)
+            return False
+        return self._apply_spec(spec)
+
+    def _bump_version(self, cur, doc_ids: Optional[List[str]] = None) -> int:
+        """Bump the corpus version in the writer's transaction (creates the table on first use)."""
+        if not self._version_table_ready:
+            ensure_corpus_version_table(cur)
+            self._version_table_ready = True
+        return bump_corpus_version(cur, doc_ids)
+
+    async def _abump_version(self, cur, doc_ids: Optional[List[str]] = None) -> int:
+        if not self._version_table_ready:
+            await aensure_corpus_version_table(cur)
+            self._version_table_ready = True
+        return await abump_corpus_version(cur, doc_ids)
+
+    def _ensure_facet_columns(self, cur) -> None:
+        if not self._facet_columns_ready:
+            ensure_facet_columns(cur)
+            self._facet_columns_ready = True
+
+    async def _aensure_facet_columns(self, cur) -> None:
+        if not self._facet_columns_ready:
+            await aensure_facet_columns(cur)
+            self._facet_columns_ready = True
+
+    def _record_files(self, cur, files: Optional[List[FileFingerprint]], locale: str) -> None:
+        if not files:
+            return
+        if not self._file_table_ready:
+            ensure_file_table(cur)
+            self._file_table_ready = True
+        record_files(cur, files, locale)
+
+    async def _arecord_files(self, cur, files: Optional[List[FileFingerprint]], locale: str) -> None:
+        if not files:
+            return
+        if not self._file_table_ready:
+            await aensure_file_table(cur)
+            self._file_table_ready = True
+        await arecord_files(cur, files, locale)
+
+    def _refresh_documents(self, cur, doc_ids: List[str]) -> None:
+        """Update the writer's documents in rag_documents; a failure there never fails the write."""
+        try:
+            with cur.connection.transaction():
+                if self._documents_table is None:
+                    self._documents_table = document_table_exists(cur)
+                if self._documents_table:
+                    refresh_documents(cur, doc_ids)
+        except psycopg.Error as e:
+            logging.warning("Could not refresh rag_documents (rebuild it with scripts/vector_index_admin.py documents): %s", e)
+
+    async def _arefresh_documents(self, cur, doc_ids: List[str]) -> None:
+        try:
+            async with cur.connection.transaction():
+                if self._documents_table is None:
+                    self._documents_table = await adocument_table_exists(cur)
+                if self._documents_table:
+                    await arefresh_documents(cur, doc_ids)
+        except psycopg.Error as e:
+            logging.warning("Could not refresh rag_documents (rebuild it with scripts/vector_index_admin.py documents): %s", e)
+
+    @property
+    def sentence_embeddings(self) -> bool:
+        """Whether writes also cache per-sentence embeddings (see embed_sentences)."""
+        return self._sentence_embeddings
+
+    def embed_sentences(self, texts: List[str]) -> List[Tuple[str, Any]]:
+        """
+        Embed the sentences of texts that are not cached yet, for a later write's sentences=.
+        Runs before the write transaction opens (the lookup commits first); a failure is logged
+        and nothing is cached, since compression embeds missing sentences at query time anyway.
+        """
+        if not self._sentence_embeddings or not texts:
+            return []
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    if not self._sentence_table_ready:
+                        cur.execute(SENTENCE_EMBEDDINGS_DDL)
+                        self._sentence_table_ready = True
+                    missing = missing_sentences(cur, texts, self._spec)
+                conn.commit()
+            if not missing:
+                return []
+            return sentence_rows(missing, self._embedding_function.embed_documents(list(missing.values())))
+        except Exception as e:
+            logging.warning("Could not embed %s chunk(s) by sentence; compression will embed them at query time: %s", len(texts), e)
+            return []
+
+    async def aembed_sentences(self, texts: List[str]) -> List[Tuple[str, Any]]:
+        if not self._sentence_embeddings or not texts:
+            return []
+        try:
+            async with await self._aconnect() as conn:
+                async with conn.cursor() as cur:
+                    if not self._sentence_table_ready:
+                        await cur.execute(SENTENCE_EMBEDDINGS_DDL)
+                        self._sentence_table_ready = True
+                    missing = await amissing_sentences(cur, texts, self._spec)
+                await conn.commit()
+            if not missing:
+                return []
+            return sentence_rows(missing, await self._embedding_function.aembed_documents(list(missing.values())))
+        except Exception as e:
+            logging.warning("Could not embed %s chunk(s) by sentence; compression will embed them at query time: %s", len(texts), e)
+            return []
+
+    def _store_sentences(self, cur, rows: List[Tuple[str, Any]]) -> None:
+        if not rows:
+            return
+        if not self._sentence_table_ready:
+            cur.execute(SENTENCE_EMBEDDINGS_DDL)
+            self._sentence_table_ready = True
+        insert_sentence_embeddings(cur, rows, self._spec)
+        logging.info("PgVectorStore: cached %s new sentence embedding(s)", len(rows))
+
+    async def _astore_sentences(self, cur, rows: List[Tuple[str, Any]]) -> None:
+        if not rows:
+            return
+        if not self._sentence_table_ready:
+            await cur.execute(SENTENCE_EMBEDDINGS_DDL)
+            self._sentence_table_ready = True
+        await ainsert_sentence_embeddings(cur, rows, self._spec)
+        logging.info("PgVectorStore: cached %s new sentence embedding(s)", len(rows))
+
+    def get_corpus_version(self) -> int:
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                return get_corpus_version(cur)
+
+    def corpus_stats(self, locale: str = "en") -> Dict[str, Any]:
+        """Chunks, documents and characters stored for locale, its ingested files, and the corpus version."""
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_CORPUS_STATS_SQL, {"locale": locale})
+                chunks, documents, characters = cur.fetchone()
+                ensure_file_table(cur)
+                self._file_table_ready = True
+                cur.execute(_FILE_STATS_SQL, {"locale": locale})
+                files, last_ingested = cur.fetchone()
+                ensure_corpus_version_table(cur)
+                self._version_table_ready = True
+                version = get_corpus_version(cur)
+            conn.commit()
+        return {
+            "locale": locale,
+            "chunks": chunks,
+            "documents": documents,
+            "characters": characters,
+            "files": files,
+            "last_ingested_at": last_ingested.isoformat() if last_ingested else None,
+            "corpus_version": version,
+        }
+
+    async def aget_corpus_version(self) -> int:
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                return await aget_corpus_version(cur)
+
+    def _search_query(
+        self,
+        query: str,
+        embedding: Vector,
+        k: int,
+        locale: str,
+        with_embedding: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        SQL and params for one search: hybrid (RRF) when enabled for the locale, else vector-only.
+        filters restricts every candidate scan to chunks with those facets.
+        Rows are (content, metadata, distance[, embedding]).
+        """
+        where, params = facet_filter_sql(filters)
+        params.update(embedding=embedding, k=k)
+        if locale not in self._hybrid_locales:
+            if self._document_candidates:
+                params["documents"] = self._document_candidates
+                return _two_stage_search_sql(locale, with_embedding, where), params
+            quantization = self._quantization()
+            if quantization != "none":
+                params["candidates"] = self._index_manager.candidates_for(k)
+                return _quantized_search_sql(locale, quantization, self._spec.dimensions, with_embedding, where), params
+            return _search_sql(locale, with_embedding, where), params
+        params.update(
+            query=query,
+            vector_k=max(k, self._hybrid_vector_candidates),
+            lexical_k=max(k, self._hybrid_lexical_candidates),
+            rrf_k=self._rrf_k,
+        )
+        return _hybrid_search_sql(locale, with_embedding, where), params
+
+    def _quantization(self) -> str:
+        if not self._index_manager or self._quantization_supported is False:
+            return "none"
+        return self._index_manager.quantization
+
+    def _unsupported_quantization(self) -> None:
+        logging.warning(
+            "RAG_QUANTIZATION=%s needs pgvector >= 0.7; searching at full precision", self._index_manager.quantization
+        )
+
+    def _check_quantization(self, cur) -> None:
+        """Read once whether pgvector can run the quantized search; fall back to full precision if not."""
+        if self._quantization_supported is not None or self._quantization() == "none":
+            return
+        self._quantization_supported = self._index_manager.supports_quantization(cur)
+        if not self._quantization_supported:
+            self._unsupported_quantization()
+
+    async def _acheck_quantization(self, cur) -> None:
+        if self._quantization_supported is not None or self._quantization() == "none":
+            return
+        self._quantization_supported = await self._index_manager.asupports_quantization(cur)
+        if not self._quantization_supported:
+            self._unsupported_quantization()
+
+    def _search_params(self, locale: str, k: int) -> tuple:
+        if self._document_candidates and locale not in self._hybrid_locales:
+            # hnsw.ef_search also bounds how many documents the document index returns
+            k = max(k, self._document_candidates)
+        elif self._quantization() != "none" and locale not in self._hybrid_locales:
+            # The HNSW candidate queue must be at least as deep as the re-scoring pool
+            k = self._index_manager.candidates_for(k)
+        settings = self._index_manager.search_settings(self._index_lists.get(locale), k=k)
+        return (settings["ivfflat.probes"], settings["hnsw.ef_search"])
+
+    def _should_tune(self, locale: str) -> bool:
+        if not self._index_manager:
+            return False
+        try:
+            validate_locale(locale)
+        except ValueError:
+            return False
+        return True
+
+    def _apply_search_settings(self, cur, locale: str, k: int) -> None:
+        """Set ivfflat.probes / hnsw.ef_search for the current transaction from the recall target."""
+        self._check_quantization(cur)
+        if not self._should_tune(locale):
+            return
+        if locale not in self._index_lists:
+            self._index_lists[locale] = self._index_manager.current_lists(cur, locale)
+        cur.execute(SET_SEARCH_PARAMS_SQL, self._search_params(locale, k))
+
+    async def _aapply_search_settings(self, cur, locale: str, k: int) -> None:
+        await self._acheck_quantization(cur)
+        if not self._should_tune(locale):
+            return
+        if locale not in self._index_lists:
+            self._index_lists[locale] = await self._index_manager.acurrent_lists(cur, locale)
+        await cur.execute(SET_SEARCH_PARAMS_SQL, self._search_params(locale, k))
+
+    def rebuild_index(self, locale: Optional[str] = None) -> str:
+        """Rebuild ANN indexes after bulk ingestion (REINDEX/recreate CONCURRENTLY on an autocommit connection)."""
+        manager = self._index_manager or VectorIndexManager()
+        with self._connect() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                action = manager.rebuild(cur, locale)
+        self._index_lists.clear()
+        return action
+
+    def similarity_search(
+        self, query: str, k: int = 4, locale: str = "en", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        return _to_docs(self._search_rows(query, k, locale, filters))
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, locale: str = "en", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Any, Optional[float]]]:
+        return _to_scored(self._search_rows(query, k, locale, filters))
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, locale: str = "en", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        return _to_docs(await self._asearch_rows(query, k, locale, filters=filters))
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, locale: str = "en", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Any, Optional[float]]]:
+        return _to_scored(await self._asearch_rows(query, k, locale, filters=filters))
+
+    async def asimilarity_search_with_vectors(
+        self, query: str, k: int = 4, locale: str = "en", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Any, Optional[float], Any]]:
+        return _to_scored_with_vectors(await self._asearch_rows(query, k, locale, with_embedding=True, filters=filters))
+
+    def _search_rows(self, query: str, k: int, locale: str, filters: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        self.refresh_embedding_spec()
         if not self._embedding_function:
             raise ValueError("embedding_function required for similarity_search")
         embedding = self._embedding_function.embed_query(query)
@@ -86,72 +902,493 @@ class PgVectorStore(VectorStoreBase):
 
         with self._connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT content, metadata
-                    FROM rag_chunks
-                    WHERE locale = %s
-                    ORDER BY embedding <=> %s
-                    LIMIT %s;
-                    """,
-                    (locale, embedding, k),
-                )
-                rows = cur.fetchall()
+                self._apply_search_settings(cur, locale, k)
+                cur.execute(*self._search_query(query, embedding, k, locale, filters=filters))
+                return cur.fetchall()
 
-        return [
-            DocLike(
-                page_content=row[0] or "",
-                metadata=dict(row[1]) if row[1] else {},
-            )
-            for row in rows
-        ]
+    async def _asearch_rows(
+        self,
+        query: str,
+        k: int,
+        locale: str,
+        with_embedding: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[tuple]:
+        await self.arefresh_embedding_spec()
+        if not self._embedding_function:
+            raise ValueError("embedding_function required for similarity_search")
+        embedding = await self._embedding_function.aembed_query(query)
+        if not embedding:
+            return []
+        embedding = Vector(list(embedding))
+
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await self._aapply_search_settings(cur, locale, k)
+                await cur.execute(*self._search_query(query, embedding, k, locale, with_embedding, filters))
+                return await cur.fetchall()
+
+    async def asimilarity_search_batch(self, queries: List[str], k: int = 4, locale: str = "en") -> List[List[Any]]:
+        if not queries:
+            return []
+        await self.arefresh_embedding_spec()
+        if not self._embedding_function:
+            raise ValueError("embedding_function required for similarity_search")
+        # One embeddings request for every query (OpenAI embeddings are symmetric for queries/documents)
+        embeddings = await self._embedding_function.aembed_documents(list(queries))
+
+        results: List[List[Any]] = []
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await self._aapply_search_settings(cur, locale, k)
+            # Pipeline mode sends all searches before waiting for the first result
+            async with conn.pipeline():
+                cursors = []
+                for query, embedding in zip(queries, embeddings):
+                    cur = conn.cursor()
+                    await cur.execute(*self._search_query(query, Vector(list(embedding)), k, locale))
+                    cursors.append(cur)
+                for cur in cursors:
+                    results.append(_to_docs(await cur.fetchall()))
+        return results
 
     def add_documents(self, documents: List[Any], locale: str = "en") -> None:
         if not documents:
             return
+        self.refresh_embedding_spec()
         if not self._embedding_function:
             raise ValueError("embedding_function required for add_documents")
+        texts = [getattr(d, "page_content", str(d)) for d in documents]
+        self.add_embedded_documents(documents, self._embedding_function.embed_documents(texts), locale)
 
+    async def aadd_documents(self, documents: List[Any], locale: str = "en") -> None:
+        if not documents:
+            return
+        await self.arefresh_embedding_spec()
+        if not self._embedding_function:
+            raise ValueError("embedding_function required for add_documents")
         texts = [getattr(d, "page_content", str(d)) for d in documents]
-        embeddings = self._embedding_function.embed_documents(texts)
+        await self.aadd_embedded_documents(documents, await self._embedding_function.aembed_documents(texts), locale)
 
+    def add_embedded_documents(
+        self,
+        documents: List[Any],
+        embeddings: List[List[float]],
+        locale: str = "en",
+        files: Optional[List[FileFingerprint]] = None,
+        signatures: Optional[List[SignatureRow]] = None,
+        sentences: Optional[List[Tuple[str, Any]]] = None,
+    ) -> None:
+        """
+        Upsert documents whose embeddings were computed by the caller, in one transaction.
+        files (path = doc_id) are fingerprinted in the same transaction; their chunk_count
+        bounds the document when only its changed chunks are passed. signatures are the
+        MinHash rows of the documents' new chunks, near-duplicates (left out of documents)
+        included (managers/near_duplicates.py). sentences are embed_sentences() of the
+        documents' texts, embedded here (before the transaction) when not given.
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError("documents and embeddings must be the same length")
+        if not documents and not files:
+            return
+        if sentences is None:
+            sentences = self.embed_sentences([getattr(d, "page_content", str(d)) for d in documents])
         with self._connect() as conn:
             with conn.cursor() as cur:
-                for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                    meta = getattr(doc, "metadata", {}) or {}
-                    # Ensure JSON-serializable (e.g. for LangChain metadata)
-                    meta_serializable = {k: v for k, v in meta.items() if isinstance(k, str)}
-                    meta_serializable = json.loads(json.dumps(meta_serializable, default=str))
-                    doc_id = meta.get("doc_id") or meta.get("source") or str(uuid.uuid4())
-                    # Unique id per chunk (metadata "id" from LangChain is often same for all chunks from one doc)
-                    chunk_id = hashlib.sha256(f"{doc_id}:{i}".encode()).hexdigest()
-                    content = getattr(doc, "page_content", str(doc))
-                    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
-                    cur.execute(
-                        """
-                        INSERT INTO rag_chunks (id, doc_id, chunk_index, content, embedding, metadata, content_hash, locale)
-                        VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s)
-                        ON CONFLICT (id)
-                        DO UPDATE SET
-                            content = EXCLUDED.content,
-                            embedding = EXCLUDED.embedding,
-                            metadata = EXCLUDED.metadata,
-                            content_hash = EXCLUDED.content_hash;
-                        """,
-                        (
-                            chunk_id,
-                            doc_id,
-                            i,
-                            content,
-                            embedding,
-                            json.dumps(meta_serializable),
-                            content_hash,
-                            locale,
-                        ),
-                    )
+                rows = _document_rows(documents, embeddings, locale)
+                self._ensure_facet_columns(cur)
+                upsert_rows(cur, rows, self._bulk_batch_size)
+                changed = {row[1] for row in rows}
+                counts = _chunk_counts(rows, files)
+                for doc_id, count in counts.items():
+                    cur.execute(_DELETE_TRAILING_SQL, (doc_id, locale, count))
+                    if cur.rowcount:
+                        changed.add(doc_id)
+                self._store_sentences(cur, sentences)
+                self._record_files(cur, files, locale)
+                if signatures:
+                    if not self._minhash_table:
+                        ensure_minhash_table(cur)
+                        self._minhash_table = True
+                    changed.update(store_signatures(cur, signatures, locale, counts))
+                if changed:
+                    self._refresh_documents(cur, sorted(changed))
+                    self._bump_version(cur, sorted(changed))
             conn.commit()
         logging.info("PgVectorStore: added %s chunks for locale=%s", len(documents), locale)
 
+    async def aadd_embedded_documents(
+        self,
+        documents: List[Any],
+        embeddings: List[List[float]],
+        locale: str = "en",
+        files: Optional[List[FileFingerprint]] = None,
+        signatures: Optional[List[SignatureRow]] = None,
+        sentences: Optional[List[Tuple[str, Any]]] = None,
+    ) -> None:
+        if len(documents) != len(embeddings):
+            raise ValueError("documents and embeddings must be the same length")
+        if not documents and not files:
+            return
+        if sentences is None:
+            sentences = await self.aembed_sentences([getattr(d, "page_content", str(d)) for d in documents])
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                rows = _document_rows(documents, embeddings, locale)
+                await self._aensure_facet_columns(cur)
+                await aupsert_rows(cur, rows, self._bulk_batch_size)
+                changed = {row[1] for row in rows}
+                counts = _chunk_counts(rows, files)
+                for doc_id, count in counts.items():
+                    await cur.execute(_DELETE_TRAILING_SQL, (doc_id, locale, count))
+                    if cur.rowcount:
+                        changed.add(doc_id)
+                await self._astore_sentences(cur, sentences)
+                await self._arecord_files(cur, files, locale)
+                if signatures:
+                    if not self._minhash_table:
+                        await aensure_minhash_table(cur)
+                        self._minhash_table = True
+                    changed.update(await astore_signatures(cur, signatures, locale, counts))
+                if changed:
+                    await self._arefresh_documents(cur, sorted(changed))
+                    await self._abump_version(cur, sorted(changed))
+            await conn.commit()
+        logging.info("PgVectorStore: added %s chunks for locale=%s", len(documents), locale)
+
+    async def afile_fingerprints(self, locale: str = "en", prefix: Optional[str] = None) -> Dict[str, FileFingerprint]:
+        """Fingerprints of the files ingested into locale (under prefix), by path; empty before the first sync."""
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await aensure_file_table(cur)
+                self._file_table_ready = True
+                fingerprints = await afile_fingerprints(cur, locale, prefix)
+            await conn.commit()
+        return fingerprints
+
+    def ingest_manifest(self, locale: str = "en", worker: Optional[str] = None, **options: Any) -> IngestManifest:
+        """The loader's resumable per-file manifest for locale, on this store's database."""
+        return IngestManifest(self._aconnect, locale, worker, **options)
+
+    def near_duplicate_index(self, locale: str = "en", threshold: float = DEFAULT_THRESHOLD) -> NearDuplicateIndex:
+        """MinHash/LSH near-duplicate detection over locale's chunks, on this store's database."""
+        return NearDuplicateIndex(self._aconnect, locale, threshold)
+
+    async def arelease_duplicates(self, locale: str = "en") -> int:
+        """Release near-duplicates whose canonical chunk is gone or changed; returns documents released."""
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await aensure_file_table(cur)
+                self._file_table_ready = True
+                if self._minhash_table is None:
+                    self._minhash_table = await aminhash_table_exists(cur)
+                if not self._minhash_table:
+                    return 0
+                released, changed = await arelease_duplicates(cur, locale)
+                await self._aforget_deleted(cur, None, released, None)
+                if changed:
+                    await self._abump_version(cur, changed)
+            await conn.commit()
+        return sum(map(len, released.values()))
+
+    async def adeduplicate(
+        self, locale: str = "en", threshold: float = DEFAULT_THRESHOLD, batch_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Sign the stored chunks that have no MinHash row yet (chunks written before
+        near-duplicate detection was on) and delete the ones that near-duplicate an
+        earlier chunk, keeping their sources on it. One transaction per batch_size chunks.
+        """
+        index = self.near_duplicate_index(locale, threshold)
+        totals = {"chunks": 0, "duplicates": 0}
+        after = ""
+        while True:
+            async with await self._aconnect() as conn:
+                async with conn.cursor() as cur:
+                    await aensure_minhash_table(cur)
+                    self._minhash_table = True
+                    await cur.execute(_UNSIGNED_CHUNKS_SQL, {"locale": locale, "after": after, "limit": batch_size})
+                    chunks = [
+                        ChunkRef(id_, doc_id, index_ or 0, content, hash_ or content_hash(content), source)
+                        for id_, doc_id, index_, content, hash_, source in await cur.fetchall()
+                    ]
+                    if not chunks:
+                        break
+                    signatures = await index.assign(chunks)
+                    changed = await astore_signatures(cur, signatures, locale, {})
+                    if changed:
+                        await self._arefresh_documents(cur, changed)
+                        await self._abump_version(cur, changed)
+                await conn.commit()
+            after = chunks[-1].chunk_id
+            totals["chunks"] += len(chunks)
+            totals["duplicates"] += sum(1 for row in signatures if row.canonical_id)
+            logging.info("PgVectorStore: deduplicated %s chunks of locale=%s: %s", totals["chunks"], locale, totals)
+        return totals
+
+    async def achunk_state(self, doc_id: str, locale: str = "en") -> List[Tuple[int, str, Any]]:
+        """(chunk_index, content_hash, embedding) of a stored document's chunks, in order."""
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(_CHUNK_STATE_SQL, {"doc_id": doc_id, "locale": locale})
+                return list(await cur.fetchall())
+
+    def _forget_deleted(self, cur, doc_ids, deleted: Dict[str, List[str]], locale: Optional[str]) -> None:
+        if not self._file_table_ready:
+            ensure_file_table(cur)
+            self._file_table_ready = True
+        if doc_ids:
+            forget_files(cur, list(doc_ids), locale)
+            return
+        # By source: forget the files the matched chunks came from
+        for loc, ids in deleted.items():
+            forget_files(cur, ids, loc)
+
+    async def _aforget_deleted(self, cur, doc_ids, deleted: Dict[str, List[str]], locale: Optional[str]) -> None:
+        if not self._file_table_ready:
+            await aensure_file_table(cur)
+            self._file_table_ready = True
+        if doc_ids:
+            await aforget_files(cur, list(doc_ids), locale)
+            return
+        for loc, ids in deleted.items():
+            await aforget_files(cur, ids, loc)
+
+    def _with_duplicates(self, cur, deleted: Dict[str, List[str]], sources, locale: Optional[str]) -> Dict[str, List[str]]:
+        """
+        Add the documents of sources that exist only as near-duplicates (MinHash rows, no chunks)
+        to the deleted doc_ids by locale, so their fingerprints and signatures go too.
+        """
+        if self._minhash_table is None:
+            self._minhash_table = minhash_table_exists(cur)
+        if not sources or not self._minhash_table:
+            return deleted
+        return _merge_deleted(deleted, source_documents(cur, sources, locale))
+
+    async def _awith_duplicates(
+        self, cur, deleted: Dict[str, List[str]], sources, locale: Optional[str]
+    ) -> Dict[str, List[str]]:
+        if self._minhash_table is None:
+            self._minhash_table = await aminhash_table_exists(cur)
+        if not sources or not self._minhash_table:
+            return deleted
+        return _merge_deleted(deleted, await asource_documents(cur, sources, locale))
+
+    def _release_duplicates(self, cur, locale: Optional[str], doc_ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Drop deleted doc_ids' MinHash rows and release near-duplicates of chunks that are gone
+        (all orphans of locale without doc_ids); returns doc_ids whose alternate_sources changed.
+        """
+        if self._minhash_table is None:
+            self._minhash_table = minhash_table_exists(cur)
+        if not self._minhash_table:
+            return []
+        released, changed = release_duplicates(cur, locale, doc_ids)
+        if released:
+            self._forget_deleted(cur, None, released, None)
+            logging.info("PgVectorStore: released near-duplicates of %s document(s)", sum(map(len, released.values())))
+        return changed
+
+    async def _arelease_duplicates(self, cur, locale: Optional[str], doc_ids: Optional[List[str]] = None) -> List[str]:
+        if self._minhash_table is None:
+            self._minhash_table = await aminhash_table_exists(cur)
+        if not self._minhash_table:
+            return []
+        released, changed = await arelease_duplicates(cur, locale, doc_ids)
+        if released:
+            await self._aforget_deleted(cur, None, released, None)
+            logging.info("PgVectorStore: released near-duplicates of %s document(s)", sum(map(len, released.values())))
+        return changed
+
+    def replace_document(
+        self,
+        doc_id: str,
+        documents: List[Any],
+        embeddings: Optional[List[List[float]]] = None,
+        locale: str = "en",
+        file: Optional[FileFingerprint] = None,
+    ) -> int:
+        """
+        Replace every chunk of doc_id in locale with documents (its chunks, in order) in one
+        transaction: searches see the old or the new version, never a mix, and no old chunk
+        survives whatever its index. Embeds documents unless embeddings are given; file is
+        fingerprinted in the same transaction. No documents deletes the document. Returns
+        chunks written.
+        """
+        texts = [getattr(d, "page_content", str(d)) for d in documents]
+        if embeddings is None:
+            self.refresh_embedding_spec()
+            if documents and not self._embedding_function:
+                raise ValueError("embedding_function required for replace_document without embeddings")
+            embeddings = self._embedding_function.embed_documents(texts) if documents else []
+        if len(documents) != len(embeddings):
+            raise ValueError("documents and embeddings must be the same length")
+        sentences = self.embed_sentences(texts)
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                rows = _document_rows(documents, embeddings, locale, owner=doc_id)
+                self._ensure_facet_columns(cur)
+                deleted = delete_document(cur, doc_id, locale)
+                upsert_rows(cur, rows, self._bulk_batch_size)
+                self._store_sentences(cur, sentences)
+                self._record_files(cur, [file] if file else None, locale)
+                changed = sorted({doc_id, *self._release_duplicates(cur, locale, [doc_id])})
+                if rows or deleted:
+                    self._refresh_documents(cur, changed)
+                    self._bump_version(cur, changed)
+            conn.commit()
+        logging.info("PgVectorStore: replaced %s chunks of %s with %s for locale=%s", deleted, doc_id, len(rows), locale)
+        return len(rows)
+
+    async def areplace_document(
+        self,
+        doc_id: str,
+        documents: List[Any],
+        embeddings: Optional[List[List[float]]] = None,
+        locale: str = "en",
+        file: Optional[FileFingerprint] = None,
+    ) -> int:
+        texts = [getattr(d, "page_content", str(d)) for d in documents]
+        if embeddings is None:
+            await self.arefresh_embedding_spec()
+            if documents and not self._embedding_function:
+                raise ValueError("embedding_function required for replace_document without embeddings")
+            embeddings = await self._embedding_function.aembed_documents(texts) if documents else []
+        if len(documents) != len(embeddings):
+            raise ValueError("documents and embeddings must be the same length")
+        sentences = await self.aembed_sentences(texts)
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                rows = _document_rows(documents, embeddings, locale, owner=doc_id)
+                await self._aensure_facet_columns(cur)
+                deleted = await adelete_document(cur, doc_id, locale)
+                await aupsert_rows(cur, rows, self._bulk_batch_size)
+                await self._astore_sentences(cur, sentences)
+                await self._arecord_files(cur, [file] if file else None, locale)
+                changed = sorted({doc_id, *await self._arelease_duplicates(cur, locale, [doc_id])})
+                if rows or deleted:
+                    await self._arefresh_documents(cur, changed)
+                    await self._abump_version(cur, changed)
+            await conn.commit()
+        logging.info("PgVectorStore: replaced %s chunks of %s with %s for locale=%s", deleted, doc_id, len(rows), locale)
+        return len(rows)
+
+    def delete_documents(
+        self,
+        doc_ids: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        locale: Optional[str] = "en",
+    ) -> int:
+        """
+        Delete whole documents by doc_id or by metadata source, in one statement and one
+        transaction, with their file fingerprints; locale None deletes them in every locale.
+        Returns chunks deleted.
+        """
+        if not doc_ids and not sources:
+            return 0
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                if sources and not self._source_index_ready:
+                    ensure_source_index(cur)
+                    self._source_index_ready = True
+                count, deleted = delete_documents(cur, doc_ids, sources, locale)
+                deleted = self._with_duplicates(cur, deleted, sources, locale)
+                self._forget_deleted(cur, doc_ids, deleted, locale)
+                removed = sorted({doc_id for ids in deleted.values() for doc_id in ids})
+                # Documents whose every chunk was a near-duplicate have MinHash rows only
+                alternates = self._release_duplicates(cur, locale, sorted(set(removed) | set(doc_ids or [])))
+                changed = sorted(set(removed) | set(alternates))
+                if changed:
+                    self._refresh_documents(cur, changed)
+                    self._bump_version(cur, changed)
+            conn.commit()
+        logging.info("PgVectorStore: deleted %s chunks of %s document(s) for locale=%s", count, len(removed), locale or "all")
+        return count
+
+    async def adelete_documents(
+        self,
+        doc_ids: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        locale: Optional[str] = "en",
+    ) -> int:
+        if not doc_ids and not sources:
+            return 0
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                if sources and not self._source_index_ready:
+                    await aensure_source_index(cur)
+                    self._source_index_ready = True
+                count, deleted = await adelete_documents(cur, doc_ids, sources, locale)
+                deleted = await self._awith_duplicates(cur, deleted, sources, locale)
+                await self._aforget_deleted(cur, doc_ids, deleted, locale)
+                removed = sorted({doc_id for ids in deleted.values() for doc_id in ids})
+                alternates = await self._arelease_duplicates(cur, locale, sorted(set(removed) | set(doc_ids or [])))
+                changed = sorted(set(removed) | set(alternates))
+                if changed:
+                    await self._arefresh_documents(cur, changed)
+                    await self._abump_version(cur, changed)
+            await conn.commit()
+        logging.info("PgVectorStore: deleted %s chunks of %s document(s) for locale=%s", count, len(removed), locale or "all")
+        return count
+
+    async def adelete_files(self, paths: List[str], locale: str = "en") -> int:
+        """Delete the chunks and fingerprints of files (doc_id = path) that no longer exist; returns chunks deleted."""
+        return await self.adelete_documents(doc_ids=list(paths), locale=locale)
+
+    def collect_garbage(self, locale: Optional[str] = None) -> Dict[str, int]:
+        """
+        Delete chunks past their file's chunk_count, fingerprints of files without chunks and
+        rag_documents rows without chunks (managers/document_lifecycle.py), stale MinHash rows,
+        and release near-duplicates of chunks that are gone (managers/near_duplicates.py);
+        locale None: all.
+        """
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                ensure_file_table(cur)
+                self._file_table_ready = True
+                if self._documents_table is None:
+                    self._documents_table = document_table_exists(cur)
+                if self._minhash_table is None:
+                    self._minhash_table = minhash_table_exists(cur)
+                counts, changed = collect_garbage(cur, locale, bool(self._documents_table), bool(self._minhash_table))
+                counts.update(stale_signatures=0, released_duplicates=0)
+                if self._minhash_table:
+                    dropped, released, alternates = collect_signature_garbage(cur, locale)
+                    self._forget_deleted(cur, None, released, None)
+                    counts.update(stale_signatures=dropped, released_duplicates=sum(map(len, released.values())))
+                    changed = sorted(set(changed) | set(alternates))
+                if changed:
+                    self._refresh_documents(cur, changed)
+                    self._bump_version(cur, changed)
+            conn.commit()
+        logging.info("PgVectorStore: garbage collected for locale=%s: %s", locale or "all", counts)
+        return counts
+
+    async def acollect_garbage(self, locale: Optional[str] = None) -> Dict[str, int]:
+        async with await self._aconnect() as conn:
+            async with conn.cursor() as cur:
+                await aensure_file_table(cur)
+                self._file_table_ready = True
+                if self._documents_table is None:
+                    self._documents_table = await adocument_table_exists(cur)
+                if self._minhash_table is None:
+                    self._minhash_table = await aminhash_table_exists(cur)
+                counts, changed = await acollect_garbage(
+                    cur, locale, bool(self._documents_table), bool(self._minhash_table)
+                )
+                counts.update(stale_signatures=0, released_duplicates=0)
+                if self._minhash_table:
+                    dropped, released, alternates = await acollect_signature_garbage(cur, locale)
+                    await self._aforget_deleted(cur, None, released, None)
+                    counts.update(stale_signatures=dropped, released_duplicates=sum(map(len, released.values())))
+                    changed = sorted(set(changed) | set(alternates))
+                if changed:
+                    await self._arefresh_documents(cur, changed)
+                    await self._abump_version(cur, changed)
+            await conn.commit()
+        logging.info("PgVectorStore: garbage collected for locale=%s: %s", locale or "all", counts)
+        return counts
+
     def upsert_batch(
         self,
         ids: List[str],
@@ -162,34 +1399,51 @@ class PgVectorStore(VectorStoreBase):
         metadatas: List[Dict[str, Any]],
         content_hashes: List[str],
         locale: str,
+        settings: Optional[Dict[str, Any]] = None,
     ) -> None:
-        """Insert or update chunks with precomputed embeddings (e.g. for Chroma migration)."""
+        """
+        Insert or update chunks with precomputed embeddings (e.g. for Chroma migration).
+        settings are written to rag_settings in the same transaction (e.g. a migration checkpoint).
+        """
         if not (ids and len(ids) == len(doc_ids) == len(chunk_indices) == len(contents) == len(embeddings) == len(metadatas) == len(content_hashes)):
             raise ValueError("All lists must be non-empty and same length")
         locale_clean = _strip_nul(str(locale))
+        facets = facets_by_doc(
+            [_strip_nul(str(d)) for d in doc_ids],
+            [str((m or {}).get("source", "")) if isinstance(m, dict) else "" for m in metadatas],
+            [c if isinstance(c, str) else str(c) for c in contents],
+        )
+        rows = []
+        for id_, doc_id, cidx, content, emb, meta, ch in zip(
+            ids, doc_ids, chunk_indices, contents, embeddings, metadatas, content_hashes
+        ):
+            doc_id = _strip_nul(str(doc_id))
+            doc_facets = facets[doc_id]
+            rows.append(
+                (
+                    _strip_nul(str(id_)),
+                    doc_id,
+                    cidx,
+                    _strip_nul(content if isinstance(content, str) else str(content)),
+                    emb,
+                    _metadata_json(meta),
+                    _strip_nul(str(ch)),
+                    locale_clean,
+                    doc_facets["regions"],
+                    doc_facets["doc_type"],
+                    doc_facets["publisher"],
+                )
+            )
+        changed = sorted({row[1] for row in rows})
         with self._connect() as conn:
             with conn.cursor() as cur:
-                for i, id_, doc_id, cidx, content, emb, meta, ch in zip(
-                    range(len(ids)), ids, doc_ids, chunk_indices, contents, embeddings, metadatas, content_hashes
-                ):
-                    id_ = _strip_nul(str(id_))
-                    doc_id = _strip_nul(str(doc_id))
-                    content = _strip_nul(content if isinstance(content, str) else str(content))
-                    ch = _strip_nul(str(ch))
-                    meta_ser = _strip_nul_meta(meta) if isinstance(meta, dict) else {}
-                    meta_ser = json.loads(json.dumps(meta_ser, default=str))
-                    cur.execute(
-                        """
-                        INSERT INTO rag_chunks (id, doc_id, chunk_index, content, embedding, metadata, content_hash, locale)
-                        VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s)
-                        ON CONFLICT (id)
-                        DO UPDATE SET
-                            content = EXCLUDED.content,
-                            embedding = EXCLUDED.embedding,
-                            metadata = EXCLUDED.metadata,
-                            content_hash = EXCLUDED.content_hash;
-                        """,
-                        (id_, doc_id, cidx, content, emb, json.dumps(meta_ser), ch, locale_clean),
-                    )
+                self._ensure_facet_columns(cur)
+                upsert_rows(cur, rows, self._bulk_batch_size)
+                self._refresh_documents(cur, changed)
+                self._bump_version(cur, changed)
+                if settings:
+                    ensure_settings_table(cur)
+                    for key, value in settings.items():
+                        set_setting(cur, key, value)
             conn.commit()
         logging.info("PgVectorStore: upserted %s chunks for locale=%s", len(ids), locale)
@@ -2,14 +2,18 @@
 RAG manager: wraps any VectorStoreBase and provides ann_search + knowledge_to_string + parse_source.
 Used by FastAPI for /chat_api and /riverbot_chat_api.
 """
-import asyncio
 import logging
 import re
 import time
-from typing import Any, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from mappings.knowledge_sources import knowledge_sources
 
+from managers.context_builder import build_context
+from managers.facets import detect_facets
+from managers.mmr import mmr_select
+from managers.retrieval_cache import RetrievalCache
+from managers.tokens import count_tokens
 from managers.vector_store import VectorStoreBase
 
 
@@ -30,11 +34,150 @@ def parse_source(source: str) -> dict:
     return {"full_path": source, "filename": "", "url": "", "human_readable": ""}
 
 
+def _result_key(result: Any) -> Any:
+    """Identity of a search result (a document or a (document, distance[, embedding]) tuple)."""
+    doc = result[0] if isinstance(result, tuple) else result
+    meta = getattr(doc, "metadata", {}) or {}
+    if meta.get("doc_id") is not None and meta.get("chunk_index") is not None:
+        return (meta["doc_id"], meta["chunk_index"])
+    return getattr(doc, "page_content", None)
+
+
 class RAGManager:
     """Wraps a VectorStoreBase and exposes ann_search() and knowledge_to_string() for the app."""
 
-    def __init__(self, store: VectorStoreBase):
+    def __init__(
+        self,
+        store: VectorStoreBase,
+        cache: Optional[RetrievalCache] = None,
+        min_similarity: Optional[float] = None,
+        max_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_candidates: int = 20,
+        max_per_source: Optional[int] = None,
+        duplicate_similarity: Optional[float] = None,
+        tag_sources: bool = True,
+        facet_filters: Optional[Sequence[str]] = None,
+        facet_min_hits: int = 2,
+    ):
+        """
+        Adaptive k (all off by default): fetch max(k, max_k) scored candidates and keep those
+        with cosine similarity >= min_similarity, in order, until token_budget is spent. A query
+        with nothing relevant returns no documents instead of k unrelated ones.
+
+        Diversification (off by default): with mmr_lambda or max_per_source set, over-fetch
+        mmr_candidates chunks with their embeddings in the same query and pick the final ones by
+        maximal marginal relevance, at most max_per_source per PDF and none at or above
+        duplicate_similarity to one already picked.
+
+        knowledge_to_string merges adjacent chunks of a document (dropping the overlap), tags each
+        passage with its source when tag_sources is set and trims the result to token_budget.
+
+        Facet filtering (off by default; stores with supports_filters only): the facets named in
+        facet_filters ("regions", "doc_type", "publisher") are detected in the query and restrict
+        the search. With fewer than facet_min_hits filtered results the unfiltered results are
+        appended after them.
+        """
+        if mmr_lambda is not None and not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError("mmr_lambda must be between 0 and 1")
         self._store = store
+        self._cache = cache
+        self._min_similarity = min_similarity
+        self._max_k = max_k
+        self._token_budget = token_budget
+        self._mmr_lambda = mmr_lambda
+        self._mmr_candidates = mmr_candidates
+        self._max_per_source = max_per_source
+        self._duplicate_similarity = duplicate_similarity
+        self._tag_sources = tag_sources
+        self._facet_filters = tuple(facet_filters or ())
+        self._facet_min_hits = facet_min_hits
+
+    @property
+    def adaptive(self) -> bool:
+        return self._min_similarity is not None or bool(self._max_k) or bool(self._token_budget)
+
+    @property
+    def diversify(self) -> bool:
+        return self._mmr_lambda is not None or bool(self._max_per_source)
+
+    def _passes_cutoff(self, distance: Optional[float]) -> bool:
+        return self._min_similarity is None or distance is None or 1.0 - distance >= self._min_similarity
+
+    def rerank(self, candidates: List[Tuple[Any, Optional[float], Any]], k: int) -> List[Tuple[Any, Optional[float]]]:
+        """MMR + per-source cap over (document, distance, embedding) candidates; returns (document, distance)."""
+        candidates = [c for c in candidates if self._passes_cutoff(c[1])]
+        vectors = [c[2] for c in candidates]
+        picked = mmr_select(
+            [None if c[1] is None else 1.0 - c[1] for c in candidates],
+            vectors if self._mmr_lambda is not None else None,
+            max(k, self._max_k or 0),
+            lambda_mult=self._mmr_lambda if self._mmr_lambda is not None else 1.0,
+            sources=[(getattr(c[0], "metadata", {}) or {}).get("source", "") for c in candidates],
+            max_per_source=self._max_per_source,
+            duplicate_similarity=self._duplicate_similarity,
+        )
+        logging.info("MMR picked %s of %s candidate(s)", len(picked), len(candidates))
+        return [(candidates[i][0], candidates[i][1]) for i in picked]
+
+    def query_facets(self, user_query: str) -> Dict[str, Any]:
+        """Facets to filter this query's search on ({} when filtering is off or none are named)."""
+        if not self._facet_filters or not getattr(self._store, "supports_filters", False):
+            return {}
+        return detect_facets(user_query, self._facet_filters)
+
+    async def _search(self, search, user_query: str, k: int, locale: str) -> List[Any]:
+        """
+        Run one of the store's search methods with the query's facet filters, falling back to
+        (and appending) the unfiltered results when the filtered search finds too few.
+        """
+        facets = self.query_facets(user_query)
+        if not facets:
+            return await search(user_query, k=k, locale=locale)
+        filtered = await search(user_query, k=k, locale=locale, filters=facets)
+        hits = [r for r in filtered if not isinstance(r, tuple) or self._passes_cutoff(r[1])]
+        if len(hits) >= min(k, self._facet_min_hits):
+            logging.info("Facet-filtered search %s returned %s result(s)", facets, len(filtered))
+            return filtered
+        logging.info("Facet-filtered search %s returned %s result(s); adding unfiltered results", facets, len(hits))
+        seen = {_result_key(r) for r in filtered}
+        unfiltered = await search(user_query, k=k, locale=locale)
+        return (filtered + [r for r in unfiltered if _result_key(r) not in seen])[:k]
+
+    async def _retrieve(self, user_query: str, k: int, locale: str) -> List[Any]:
+        fetch_k = max(k, self._max_k or 0)
+        if self.diversify:
+            candidates = await self._search(
+                self._store.asimilarity_search_with_vectors, user_query, max(fetch_k, self._mmr_candidates), locale
+            )
+            return self.select(self.rerank(candidates, k), k)
+        if self.adaptive:
+            return self.select(await self._search(self._store.asimilarity_search_with_score, user_query, fetch_k, locale), k)
+        return await self._search(self._store.asimilarity_search, user_query, k, locale)
+
+    def select(self, scored: List[Tuple[Any, Optional[float]]], k: int) -> List[Any]:
+        """Apply the similarity cutoff, k/max_k cap and token budget to (document, distance) pairs."""
+        limit = max(k, self._max_k or 0)
+        selected: List[Any] = []
+        used = 0
+        for doc, distance in scored:
+            if len(selected) >= limit:
+                break
+            # Hybrid results are ordered by RRF, not distance, so filter rather than stop at the first miss
+            if not self._passes_cutoff(distance):
+                continue
+            tokens = count_tokens(getattr(doc, "page_content", "") or "")
+            # The best chunk is always kept; the context builder trims it if it alone is over budget
+            if self._token_budget and selected and used + tokens > self._token_budget:
+                break
+            selected.append(doc)
+            used += tokens
+        logging.info(
+            "Adaptive k kept %s of %s candidate(s) (~%s tokens; min_similarity=%s, budget=%s)",
+            len(selected), len(scored), used, self._min_similarity, self._token_budget,
+        )
+        return selected
 
     def parse_source(self, source: str) -> dict:
         return parse_source(source)
@@ -44,17 +187,15 @@ class RAGManager:
         logging.info("   Query: '%s%s'", user_query[:100], "..." if len(user_query) > 100 else "")
         start_time = time.time()
 
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        version = 0
+        if self._cache:
+            cached, version = await self._cache.lookup(user_query, locale, k)
+            if cached is not None:
+                logging.info("Retrieval cache hit (%s document(s))", len(cached["documents"]))
+                return cached
 
         try:
-            docs = await loop.run_in_executor(
-                None,
-                lambda: self._store.similarity_search(user_query, k=k, locale=locale),
-            )
+            docs = await self._retrieve(user_query, k, locale)
         except Exception as e:
             logging.error("Vector store similarity_search failed: %s", e, exc_info=True)
             return {"documents": [], "sources": []}
@@ -73,22 +214,24 @@ class RAGManager:
             logging.debug("   %s. Source: %s | Path: %s | Content: %s...", i, name, source, content_preview)
 
         sources = [getattr(doc, "metadata", {}).get("source", "") for doc in docs if getattr(doc, "metadata", {}).get("source")]
+        # Near-duplicates dropped at ingestion are cited through the chunk they duplicate
+        sources += [s for doc in docs for s in getattr(doc, "metadata", {}).get("alternate_sources") or [] if s]
         unique_sources = list(set(sources))
         sources_parsed = [self.parse_source(s) for s in unique_sources]
 
-        return {"documents": docs, "sources": sources_parsed}
+        result = {"documents": docs, "sources": sources_parsed}
+        if self._cache:
+            self._cache.store(user_query, locale, k, result, version)
+        return result
 
     async def knowledge_to_string(self, docs: dict, doc_field: str = "documents") -> str:
         target = docs.get(doc_field, [])
         if not target:
             logging.warning("No documents in field '%s' to convert to string", doc_field)
             return ""
-        content_parts = []
         for i, doc in enumerate(target, 1):
-            if hasattr(doc, "page_content"):
-                content_parts.append(doc.page_content)
-            else:
+            if not hasattr(doc, "page_content"):
                 logging.warning("Document %s missing page_content", i)
-        result = " ".join(content_parts)
-        logging.info("Knowledge string created: %s characters from %s document(s)", len(result), len(content_parts))
+        result = build_context(target, token_budget=self._token_budget, tag_sources=self._tag_sources)
+        logging.info("Knowledge string created: %s characters from %s document(s)", len(result), len(target))
         return result
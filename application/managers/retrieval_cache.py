@@ -0,0 +1,115 @@
+"""
+Bounded LRU cache of retrieval results keyed by (normalized query, locale, k).
+
+Retrieval is deterministic until the corpus changes, so entries are tagged with
+the corpus version (managers/corpus_version.py) they were computed at and dropped
+as soon as a newer version is seen. The version is re-read at most every
+`version_check_interval` seconds; invalidate() lets a push channel evict sooner.
+Backends without a corpus version (Bedrock KB, synced outside this app) rely on
+the TTL alone.
+
+Entries hold the retrieved chunks and parsed sources, so a hit skips embedding,
+the database round trip and source parsing.
+"""
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Trailing punctuation does not change retrieval ("what is CAP?" == "what is cap")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.¿¡]+$")
+
+
+def normalize_query(query: str) -> str:
+    query = _WHITESPACE_RE.sub(" ", (query or "").strip().casefold())
+    return _TRAILING_PUNCT_RE.sub("", query)
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Fresh containers per caller; documents are shared and treated as read-only."""
+    return {
+        "documents": list(result.get("documents", [])),
+        "sources": [dict(s) for s in result.get("sources", [])],
+    }
+
+
+class RetrievalCache:
+    """LRU retrieval-result cache invalidated by corpus version (or TTL when there is none)."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        version_fn: Optional[Callable[[], Awaitable[int]]] = None,
+        version_check_interval: float = 5.0,
+    ):
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._version_fn = version_fn
+        self._version_check_interval = version_check_interval
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[int, float, Dict[str, Any]]]" = OrderedDict()
+        self._version = 0
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def _key(self, query: str, locale: str, k: int) -> Tuple[str, str, int]:
+        return (normalize_query(query), locale, k)
+
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """Drop entries older than version (all entries when version is None)."""
+        if version is None:
+            self._entries.clear()
+            return
+        if version > self._version:
+            self._version = version
+            self._entries.clear()
+        self._checked_at = time.monotonic()
+
+    async def current_version(self) -> int:
+        if self._version_fn and time.monotonic() - self._checked_at >= self._version_check_interval:
+            self._checked_at = time.monotonic()
+            try:
+                self.invalidate(await self._version_fn())
+            except Exception as e:
+                # Serve what we have; the TTL still bounds staleness
+                logging.warning("Retrieval cache could not read corpus version: %s", e)
+        return self._version
+
+    async def lookup(self, query: str, locale: str, k: int) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Return (cached result or None, version token). Pass the token to store() so a result
+        computed while the corpus changed is not cached under the new version.
+        """
+        if not self.enabled:
+            return None, 0
+        version = await self.current_version()
+        key = self._key(query, locale, k)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry_version, stored_at, result = entry
+            if entry_version == version and (self._ttl is None or time.monotonic() - stored_at < self._ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy_result(result), version
+            del self._entries[key]
+        self.misses += 1
+        return None, version
+
+    def store(self, query: str, locale: str, k: int, result: Dict[str, Any], version: int) -> None:
+        if not self.enabled or version != self._version or not result.get("documents"):
+            return
+        key = self._key(query, locale, k)
+        self._entries[key] = (version, time.monotonic(), _copy_result(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "version": self._version, "hits": self.hits, "misses": self.misses}
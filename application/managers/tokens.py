@@ -0,0 +1,48 @@
+"""
+Token counting for prompt budgets.
+
+Uses tiktoken's encoding when it is installed and its BPE file can be loaded
+(tiktoken downloads it on first use unless TIKTOKEN_CACHE_DIR is populated);
+otherwise falls back to ~4 characters per token, which is close enough for
+English/Spanish prose to size a context window. The encoding is loaded once per
+process and counts for repeated chunk texts are memoized.
+"""
+import functools
+import logging
+import os
+
+DEFAULT_ENCODING = os.getenv("RAG_TOKEN_ENCODING", "o200k_base")  # gpt-4o / gpt-4.1 family
+
+_CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str):
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning("tiktoken encoding %s unavailable (%s); estimating tokens from length", name, e)
+        return None
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    if not text:
+        return 0
+    enc = _encoding(encoding)
+    if enc is None:
+        return max(1, (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, encoding: str = DEFAULT_ENCODING) -> str:
+    """Longest prefix of text that fits in max_tokens."""
+    if max_tokens <= 0 or not text:
+        return ""
+    enc = _encoding(encoding)
+    if enc is None:
+        return text[: max_tokens * _CHARS_PER_TOKEN]
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
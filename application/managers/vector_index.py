@@ -0,0 +1,499 @@
+"""
+ANN index management for rag_chunks.embedding.
+
+Chooses HNSW or IVFFlat, sizes IVFFlat `lists` from the row count (and defers the
+build until there is enough data to train useful centroids), rebuilds the index
+after bulk ingestion, and turns a recall target into the per-query
+`ivfflat.probes` / `hnsw.ef_search` settings.
+
+There is one partial index per locale (`... WHERE locale = 'es'`) instead of a
+single global one, so a Spanish query scans only Spanish vectors rather than
+post-filtering English neighbours out of a global candidate list. The planner
+only picks a partial index when the query states the locale as a literal, so
+searches inline it (see locale_literal / PgVectorStore) instead of binding it.
+
+Optional quantized mode (RAG_QUANTIZATION=halfvec|binary) replaces the float32 ANN
+index with an HNSW expression index over `embedding::halfvec` (half the size) or
+`binary_quantize(embedding)::bit` (1/32 the size, Hamming distance). That index only
+generates candidates; the top candidates are re-scored by exact cosine distance on
+the full-precision column, so the full-size index no longer has to fit in shared
+buffers. Needs pgvector >= 0.7; on older servers no quantized index is built and
+PgVectorStore searches at full precision.
+
+DDL/inspection methods take any DB-API cursor (psycopg2 in main.py, psycopg 3 in
+PgVectorStore and scripts); rebuilds must run on an autocommit connection because
+they use CONCURRENTLY.
+"""
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from managers.embeddings import default_spec
+
+INDEX_PREFIX = "rag_chunks_embedding"
+# Pre per-locale global index; dropped by rebuild() once the locale indexes exist
+LEGACY_INDEX_NAME = "rag_chunks_embedding_idx"
+INDEX_TYPES = ("ivfflat", "hnsw")
+QUANTIZATIONS = ("none", "halfvec", "binary")
+
+DEFAULT_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "ivfflat").lower()
+DEFAULT_RECALL_TARGET = float(os.getenv("RAG_RECALL_TARGET", "0.95"))
+DEFAULT_QUANTIZATION = os.getenv("RAG_QUANTIZATION", "none").lower()
+# Candidates fetched from the quantized index before exact re-scoring
+DEFAULT_RESCORE_CANDIDATES = int(os.getenv("RAG_RESCORE_CANDIDATES", "100"))
+MIN_QUANTIZATION_VERSION = (0, 7, 0)
+
+# (index name suffix, indexed expression, operator class, distance operator, query expression)
+_QUANTIZED_INDEX = {
+    "halfvec": ("half", "({column}::halfvec({dim}))", "halfvec_cosine_ops", "<=>", "%(embedding)s::halfvec({dim})"),
+    "binary": ("bit", "(binary_quantize({column})::bit({dim}))", "bit_hamming_ops", "<~>", "binary_quantize(%(embedding)s)::bit({dim})"),
+}
+
+# Quantized candidates from the expression index, re-ranked by exact cosine distance.
+# The outer select list may use any rag_chunks column the candidate subquery carries.
+_QUANTIZED_SEARCH_SQL = """
+    SELECT {columns}, embedding <=> %(embedding)s AS distance{extra}
+    FROM (
+        SELECT id, doc_id, chunk_index, content, metadata, embedding
+        FROM rag_chunks
+        WHERE locale = {locale}{where}
+        ORDER BY {expression} {operator} {query}
+        LIMIT %(candidates)s
+    ) candidates
+    ORDER BY embedding <=> %(embedding)s
+    LIMIT %(k)s;
+"""
+
+_EXTENSION_VERSION_SQL = "SELECT extversion FROM pg_extension WHERE extname = 'vector';"
+
+# IVFFlat centroids trained on fewer rows than this are noise; a sequential scan is fast anyway.
+MIN_IVFFLAT_ROWS = 1000
+
+# (recall target, multiplier on sqrt(lists) for ivfflat.probes, hnsw.ef_search).
+# Starting points from the pgvector docs; calibrate with scripts/vector_index_admin.py recall.
+_RECALL_PROFILES = (
+    (0.90, 1.0, 40),
+    (0.95, 2.0, 80),
+    (0.98, 4.0, 160),
+    (0.99, 8.0, 320),
+)
+_HNSW_MAX_EF_SEARCH = 1000
+
+_LOCALE_RE = re.compile(r"^[a-z]{2,3}([_-][a-z0-9]{2,8})?$")
+
+_INDEX_INFO_SQL = """
+    SELECT am.amname, c.reloptions, pg_relation_size(c.oid), i.indisvalid
+    FROM pg_class c
+    JOIN pg_am am ON am.oid = c.relam
+    JOIN pg_index i ON i.indexrelid = c.oid
+    WHERE c.relname = %s;
+"""
+
+SET_SEARCH_PARAMS_SQL = "SELECT set_config('ivfflat.probes', %s, true), set_config('hnsw.ef_search', %s, true);"
+
+
+def ivfflat_lists_for(row_count: int) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def validate_locale(locale: str) -> str:
+    """Return the locale if it is safe to use in index names and inline SQL literals."""
+    if not isinstance(locale, str) or not _LOCALE_RE.match(locale):
+        raise ValueError(f"Invalid locale {locale!r}")
+    return locale
+
+
+def locale_literal(locale: str) -> str:
+    return f"'{validate_locale(locale)}'"
+
+
+def index_name(locale: str) -> str:
+    return f"{INDEX_PREFIX}_{validate_locale(locale).replace('-', '_')}_idx"
+
+
+def quantized_index_name(locale: str, quantization: str) -> str:
+    suffix = _QUANTIZED_INDEX[quantization][0]
+    return f"{INDEX_PREFIX}_{validate_locale(locale).replace('-', '_')}_{suffix}_idx"
+
+
+def quantized_search_sql(
+    locale: str,
+    quantization: str,
+    dimensions: int,
+    columns: str = "content, metadata",
+    with_embedding: bool = False,
+    where: str = "",
+) -> str:
+    """
+    Candidate generation on the quantized index plus exact re-scoring. Named params:
+    embedding (full-precision query vector), candidates, k. The locale is inlined for the partial
+    index, and dimensions must match the index expression (the embedding column's size).
+    where is appended to the candidate scan's WHERE clause (e.g. " AND doc_type = %(facet_doc_type)s").
+    Rows are (*columns, distance[, embedding]).
+    """
+    _, expression, _, operator, query = _QUANTIZED_INDEX[quantization]
+    dim = int(dimensions)
+    return _QUANTIZED_SEARCH_SQL.format(
+        columns=columns,
+        extra=", embedding" if with_embedding else "",
+        locale=locale_literal(locale),
+        where=where,
+        expression=expression.format(column="embedding", dim=dim),
+        operator=operator,
+        query=query.format(dim=dim),
+    )
+
+
+def _parse_version(version: str) -> tuple:
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:3])
+
+
+def _parse_reloptions(reloptions: Optional[List[str]]) -> Dict[str, int]:
+    options = {}
+    for opt in reloptions or []:
+        key, _, value = opt.partition("=")
+        if value.isdigit():
+            options[key] = int(value)
+    return options
+
+
+class VectorIndexManager:
+    """Creates, inspects and tunes the per-locale ANN indexes on rag_chunks.embedding."""
+
+    def __init__(
+        self,
+        index_type: Optional[str] = None,
+        recall_target: Optional[float] = None,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 64,
+        quantization: Optional[str] = None,
+        rescore_candidates: Optional[int] = None,
+        dimensions: Optional[int] = None,
+    ):
+        self.index_type = (index_type or DEFAULT_INDEX_TYPE).lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {self.index_type!r}")
+        self.quantization = (quantization or DEFAULT_QUANTIZATION).lower()
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {self.quantization!r}")
+        self.rescore_candidates = rescore_candidates or DEFAULT_RESCORE_CANDIDATES
+        # Size of rag_chunks.embedding; quantized index expressions cast to it
+        self.dimensions = dimensions or default_spec().dimensions
+        self.recall_target = recall_target if recall_target is not None else DEFAULT_RECALL_TARGET
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+
+    # ------------------------------------------------------------------
+    # DDL
+    # ------------------------------------------------------------------
+    def create_index_sql(
+        self, locale: str, row_count: int, name: Optional[str] = None, concurrently: bool = False, column: str = "embedding"
+    ) -> str:
+        conc = "CONCURRENTLY " if concurrently else ""
+        if self.index_type == "hnsw":
+            with_clause = f"m = {self.hnsw_m}, ef_construction = {self.hnsw_ef_construction}"
+        else:
+            with_clause = f"lists = {ivfflat_lists_for(row_count)}"
+        return (
+            f"CREATE INDEX {conc}IF NOT EXISTS {name or index_name(locale)} "
+            f"ON rag_chunks USING {self.index_type} ({column} vector_cosine_ops) WITH ({with_clause}) "
+            f"WHERE locale = {locale_literal(locale)};"
+        )
+
+    def create_quantized_index_sql(
+        self,
+        locale: str,
+        quantization: Optional[str] = None,
+        name: Optional[str] = None,
+        concurrently: bool = False,
+        column: str = "embedding",
+    ) -> str:
+        """HNSW expression index over the quantized embedding (no training data needed, so never deferred)."""
+        quantization = quantization or self.quantization
+        _, expression, opclass, _, _ = _QUANTIZED_INDEX[quantization]
+        conc = "CONCURRENTLY " if concurrently else ""
+        return (
+            f"CREATE INDEX {conc}IF NOT EXISTS {name or quantized_index_name(locale, quantization)} "
+            f"ON rag_chunks USING hnsw ({expression.format(column=column, dim=self.dimensions)} {opclass}) "
+            f"WITH (m = {self.hnsw_m}, ef_construction = {self.hnsw_ef_construction}) "
+            f"WHERE locale = {locale_literal(locale)};"
+        )
+
+    def supports_quantization(self, cur) -> bool:
+        """halfvec and binary_quantize() arrived in pgvector 0.7."""
+        cur.execute(_EXTENSION_VERSION_SQL)
+        row = cur.fetchone()
+        return bool(row) and _parse_version(row[0]) >= MIN_QUANTIZATION_VERSION
+
+    async def asupports_quantization(self, cur) -> bool:
+        await cur.execute(_EXTENSION_VERSION_SQL)
+        row = await cur.fetchone()
+        return bool(row) and _parse_version(row[0]) >= MIN_QUANTIZATION_VERSION
+
+    def candidates_for(self, k: int) -> int:
+        return max(k, self.rescore_candidates)
+
+    def locales(self, cur) -> List[str]:
+        """Locales present in rag_chunks (invalid ones are logged and skipped)."""
+        cur.execute("SELECT DISTINCT locale FROM rag_chunks;")
+        found = []
+        for (locale,) in cur.fetchall():
+            try:
+                found.append(validate_locale(locale))
+            except ValueError:
+                logging.warning("Skipping ANN index for invalid locale %r", locale)
+        return sorted(found)
+
+    def _row_count(self, cur, locale: str) -> int:
+        cur.execute("SELECT count(*) FROM rag_chunks WHERE locale = %s;", (locale,))
+        return cur.fetchone()[0]
+
+    def _index_info(self, cur, name: str) -> Optional[Dict[str, Any]]:
+        cur.execute(_INDEX_INFO_SQL, (name,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {"type": row[0], "options": _parse_reloptions(row[1]), "size_bytes": row[2], "valid": row[3]}
+
+    def ensure_index(self, cur, locale: str) -> bool:
+        """
+        Create the locale's ANN index if it is missing and the data can support it.
+        IVFFlat is deferred until MIN_IVFFLAT_ROWS rows exist (rebuild() creates it after ingestion).
+        With quantization enabled only the quantized index is created.
+        Returns True when an index exists afterwards.
+        """
+        if self.quantization != "none":
+            return self._ensure_quantized_index(cur, locale)
+        name = index_name(locale)
+        if self._index_info(cur, name):
+            return True
+        rows = self._row_count(cur, locale)
+        if self.index_type == "ivfflat" and rows < MIN_IVFFLAT_ROWS:
+            logging.info("Deferring ivfflat index %s: %s rows < %s (rebuild after ingestion)", name, rows, MIN_IVFFLAT_ROWS)
+            return False
+        cur.execute(self.create_index_sql(locale, rows))
+        logging.info("Created %s index %s for %s rows", self.index_type, name, rows)
+        return True
+
+    def _ensure_quantized_index(self, cur, locale: str, concurrently: bool = False) -> bool:
+        name = quantized_index_name(locale, self.quantization)
+        info = self._index_info(cur, name)
+        if info and info["valid"]:
+            return True
+        if not self.supports_quantization(cur):
+            logging.warning("RAG_QUANTIZATION=%s needs pgvector >= 0.7; not creating %s", self.quantization, name)
+            return False
+        if info:
+            # Left behind by a failed CONCURRENTLY build
+            cur.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name};")
+        cur.execute(self.create_quantized_index_sql(locale, concurrently=concurrently))
+        logging.info("Created %s index %s", self.quantization, name)
+        return True
+
+    def ensure_indexes(self, cur) -> Dict[str, bool]:
+        return {locale: self.ensure_index(cur, locale) for locale in self.locales(cur)}
+
+    def add_locale(self, cur, locale: str) -> str:
+        """Build the ANN index for a new locale without blocking writes. Must run with autocommit."""
+        return self.rebuild(cur, locale)
+
+    def needs_recreate(self, info: Optional[Dict[str, Any]], row_count: int) -> bool:
+        """True when the index is missing/invalid, of the wrong type, or its lists are far from the target."""
+        if not info or not info["valid"] or info["type"] != self.index_type:
+            return True
+        if self.index_type == "ivfflat":
+            current = info["options"].get("lists", 0)
+            target = ivfflat_lists_for(row_count)
+            return current <= 0 or not (0.5 <= target / current <= 2.0)
+        return False
+
+    def rebuild(self, cur, locale: Optional[str] = None) -> str:
+        """
+        Refresh one locale's index (or every locale's) after bulk ingestion. Must run with autocommit.
+        Recreates (build-new, drop-old, rename) when needs_recreate(); otherwise REINDEX CONCURRENTLY
+        so IVFFlat centroids are retrained on the current data. Once every locale is indexed the
+        legacy global index is dropped. Returns the action taken ("locale=action, ..." for all locales).
+        """
+        if locale is None:
+            actions = {loc: self.rebuild(cur, loc) for loc in self.locales(cur)}
+            if actions and all(a != "skipped" for a in actions.values()):
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {LEGACY_INDEX_NAME};")
+            return ", ".join(f"{loc}={a}" for loc, a in actions.items()) or "skipped"
+
+        if self.quantization != "none":
+            # HNSW needs no retraining after ingestion; only (re)build a missing or invalid index
+            name = quantized_index_name(locale, self.quantization)
+            existed = bool((self._index_info(cur, name) or {}).get("valid"))
+            if not self._ensure_quantized_index(cur, locale, concurrently=True):
+                return "skipped"
+            return "unchanged" if existed else "created"
+
+        name = index_name(locale)
+        rows = self._row_count(cur, locale)
+        if self.index_type == "ivfflat" and rows < MIN_IVFFLAT_ROWS:
+            return "skipped"
+        info = self._index_info(cur, name)
+        if not self.needs_recreate(info, rows):
+            cur.execute(f"REINDEX INDEX CONCURRENTLY {name};")
+            logging.info("Reindexed %s (%s rows)", name, rows)
+            return "reindexed"
+
+        tmp_name = f"{name}_new"
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name};")
+        cur.execute(self.create_index_sql(locale, rows, name=tmp_name, concurrently=True))
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+        cur.execute(f"ALTER INDEX {tmp_name} RENAME TO {name};")
+        logging.info("Recreated %s as %s (%s rows)", name, self.index_type, rows)
+        return "recreated"
+
+    def migrate_quantized(self, cur, locale: Optional[str] = None, drop_full: bool = False) -> Dict[str, str]:
+        """
+        Build the quantized index for one locale (or all) without blocking writes, and optionally
+        drop the full-precision ANN index it replaces. Must run with autocommit.
+        """
+        if self.quantization == "none":
+            raise ValueError("Set a quantization (halfvec or binary) to migrate")
+        if not self.supports_quantization(cur):
+            raise RuntimeError("Quantized indexes need pgvector >= 0.7 (ALTER EXTENSION vector UPDATE)")
+        results = {}
+        for loc in [locale] if locale else self.locales(cur):
+            action = self.rebuild(cur, loc)
+            if drop_full:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(loc)};")
+                action += ", full-precision index dropped"
+            results[loc] = action
+        if drop_full and not locale:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {LEGACY_INDEX_NAME};")
+        return results
+
+    # ------------------------------------------------------------------
+    # Query-time tuning
+    # ------------------------------------------------------------------
+    def search_settings(self, lists: Optional[int] = None, k: int = 4) -> Dict[str, str]:
+        """
+        ivfflat.probes / hnsw.ef_search for the recall target. Both are always returned so
+        SET_SEARCH_PARAMS_SQL can be applied regardless of which index the planner uses.
+        """
+        profile = next((p for p in _RECALL_PROFILES if self.recall_target <= p[0]), None)
+        lists = lists or 1
+        if profile is None:
+            # Above the highest profile: scan every list / widest HNSW candidate queue
+            probes, ef_search = lists, _HNSW_MAX_EF_SEARCH
+        else:
+            _, multiplier, ef_search = profile
+            probes = min(lists, max(1, math.ceil(math.sqrt(lists) * multiplier)))
+        return {"ivfflat.probes": str(probes), "hnsw.ef_search": str(min(_HNSW_MAX_EF_SEARCH, max(ef_search, k)))}
+
+    def current_lists(self, cur, locale: str) -> Optional[int]:
+        info = self._index_info(cur, index_name(locale))
+        return info["options"].get("lists") if info else None
+
+    async def acurrent_lists(self, cur, locale: str) -> Optional[int]:
+        await cur.execute(_INDEX_INFO_SQL, (index_name(locale),))
+        row = await cur.fetchone()
+        return _parse_reloptions(row[1]).get("lists") if row else None
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+    def describe(self, cur) -> Dict[str, Any]:
+        report = {
+            "configured_type": self.index_type,
+            "quantization": self.quantization,
+            "legacy_global_index": self._index_info(cur, LEGACY_INDEX_NAME) is not None,
+            "locales": {},
+        }
+        for locale in self.locales(cur):
+            rows = self._row_count(cur, locale)
+            info = self._index_info(cur, index_name(locale))
+            report["locales"][locale] = {
+                "index": index_name(locale),
+                "rows": rows,
+                "exists": info is not None,
+                "type": info["type"] if info else None,
+                "valid": info["valid"] if info else None,
+                "options": info["options"] if info else {},
+                "size_bytes": info["size_bytes"] if info else 0,
+                "recommended_lists": ivfflat_lists_for(rows) if self.index_type == "ivfflat" else None,
+                "needs_recreate": self.needs_recreate(info, rows),
+                "search_settings": self.search_settings(info["options"].get("lists") if info else None),
+            }
+            for quantization in QUANTIZATIONS[1:]:
+                q_info = self._index_info(cur, quantized_index_name(locale, quantization))
+                if q_info:
+                    report["locales"][locale][f"{quantization}_index"] = {
+                        "name": quantized_index_name(locale, quantization),
+                        "valid": q_info["valid"],
+                        "size_bytes": q_info["size_bytes"],
+                    }
+        return report
+
+    def measure_recall(
+        self, cur, locale: str, k: int = 10, samples: int = 50, quantization: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Recall@k and latency of the locale's ANN search against exact search, using stored chunk
+        embeddings as queries. quantization (default: the configured one) selects the full-precision
+        index or quantized candidates + re-scoring. Must run inside a transaction
+        (SET LOCAL / set_config(..., true) are scoped to it).
+        """
+        quantization = quantization or self.quantization
+        where = f"WHERE locale = {locale_literal(locale)}"
+        cur.execute(f"SELECT embedding FROM rag_chunks {where} ORDER BY random() LIMIT %s;", (samples,))
+        queries = [row[0] for row in cur.fetchall()]
+        if not queries:
+            return {"locale": locale, "quantization": quantization, "samples": 0, "k": k, "recall": None, "ann_ms": None, "exact_ms": None}
+
+        exact_sql = f"SELECT id FROM rag_chunks {where} ORDER BY embedding <=> %(embedding)s LIMIT %(k)s;"
+        if quantization == "none":
+            ann_sql, depth = exact_sql, k
+        else:
+            ann_sql, depth = quantized_search_sql(locale, quantization, self.dimensions, columns="id"), self.candidates_for(k)
+        settings = self.search_settings(self.current_lists(cur, locale), k=depth)
+        hits = expected = 0
+        ann_seconds = exact_seconds = 0.0
+        for q in queries:
+            params = {"embedding": q, "k": k, "candidates": depth}
+            cur.execute("SET LOCAL enable_indexscan = on;")
+            cur.execute(SET_SEARCH_PARAMS_SQL, (settings["ivfflat.probes"], settings["hnsw.ef_search"]))
+            start = time.perf_counter()
+            cur.execute(ann_sql, params)
+            ann_ids = {row[0] for row in cur.fetchall()}
+            ann_seconds += time.perf_counter() - start
+
+            cur.execute("SET LOCAL enable_indexscan = off;")
+            start = time.perf_counter()
+            cur.execute(exact_sql, params)
+            exact_ids = {row[0] for row in cur.fetchall()}
+            exact_seconds += time.perf_counter() - start
+            hits += len(ann_ids & exact_ids)
+            expected += len(exact_ids)
+
+        n = len(queries)
+        return {
+            "locale": locale,
+            "quantization": quantization,
+            "samples": n,
+            "k": k,
+            "recall": hits / float(expected) if expected else None,
+            "ann_ms": 1000 * ann_seconds / n,
+            "exact_ms": 1000 * exact_seconds / n,
+            "settings": settings,
+        }
+
+    def compare_quantization(self, cur, locale: str, k: int = 10, samples: int = 50) -> List[Dict[str, Any]]:
+        """measure_recall for every storage mode whose index exists for the locale."""
+        results = []
+        for quantization in QUANTIZATIONS:
+            name = index_name(locale) if quantization == "none" else quantized_index_name(locale, quantization)
+            info = self._index_info(cur, name)
+            if info and info["valid"]:
+                result = self.measure_recall(cur, locale, k=k, samples=samples, quantization=quantization)
+                results.append(dict(result, index=name, index_size_bytes=info["size_bytes"]))
+        return results
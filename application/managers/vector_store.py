@@ -2,14 +2,23 @@
 Abstract interface for RAG vector stores (pgvector, Chroma, etc.).
 Implementations must return LangChain-style doc objects (page_content, metadata)
 so parse_source and knowledge_to_string keep working.
+
+The async methods are the ones the FastAPI app uses; implementations should do
+their I/O natively (async driver or dedicated executor) so retrieval never blocks
+the event loop or the loop's shared default executor.
 """
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 
 
 class VectorStoreBase(ABC):
     """Abstract base for vector stores used by RAG."""
 
+    # Stores that set this accept filters={"regions": [...], "doc_type": ..., "publisher": ...}
+    # (managers/facets.py) on their search methods.
+    supports_filters = False
+
     @abstractmethod
     def similarity_search(self, query: str, k: int = 4, locale: str = "en") -> List[Any]:
         """
@@ -24,3 +33,43 @@ class VectorStoreBase(ABC):
         Ingest documents. Each document must have .page_content and .metadata.
         """
         pass
+
+    @abstractmethod
+    async def asimilarity_search(self, query: str, k: int = 4, locale: str = "en") -> List[Any]:
+        """Async counterpart of similarity_search."""
+        pass
+
+    def similarity_search_with_score(self, query: str, k: int = 4, locale: str = "en") -> List[Tuple[Any, Optional[float]]]:
+        """
+        (document, cosine distance) pairs in result order; similarity is 1 - distance.
+        The default has no distances to offer and returns None for each.
+        """
+        return [(doc, None) for doc in self.similarity_search(query, k=k, locale=locale)]
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, locale: str = "en"
+    ) -> List[Tuple[Any, Optional[float]]]:
+        """Async counterpart of similarity_search_with_score."""
+        return [(doc, None) for doc in await self.asimilarity_search(query, k=k, locale=locale)]
+
+    async def asimilarity_search_with_vectors(
+        self, query: str, k: int = 4, locale: str = "en"
+    ) -> List[Tuple[Any, Optional[float], Optional[Any]]]:
+        """
+        (document, cosine distance, embedding) triples for reranking (e.g. MMR) without a second
+        round trip. The default has no embeddings to offer and returns None for each.
+        """
+        return [(doc, distance, None) for doc, distance in await self.asimilarity_search_with_score(query, k=k, locale=locale)]
+
+    async def asimilarity_search_batch(self, queries: List[str], k: int = 4, locale: str = "en") -> List[List[Any]]:
+        """
+        Run several searches for one locale; returns one result list per query, in order.
+        The default fans out to asimilarity_search; backends should override it to share
+        one embedding call and one connection.
+        """
+        return list(await asyncio.gather(*(self.asimilarity_search(q, k=k, locale=locale) for q in queries)))
+
+    @abstractmethod
+    async def aadd_documents(self, documents: List[Any], locale: str = "en") -> None:
+        """Async counterpart of add_documents."""
+        pass
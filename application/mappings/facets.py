@@ -0,0 +1,111 @@
+# Gazetteer for retrieval facets (managers/facets.py). Keys are the canonical values stored in
+# rag_chunks.regions / doc_type / publisher; aliases are matched case- and accent-insensitively
+# on word boundaries unless listed under ACRONYMS (matched case-sensitively).
+
+# Arizona counties. Names that are also rivers, tribes or common words only match with "county".
+COUNTIES = {
+    "apache": ["apache county", "condado de apache"],
+    "cochise": ["cochise"],
+    "coconino": ["coconino"],
+    "gila": ["gila county", "condado de gila"],
+    "graham": ["graham county", "condado de graham"],
+    "greenlee": ["greenlee county", "condado de greenlee"],
+    "la_paz": ["la paz county", "condado de la paz"],
+    "maricopa": ["maricopa county", "condado de maricopa", "maricopa"],
+    "mohave": ["mohave county", "condado de mohave"],
+    "navajo": ["navajo county", "condado de navajo"],
+    "pima": ["pima county", "condado de pima", "pima"],
+    "pinal": ["pinal"],
+    "santa_cruz": ["santa cruz county", "condado de santa cruz"],
+    "yavapai": ["yavapai"],
+    "yuma": ["yuma county", "condado de yuma"],
+}
+
+# Cities and towns: canonical name -> (county, aliases)
+CITIES = {
+    "phoenix": ("maricopa", ["phoenix", "fenix"]),
+    "mesa": ("maricopa", ["city of mesa", "mesa az", "mesa, az", "mesa, arizona"]),
+    "tempe": ("maricopa", ["tempe"]),
+    "scottsdale": ("maricopa", ["scottsdale"]),
+    "chandler": ("maricopa", ["chandler"]),
+    "glendale": ("maricopa", ["glendale"]),
+    "gilbert": ("maricopa", ["gilbert"]),
+    "peoria": ("maricopa", ["peoria"]),
+    "avondale": ("maricopa", ["avondale"]),
+    "goodyear": ("maricopa", ["goodyear"]),
+    "buckeye": ("maricopa", ["buckeye"]),
+    "el_mirage": ("maricopa", ["el mirage"]),
+    "fountain_hills": ("maricopa", ["fountain hills"]),
+    "queen_creek": ("maricopa", ["queen creek"]),
+    "tucson": ("pima", ["tucson"]),
+    "marana": ("pima", ["marana"]),
+    "oro_valley": ("pima", ["oro valley"]),
+    "sahuarita": ("pima", ["sahuarita"]),
+    "nogales": ("santa_cruz", ["nogales"]),
+    "flagstaff": ("coconino", ["flagstaff"]),
+    "page": ("coconino", ["page, az", "page, arizona", "city of page"]),
+    "prescott": ("yavapai", ["prescott", "prescott valley"]),
+    "cottonwood": ("yavapai", ["cottonwood"]),
+    "yuma": ("yuma", ["yuma", "san luis", "somerton"]),
+    "casa_grande": ("pinal", ["casa grande"]),
+    "apache_junction": ("pinal", ["apache junction"]),
+    "florence": ("pinal", ["florence, az", "town of florence"]),
+    "eloy": ("pinal", ["eloy"]),
+    "sierra_vista": ("cochise", ["sierra vista"]),
+    "bisbee": ("cochise", ["bisbee"]),
+    "douglas": ("cochise", ["douglas, az", "city of douglas"]),
+    "willcox": ("cochise", ["willcox"]),
+    "kingman": ("mohave", ["kingman"]),
+    "lake_havasu_city": ("mohave", ["lake havasu"]),
+    "bullhead_city": ("mohave", ["bullhead city"]),
+    "safford": ("graham", ["safford"]),
+    "show_low": ("navajo", ["show low"]),
+    "globe": ("gila", ["globe, az", "city of globe", "globe-miami"]),
+    "payson": ("gila", ["payson"]),
+}
+
+# Publishers: canonical -> (source URL domains, aliases)
+PUBLISHERS = {
+    "adwr": (["azwater.gov"], ["arizona department of water resources", "department of water resources"]),
+    "awba": (["waterbank.az.gov"], ["arizona water banking authority", "water bank"]),
+    "cap": (["cap-az.com"], ["central arizona project"]),
+    "srp": (["srpnet.com"], ["salt river project"]),
+    "wrrc": (["wrrc.arizona.edu"], ["water resources research center"]),
+    "adeq": (["azdeq.gov"], ["arizona department of environmental quality"]),
+    "epa": (["epa.gov"], ["environmental protection agency"]),
+    "usbr": (["usbr.gov"], ["bureau of reclamation"]),
+    "usgs": (["usgs.gov"], ["geological survey"]),
+    "morrison_institute": (["morrisoninstitute.asu.edu"], ["morrison institute"]),
+    "amwua": (["amwua.org"], ["arizona municipal water users association"]),
+    "city_of_phoenix": (["phoenix.gov"], ["city of phoenix"]),
+    "city_of_tucson": (["tucsonaz.gov"], ["city of tucson", "tucson water"]),
+    "city_of_mesa": (["mesaaz.gov"], ["city of mesa"]),
+    "city_of_flagstaff": (["flagstaff.az.gov"], ["city of flagstaff"]),
+    "city_of_yuma": (["yumaaz.gov"], ["city of yuma"]),
+}
+
+# Case-sensitive acronyms -> publisher ("CAP" but not "cap", "EPA" but not "epa")
+ACRONYMS = {
+    "ADWR": "adwr", "AWBA": "awba", "CAP": "cap", "SRP": "srp", "WRRC": "wrrc", "ADEQ": "adeq",
+    "EPA": "epa", "USBR": "usbr", "USGS": "usgs", "AMWUA": "amwua",
+}
+
+# Document types: canonical -> regex over file name + description (first match wins)
+DOC_TYPES = [
+    ("fact_sheet", r"fact\s*sheet|factsheet|\d-page"),
+    ("faq", r"\bfaqs?\b|frequently asked"),
+    ("plan", r"\bplan\b|\bplanning\b"),
+    ("report", r"\breport\b|\bannual\b|\bassessment\b"),
+    ("guide", r"\bguide\b|\bbrochure\b|\bhandbook\b|\btips\b"),
+    ("regulation", r"\bcode\b|\bordinance\b|\bstatute\b|\bregulations?\b"),
+    ("research", r"\bstudy\b|\bresearch\b|\bjournal\b|\bpaper\b"),
+    ("news", r"\bnews\b|\bpress release\b|\bnewsletter\b"),
+]
+
+# Document types a query may ask for explicitly ("Yuma fact sheet", "informe anual")
+QUERY_DOC_TYPES = {
+    "fact_sheet": ["fact sheet", "factsheet", "hoja informativa"],
+    "faq": ["faq", "frequently asked questions", "preguntas frecuentes"],
+    "report": ["report", "informe"],
+    "guide": ["guide", "brochure", "guia"],
+}
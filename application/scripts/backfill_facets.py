@@ -0,0 +1,115 @@
+"""
+Tag existing rag_chunks with retrieval facets (regions, doc_type, publisher).
+
+New chunks are tagged at ingestion (PgVectorStore); run this once after upgrading,
+and again after editing the gazetteer in mappings/facets.py. Facets are computed
+per document over all of its chunks, committed every --batch-size documents, and
+each commit bumps the corpus version so cached retrievals are dropped.
+
+  --dry-run   print the facet distribution without writing
+
+Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME.
+Usage: python scripts/backfill_facets.py [--locale en] [--dry-run]
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+import psycopg
+
+from managers.corpus_version import bump_corpus_version, ensure_corpus_version_table
+from managers.facets import document_facets, ensure_facet_columns
+
+_DOCUMENTS_SQL = """
+    SELECT doc_id, min(metadata->>'source'), array_agg(content ORDER BY chunk_index)
+    FROM rag_chunks
+    WHERE doc_id IS NOT NULL AND (%(locale)s::text IS NULL OR locale = %(locale)s)
+    GROUP BY doc_id
+    ORDER BY doc_id;
+"""
+_UPDATE_SQL = """
+    UPDATE rag_chunks SET regions = %s, doc_type = %s, publisher = %s
+    WHERE doc_id = %s AND (%s::text IS NULL OR locale = %s)
+      AND (regions, doc_type, publisher) IS DISTINCT FROM (%s::text[], %s, %s);
+"""
+
+
+def _connect():
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return psycopg.connect(database_url)
+    db_host = os.getenv("DB_HOST")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_name = os.getenv("DB_NAME")
+    if not all([db_host, db_user, db_password, db_name]):
+        print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+        sys.exit(1)
+    return psycopg.connect(
+        dbname=db_name, user=db_user, password=db_password, host=db_host, port=os.getenv("DB_PORT", "5432")
+    )
+
+
+def _print_distribution(tagged: dict) -> None:
+    regions = Counter(r for f in tagged.values() for r in f["regions"] or ["(statewide / none)"])
+    doc_types = Counter(f["doc_type"] or "(none)" for f in tagged.values())
+    publishers = Counter(f["publisher"] or "(none)" for f in tagged.values())
+    for title, counts in (("regions", regions), ("doc_type", doc_types), ("publisher", publishers)):
+        print(f"{title}:")
+        for value, n in counts.most_common():
+            print(f"  {value:<28} {n}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute retrieval facets for existing rag_chunks")
+    parser.add_argument("--locale", help="Only this locale (default: all)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Show the facet distribution, write nothing")
+    args = parser.parse_args()
+
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            if not args.dry_run:
+                ensure_facet_columns(cur)
+                ensure_corpus_version_table(cur)
+                conn.commit()
+            cur.execute(_DOCUMENTS_SQL, {"locale": args.locale})
+            documents = cur.fetchall()
+        tagged = {doc_id: document_facets(source or doc_id, texts) for doc_id, source, texts in documents}
+        print(f"📄 {len(tagged)} document(s)")
+        _print_distribution(tagged)
+        if args.dry_run:
+            return
+
+        updated = 0
+        doc_ids = list(tagged)
+        for start in range(0, len(doc_ids), args.batch_size):
+            batch = doc_ids[start:start + args.batch_size]
+            with conn.cursor() as cur:
+                changed = []
+                for doc_id in batch:
+                    f = tagged[doc_id]
+                    values = (f["regions"], f["doc_type"], f["publisher"])
+                    cur.execute(_UPDATE_SQL, values + (doc_id, args.locale, args.locale) + values)
+                    if cur.rowcount:
+                        changed.append(doc_id)
+                        updated += cur.rowcount
+                if changed:
+                    bump_corpus_version(cur, changed)
+            conn.commit()
+            print(f"  {min(start + args.batch_size, len(doc_ids))}/{len(doc_ids)} documents")
+    print(f"✅ Updated facets on {updated} chunk(s)")
+
+
+if __name__ == "__main__":
+    main()
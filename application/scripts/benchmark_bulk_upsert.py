@@ -0,0 +1,131 @@
+"""
+Benchmark PgVectorStore writes: row-by-row INSERT ... ON CONFLICT vs. binary COPY into a
+staging table merged with one INSERT ... SELECT per batch.
+
+Each mode writes --rows synthetic chunks (random unit embeddings of the rag_chunks
+column's size, realistic content and metadata) to a scratch locale with
+PgVectorStore.upsert_batch, twice: once as new rows and once as updates of the same
+ids. Reported per mode (row_by_row, copy[BATCH]):
+
+  insert_s / update_s   wall time of each pass
+  rows_per_s            over both passes
+
+The scratch locale is deleted afterwards; each pass bumps the corpus version like any
+other write. Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME.
+Usage: python scripts/benchmark_bulk_upsert.py --rows 20000 --batch-size 1000 5000 20000
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+import numpy as np
+
+from managers.document_index import document_table_exists
+from managers.pgvector_store import PgVectorStore
+
+SCRATCH_LOCALE = "bench-bulk"
+_DIMENSIONS_SQL = "SELECT atttypmod FROM pg_attribute WHERE attrelid = 'rag_chunks'::regclass AND attname = 'embedding';"
+
+
+def _store(batch_size: int) -> PgVectorStore:
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return PgVectorStore(db_url=database_url, bulk_batch_size=batch_size)
+    db_host = os.getenv("DB_HOST")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_name = os.getenv("DB_NAME")
+    if not all([db_host, db_user, db_password, db_name]):
+        print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+        sys.exit(1)
+    return PgVectorStore(
+        db_params={"dbname": db_name, "user": db_user, "password": db_password, "host": db_host, "port": os.getenv("DB_PORT", "5432")},
+        bulk_batch_size=batch_size,
+    )
+
+
+def _rows(n: int, dims: int, rng) -> dict:
+    vectors = rng.normal(size=(n, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    contents = [f"Synthetic chunk {i} about groundwater recharge in Pima County. " * 20 for i in range(n)]
+    doc_ids = [f"bench/doc{i // 20}.pdf" for i in range(n)]
+    return {
+        "ids": [hashlib.sha256(f"bench:{i}".encode()).hexdigest() for i in range(n)],
+        "doc_ids": doc_ids,
+        "chunk_indices": [i % 20 for i in range(n)],
+        "contents": contents,
+        "embeddings": list(vectors),
+        "metadatas": [{"source": d, "name": os.path.basename(d), "page": i % 20} for i, d in enumerate(doc_ids)],
+        "content_hashes": [hashlib.sha256(c.encode()).hexdigest() for c in contents],
+    }
+
+
+def _cleanup(store: PgVectorStore) -> None:
+    with store._connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM rag_chunks WHERE locale = %s;", (SCRATCH_LOCALE,))
+            if document_table_exists(cur):
+                cur.execute("DELETE FROM rag_documents WHERE locale = %s;", (SCRATCH_LOCALE,))
+        conn.commit()
+
+
+def _timed_upsert(store: PgVectorStore, rows: dict) -> float:
+    start = time.perf_counter()
+    store.upsert_batch(locale=SCRATCH_LOCALE, **rows)
+    return time.perf_counter() - start
+
+
+def run(args) -> list:
+    probe = _store(0)
+    with probe._connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_DIMENSIONS_SQL)
+            dims = cur.fetchone()[0]
+    rows = _rows(args.rows, dims, np.random.default_rng(args.seed))
+    print(f"⏱️  {args.rows} rows of {dims} dimensions", file=sys.stderr)
+
+    results = []
+    modes = [("row_by_row", 0)] if not args.skip_row_by_row else []
+    modes += [(f"copy[{n}]", n) for n in args.batch_size]
+    for mode, batch_size in modes:
+        store = _store(batch_size)
+        _cleanup(store)
+        try:
+            insert_s = _timed_upsert(store, rows)
+            update_s = _timed_upsert(store, rows)
+        finally:
+            _cleanup(store)
+        results.append({
+            "mode": mode,
+            "rows": args.rows,
+            "insert_s": round(insert_s, 2),
+            "update_s": round(update_s, 2),
+            "rows_per_s": round(2 * args.rows / (insert_s + update_s), 1),
+        })
+        print(f"  {mode}: {results[-1]['rows_per_s']} rows/s", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-by-row vs. COPY + merge write throughput of PgVectorStore")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic chunks per pass")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1000, 5000, 20000], help="COPY batch sizes to compare")
+    parser.add_argument("--skip-row-by-row", action="store_true", help="Only measure the COPY path")
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark query-focused context compression on logged queries.
+
+For each logged (user_query, response_content) pair in the messages table it retrieves
+chunks as /chat_api does, builds kb_data with and without compression and reports:
+
+  tokens_full / tokens_compressed   prompt-context tokens per query (mean) and the reduction
+  evidence_recall                   quality proxy: of the --evidence context sentences most similar
+                                    to the answer that was actually given, the fraction that survive
+                                    compression (1.0 = nothing the answer relied on was cut)
+  compress_ms                       compression latency (mean / p95)
+
+Run it at a few --budget values and pick the smallest whose evidence_recall stays acceptable.
+Only the queries, logged answers and sentences not yet cached are embedded.
+Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME.
+Usage: python scripts/benchmark_compression.py --limit 200 --budget 400 600 800
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+from managers.compression import SentenceCompressor, split_sentences
+from managers.context_builder import build_context
+from managers.pgvector_store import PgVectorStore
+from managers.tokens import count_tokens
+
+
+def _store() -> PgVectorStore:
+    from managers.embeddings import make_embeddings
+
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        store = PgVectorStore(db_url=database_url, embedding_function=make_embeddings())
+    else:
+        db_params = {
+            "dbname": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "host": os.getenv("DB_HOST"),
+            "port": os.getenv("DB_PORT", "5432"),
+        }
+        if not all(db_params[k] for k in ("dbname", "user", "password", "host")):
+            print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+            sys.exit(1)
+        store = PgVectorStore(db_params=db_params, embedding_function=make_embeddings())
+    store.refresh_embedding_spec(force=True)
+    return store
+
+
+async def _logged_queries(store: PgVectorStore, args) -> list:
+    where = ["length(user_query) > 10", "length(response_content) > 0"]
+    params = []
+    if args.chatbot_type:
+        where.append("chatbot_type = %s")
+        params.append(args.chatbot_type)
+    if args.only_liked:
+        where.append("reaction = 1")
+    params.append(args.limit)
+    async with await store._aconnect() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"SELECT user_query, response_content FROM messages WHERE {' AND '.join(where)}"
+                " ORDER BY created_at DESC LIMIT %s;",
+                params,
+            )
+            return await cur.fetchall()
+
+
+def _summary(budget: int, rows: list) -> dict:
+    full = [r["tokens_full"] for r in rows]
+    compressed = [r["tokens_compressed"] for r in rows]
+    latencies = sorted(r["compress_ms"] for r in rows)
+    recalls = [r["evidence_recall"] for r in rows if r["evidence_recall"] is not None]
+    return {
+        "budget": budget,
+        "queries": len(rows),
+        "tokens_full": round(statistics.mean(full), 1) if full else None,
+        "tokens_compressed": round(statistics.mean(compressed), 1) if compressed else None,
+        "reduction": round(1 - sum(compressed) / sum(full), 3) if sum(full) else None,
+        "evidence_recall": round(statistics.mean(recalls), 3) if recalls else None,
+        "compress_ms_mean": round(statistics.mean(latencies), 1) if latencies else None,
+        "compress_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None,
+    }
+
+
+async def run(args) -> None:
+    store = _store()
+    logged = await _logged_queries(store, args)
+    if not logged:
+        print("ℹ️  No logged queries match")
+        return
+    compressors = {b: SentenceCompressor(store=store, token_budget=b) for b in args.budget}
+    results = {b: [] for b in args.budget}
+    for user_query, answer in logged:
+        docs = await store.asimilarity_search(user_query, k=args.k, locale=args.locale)
+        if not docs:
+            continue
+        full = build_context(docs)
+        # Context sentences the logged answer leaned on most
+        answer_scores = await compressors[args.budget[0]].sentence_scores(answer, docs)
+        evidence = sorted(answer_scores, key=answer_scores.get, reverse=True)[: args.evidence]
+        for budget, compressor in compressors.items():
+            start = time.perf_counter()
+            compressed_docs = await compressor.compress(user_query, docs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            compressed = build_context(compressed_docs)
+            kept = set(s for doc in compressed_docs for s in split_sentences(doc.page_content))
+            results[budget].append({
+                "tokens_full": count_tokens(full),
+                "tokens_compressed": count_tokens(compressed),
+                "evidence_recall": sum(s in kept for s in evidence) / len(evidence) if evidence else None,
+                "compress_ms": elapsed_ms,
+            })
+    print(json.dumps([_summary(b, results[b]) for b in args.budget], indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt-token reduction vs. answer evidence kept by context compression")
+    parser.add_argument("--limit", type=int, default=100, help="Most recent logged queries to replay")
+    parser.add_argument("--budget", type=int, nargs="+", default=[600], help="Compression token budget(s) to compare")
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query (as in /chat_api)")
+    parser.add_argument("--locale", default="en")
+    parser.add_argument("--chatbot-type", help="Only messages from this bot (waterbot, riverbot, ...)")
+    parser.add_argument("--only-liked", action="store_true", help="Only answers users rated positively")
+    parser.add_argument("--evidence", type=int, default=3, help="Answer-supporting sentences checked per query")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark two-stage (document-then-chunk) retrieval against flat chunk ANN on synthetic corpora.
+
+For each --scale S the chunks of --locale are copied S times into a scratch locale
+(e.g. en-x10): copy 0 unchanged, every further copy of a document shifted by its
+own random direction (--doc-noise) plus per-chunk jitter (--chunk-noise), so the
+copies look like new, similar documents. The scratch locale gets its own ANN index
+and rag_documents centroids, exactly as the app builds them. Queries are stored
+chunk embeddings plus --query-noise. Reported per scale:
+
+  flat                recall@k and latency (mean / p95 ms) of the per-locale ANN index
+  two_stage[N]        the same for two-stage search over the top N documents
+  exact_ms            exhaustive search latency (the recall reference)
+
+Pick RAG_DOCUMENT_CANDIDATES as the smallest N whose recall matches flat search at
+the corpus size you expect. Scratch locales are removed afterwards (unless --keep)
+and never bump the corpus version. Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME.
+Usage: python scripts/benchmark_two_stage.py --locale en --scale 1 10 100 --documents 5 10 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from managers.document_index import (
+    document_index_name,
+    document_table_exists,
+    rebuild_documents,
+    two_stage_search_sql,
+)
+from managers.vector_index import (
+    QUANTIZATIONS,
+    SET_SEARCH_PARAMS_SQL,
+    VectorIndexManager,
+    index_name,
+    locale_literal,
+    quantized_index_name,
+)
+
+
+def _connect():
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        conn = psycopg.connect(database_url)
+    else:
+        db_host = os.getenv("DB_HOST")
+        db_user = os.getenv("DB_USER")
+        db_password = os.getenv("DB_PASSWORD")
+        db_name = os.getenv("DB_NAME")
+        if not all([db_host, db_user, db_password, db_name]):
+            print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+            sys.exit(1)
+        conn = psycopg.connect(
+            dbname=db_name, user=db_user, password=db_password, host=db_host, port=os.getenv("DB_PORT", "5432")
+        )
+    register_vector(conn)
+    return conn
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def _noise(rng, dims: int, scale: float) -> np.ndarray:
+    # Relative to a unit vector: the noise vector's expected norm is `scale`
+    return rng.normal(0.0, scale / np.sqrt(dims), dims)
+
+
+def _synthesize(cur, base_locale: str, locale: str, scale: int, args, rng) -> int:
+    cur.execute(
+        "SELECT doc_id, chunk_index, content, embedding FROM rag_chunks WHERE locale = %s AND doc_id IS NOT NULL;",
+        (base_locale,),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    dims = len(rows[0][3])
+    base = [(doc_id, idx, content, _unit(np.asarray(emb, dtype=np.float64))) for doc_id, idx, content, emb in rows]
+    with cur.copy("COPY rag_chunks (id, doc_id, chunk_index, content, embedding, locale) FROM STDIN") as copy:
+        for n in range(scale):
+            shifts = {}
+            for doc_id, idx, content, vector in base:
+                if n:
+                    if doc_id not in shifts:
+                        shifts[doc_id] = _noise(rng, dims, args.doc_noise)
+                    vector = _unit(vector + shifts[doc_id] + _noise(rng, dims, args.chunk_noise))
+                copy.write_row(
+                    (f"bench:{locale}:{n}:{doc_id}:{idx}", f"{doc_id}#x{n}", idx, content, vector.astype(np.float32), locale)
+                )
+    return len(rows) * scale
+
+
+def _cleanup(cur, locale: str) -> None:
+    cur.execute("DELETE FROM rag_chunks WHERE locale = %s;", (locale,))
+    if document_table_exists(cur):
+        cur.execute("DELETE FROM rag_documents WHERE locale = %s;", (locale,))
+    names = [index_name(locale), document_index_name(locale)]
+    names += [quantized_index_name(locale, q) for q in QUANTIZATIONS if q != "none"]
+    for name in names:
+        cur.execute(f"DROP INDEX IF EXISTS {name};")
+
+
+def _timed(cur, query: str, params: dict) -> tuple:
+    start = time.perf_counter()
+    cur.execute(query, params)
+    ids = {row[0] for row in cur.fetchall()}
+    return ids, (time.perf_counter() - start) * 1000
+
+
+def _stats(hits: int, expected: int, latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "recall": round(hits / expected, 4) if expected else None,
+        "ms_mean": round(statistics.mean(latencies), 2),
+        "ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+    }
+
+
+def _measure(cur, manager: VectorIndexManager, locale: str, args, rng) -> dict:
+    cur.execute(f"SELECT embedding FROM rag_chunks WHERE locale = {locale_literal(locale)} ORDER BY random() LIMIT %s;", (args.samples,))
+    queries = [_unit(np.asarray(row[0], dtype=np.float64)) for row in cur.fetchall()]
+    queries = [_unit(q + _noise(rng, len(q), args.query_noise)).astype(np.float32) for q in queries]
+    cur.execute("SELECT count(*) FROM rag_documents WHERE locale = %s;", (locale,))
+    document_count = cur.fetchone()[0]
+
+    exact_sql = f"SELECT id FROM rag_chunks WHERE locale = {locale_literal(locale)} ORDER BY embedding <=> %(embedding)s LIMIT %(k)s;"
+    two_stage_sql = two_stage_search_sql(locale, columns="id")
+    lists = manager.current_lists(cur, locale)
+    # mode -> (query, search depth for ef_search/probes, top-N documents)
+    modes = {"flat": (exact_sql, args.k, None)}
+    modes.update({f"two_stage[{n}]": (two_stage_sql, max(args.k, n), n) for n in args.documents})
+    hits = {mode: 0 for mode in modes}
+    latencies = {mode: [] for mode in modes}
+    exact_ms, expected = [], 0
+    for q in queries:
+        cur.execute("SET LOCAL enable_indexscan = off;")
+        truth, ms = _timed(cur, exact_sql, {"embedding": q, "k": args.k})
+        exact_ms.append(ms)
+        expected += len(truth)
+        cur.execute("SET LOCAL enable_indexscan = on;")
+        for mode, (query, depth, documents) in modes.items():
+            settings = manager.search_settings(lists, k=depth)
+            cur.execute(SET_SEARCH_PARAMS_SQL, (settings["ivfflat.probes"], settings["hnsw.ef_search"]))
+            found, ms = _timed(cur, query, {"embedding": q, "k": args.k, "documents": documents})
+            hits[mode] += len(found & truth)
+            latencies[mode].append(ms)
+    report = {"documents": document_count, "samples": len(queries), "k": args.k}
+    report.update({mode: _stats(hits[mode], expected, latencies[mode]) for mode in modes})
+    report["exact_ms"] = round(statistics.mean(exact_ms), 2) if exact_ms else None
+    return report
+
+
+def run(args) -> list:
+    manager = VectorIndexManager(index_type=args.type)
+    rng = np.random.default_rng(args.seed)
+    results = []
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            table_existed = document_table_exists(cur)
+        conn.commit()
+        for scale in args.scale:
+            locale = f"{args.locale}-x{scale}"
+            with conn.cursor() as cur:
+                _cleanup(cur, locale)
+                chunks = _synthesize(cur, args.locale, locale, scale, args, rng)
+                if not chunks:
+                    print(f"❌ No chunks for locale={args.locale}", file=sys.stderr)
+                    sys.exit(1)
+                manager.ensure_index(cur, locale)
+                rebuild_documents(cur, locale=locale)
+                cur.execute("ANALYZE rag_chunks;")
+            conn.commit()
+            print(f"⏱️  scale {scale}: {chunks} chunks in locale {locale}", file=sys.stderr)
+            try:
+                with conn.cursor() as cur:
+                    report = _measure(cur, manager, locale, args, rng)
+                conn.rollback()
+                report.update(scale=scale, chunks=chunks)
+                results.append(report)
+            finally:
+                if not args.keep:
+                    with conn.cursor() as cur:
+                        _cleanup(cur, locale)
+                        if not table_existed:
+                            cur.execute("DROP TABLE IF EXISTS rag_documents;")
+                    conn.commit()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of two-stage vs. flat retrieval at synthetic corpus sizes")
+    parser.add_argument("--locale", default="en", help="Locale whose chunks seed the synthetic corpora")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100], help="Corpus size multipliers")
+    parser.add_argument("--documents", type=int, nargs="+", default=[5, 10, 20, 40], help="Top-N documents to compare")
+    parser.add_argument("--k", type=int, default=4, help="Chunks per query")
+    parser.add_argument("--samples", type=int, default=50, help="Queries per scale")
+    parser.add_argument("--type", choices=["ivfflat", "hnsw"], help="Chunk index type (default: RAG_INDEX_TYPE)")
+    parser.add_argument("--doc-noise", type=float, default=0.3, help="Per-document shift of synthetic copies")
+    parser.add_argument("--chunk-noise", type=float, default=0.1, help="Per-chunk jitter of synthetic copies")
+    parser.add_argument("--query-noise", type=float, default=0.3, help="Jitter applied to sampled chunk embeddings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch locales for inspection")
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
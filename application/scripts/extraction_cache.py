@@ -0,0 +1,105 @@
+"""
+Manage the extraction cache (parsed, normalized pages keyed by file SHA-256; see
+managers/extraction_cache.py).
+
+  warm [DIRECTORY]      parse every .pdf/.txt not cached yet, in a process pool
+  stats                 entries and size of the current extractor version, stale entries
+  invalidate FILE...    drop the entries of these files' current content
+  invalidate --stale    drop entries written by other pypdf/normalization versions
+  invalidate --all      drop everything
+
+The backend comes from --backend or RAG_EXTRACTION_CACHE (disk | postgres).
+Usage: python scripts/extraction_cache.py warm [DIRECTORY] [--workers 8]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"))
+
+from managers.extraction_cache import make_extraction_cache
+from managers.file_fingerprints import file_sha256
+from managers.ingestion import list_files, warm_file
+
+
+def _default_directory():
+    for path in (os.path.join(_application_dir, "newData"), os.path.join(os.getcwd(), "newData")):
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def warm(cache, directory: str, workers: int) -> dict:
+    paths = list_files(directory)
+    print(f"📄 {len(paths)} PDF/TXT files in {directory}", file=sys.stderr)
+    counts = {"cached": 0, "extracted": 0, "failed": 0}
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(warm_file, path, cache) for path in paths]
+        for n, future in enumerate(as_completed(futures), 1):
+            path, status = future.result()
+            if status in counts:
+                counts[status] += 1
+            else:
+                counts["failed"] += 1
+                print(f"⚠️  {path}: {status}", file=sys.stderr)
+            if n % 100 == 0:
+                print(f"⏱️  {n}/{len(paths)} files", file=sys.stderr)
+    return {**counts, "elapsed_s": round(time.monotonic() - start, 1)}
+
+
+def invalidate(cache, files, stale: bool, everything: bool) -> dict:
+    if everything:
+        return {"removed": cache.clear()}
+    if stale:
+        return {"removed": cache.clear(keep_current=True)}
+    if not files:
+        print("❌ Give FILE arguments, --stale or --all", file=sys.stderr)
+        sys.exit(1)
+    return {"removed": cache.delete(file_sha256(path) for path in files)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm, inspect or invalidate the PDF/TXT extraction cache")
+    parser.add_argument("--backend", choices=["disk", "postgres"], default=None,
+                        help="Cache backend (default: RAG_EXTRACTION_CACHE or disk)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="Parse and cache every file not cached yet")
+    warm_parser.add_argument("directory", nargs="?", help="Directory to warm (default: newData)")
+    warm_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Extraction processes")
+    commands.add_parser("stats", help="Entries and size of the cache")
+    invalidate_parser = commands.add_parser("invalidate", help="Drop cache entries")
+    invalidate_parser.add_argument("files", nargs="*", help="Files whose current content's entries to drop")
+    invalidate_parser.add_argument("--stale", action="store_true", help="Drop entries of other extractor versions")
+    invalidate_parser.add_argument("--all", action="store_true", help="Drop every entry")
+    args = parser.parse_args()
+
+    cache = make_extraction_cache(args.backend)
+    if cache is None:
+        print("❌ The extraction cache is off (RAG_EXTRACTION_CACHE=off)", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "warm":
+        directory = args.directory or _default_directory()
+        if not directory or not os.path.isdir(directory):
+            print("❌ Could not find newData directory.", file=sys.stderr)
+            sys.exit(1)
+        result = warm(cache, directory, args.workers)
+    elif args.command == "stats":
+        result = cache.stats()
+    else:
+        result = invalidate(cache, args.files, args.stale, args.all)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
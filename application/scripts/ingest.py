@@ -0,0 +1,412 @@
+"""
+Single entry point for loading the pgvector RAG store.
+
+  add FILE...          ingest these files (incremental: unchanged chunks are skipped)
+  sync [DIRECTORY]     make the locale match DIRECTORY (default newData): new and changed
+                       files are ingested, files gone from it deleted (unless
+                       --keep-missing); resumable through rag_ingest_manifest
+                       (--restart, --retry-failed, --status, --worker-id)
+  delete PATH...       delete files' chunks and fingerprints (a directory: every ingested
+                       file under it; --source: chunks whose metadata source is PATH)
+  gc                   delete orphans: chunks past their file's chunk count, fingerprints
+                       of files without chunks, rag_documents rows without chunks, and
+                       release near-duplicates of chunks that are gone
+  dedup                sign the stored chunks with MinHash and delete near-duplicates,
+                       keeping their sources on the chunk they duplicate
+  reindex              rebuild the locale's ANN index
+  stats                chunks, documents and files of the locale, manifest, extraction cache
+  watch [DIRECTORY]    sync once, then keep ingesting new/changed files and deleting
+                       removed ones as they happen (inotify, or polling with --poll or
+                       where inotify is unavailable); changes are debounced and batched
+
+Every command takes --locale (default en). The database comes from DATABASE_URL or
+DB_HOST, DB_USER, DB_PASSWORD, DB_NAME (DB_PORT); embeddings from OPENAI_API_KEY and
+the RAG_EMBED_* / RAG_INGEST_* settings (see managers/embedding_batcher.py).
+add, sync and watch skip near-duplicate chunks with --dedup or RAG_DEDUP=true
+(managers/near_duplicates.py).
+The loading pipeline itself is managers/ingestion.py.
+
+Usage: python scripts/ingest.py sync [DIRECTORY] [--locale es] [--workers 8]
+       python scripts/ingest.py watch --debounce 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+# Load application/.env first, then root .env with override so root (canonical) wins
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+from managers.extraction_cache import make_extraction_cache
+from managers.ingestion import IngestionPipeline, list_files
+from managers.near_duplicates import near_duplicate_threshold, near_duplicates_enabled
+
+LOCALE = "en"
+
+
+def get_store(with_embeddings: bool = True, **embedding_options):
+    """PgVectorStore from DATABASE_URL or DB_*; ingestion embeddings only when with_embeddings."""
+    from managers.pgvector_store import PgVectorStore
+
+    embeddings = None
+    if with_embeddings:
+        from managers.embedding_batcher import make_ingestion_embeddings
+
+        embeddings = make_ingestion_embeddings(**embedding_options)
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        return PgVectorStore(db_url=database_url, embedding_function=embeddings)
+    db_host = os.getenv("DB_HOST")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_name = os.getenv("DB_NAME")
+    if not all([db_host, db_user, db_password, db_name]):
+        print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+        sys.exit(1)
+    return PgVectorStore(
+        db_params={"dbname": db_name, "user": db_user, "password": db_password, "host": db_host, "port": os.getenv("DB_PORT", "5432")},
+        embedding_function=embeddings,
+    )
+
+
+def find_data_directory():
+    project_root = os.path.dirname(_application_dir)
+    possible_paths = [
+        os.path.join(_application_dir, 'newData'),
+        os.path.join(project_root, 'application', 'newData'),
+        os.path.join(os.getcwd(), 'newData'),
+        os.path.join(os.getcwd(), 'application', 'newData'),
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            print(f"✅ Found newData directory at: {path}")
+            return path
+    return None
+
+
+def _directory(args):
+    directory = args.directory or find_data_directory()
+    if not directory or not os.path.isdir(directory):
+        print("❌ Could not find newData directory.", file=sys.stderr)
+        sys.exit(1)
+    return directory
+
+
+def _print_progress(stats):
+    print(
+        f"⏱️  {stats['elapsed_s']}s: {stats['files']} files, {stats['chunks_written']} chunks written "
+        f"({stats['pages_per_s']} pages/s, {stats['chunks_per_s']} chunks/s, {stats['tokens_per_s']} tokens/s) "
+        f"queues={stats['queue_depth']} blocked={stats['blocked_s']} idle={stats['idle_s']} "
+        f"embedding={stats['embedding']}"
+    )
+
+
+def _print_summary(stats):
+    print(f"♻️  {stats['files_unchanged']} unchanged files, {stats['files_cached']} files read from the extraction cache, "
+          f"{stats['chunks_unchanged']} unchanged chunks, "
+          f"{stats['chunks_deleted']} chunks of {stats['files_deleted']} removed files deleted")
+    if stats["chunks_duplicate"] or stats["duplicates_released"]:
+        print(f"🧬 {stats['chunks_duplicate']} near-duplicate chunks skipped, "
+              f"{stats['duplicates_released']} files with released duplicates (re-ingested on the next sync)")
+    if stats["files_skipped"]:
+        print(f"⚠️  Skipped {stats['files_skipped']} files (empty/corrupted/unsupported)")
+    if stats["chunks_failed"]:
+        print(f"❌ {stats['chunks_failed']} chunks failed to embed or write", file=sys.stderr)
+
+
+def _loader(args):
+    """Store with ingestion embeddings on the corpus' active spec, and the extraction cache."""
+    print(f"OPENAI_API_KEY: {'SET' if os.getenv('OPENAI_API_KEY') else 'NOT SET'}")
+    try:
+        store = get_store(
+            max_concurrency=args.embed_concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+        )
+        # Embed with the corpus' active model/dimensions (after a re-embedding swap they differ from the env)
+        store.refresh_embedding_spec(force=True)
+        extraction_cache = make_extraction_cache(args.extraction_cache)
+    except Exception as e:
+        print(f"❌ Failed to initialize store: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    return store, extraction_cache
+
+
+def _near_duplicates(store, args):
+    if not (near_duplicates_enabled() if args.dedup is None else args.dedup):
+        return None
+    return store.near_duplicate_index(args.locale, args.dedup_threshold or near_duplicate_threshold())
+
+
+def _pipeline(store, extraction_cache, args, **options):
+    return IngestionPipeline(
+        store,
+        locale=args.locale,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        embed_batch_size=args.embed_batch_size,
+        embed_concurrency=store.embedding_function.max_concurrency,
+        write_batch_size=args.write_batch_size,
+        progress_interval=args.progress_interval,
+        on_progress=_print_progress,
+        incremental=not args.full,
+        extraction_cache=extraction_cache,
+        near_duplicates=_near_duplicates(store, args),
+        **options,
+    )
+
+
+def rebuild_index(store, locale=LOCALE):
+    """Retrain/resize the ANN index on the freshly loaded data (non-fatal)."""
+    try:
+        print(f"🔧 ANN index ({locale}) {store.rebuild_index(locale)}")
+    except Exception as e:
+        print(f"⚠️  Could not rebuild ANN index: {e}", file=sys.stderr)
+
+
+def cmd_add(args):
+    missing = [p for p in args.files if not os.path.isfile(p)]
+    if missing:
+        print(f"❌ Not found: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+    store, extraction_cache = _loader(args)
+    stats = asyncio.run(_pipeline(store, extraction_cache, args).run(args.files))
+    print(json.dumps(stats, indent=2))
+    _print_summary(stats)
+    print(f"✅ Added {stats['chunks_written']} chunks from {stats['files']} files (locale={args.locale})")
+
+
+def cmd_sync(args):
+    print("🚀 Starting RAG loader...")
+    print(f"Working directory: {os.getcwd()}")
+    store, extraction_cache = _loader(args)
+    manifest = None if args.no_manifest else store.ingest_manifest(args.locale, args.worker_id)
+    if args.status:
+        print(json.dumps(asyncio.run(manifest.status()), indent=2))
+        return
+
+    directory_path = _directory(args)
+    paths = list_files(directory_path)
+    print(f"📄 Found {len(paths)} PDF/TXT files in {directory_path}")
+    prune_prefix = None if args.keep_missing else os.path.join(directory_path, "")
+
+    if manifest is not None:
+        if args.retry_failed:
+            print(f"🔁 Retrying {asyncio.run(manifest.retry_failed())} failed files")
+            prune_prefix = None
+        else:
+            started, count = asyncio.run(manifest.enqueue(paths, os.path.join(directory_path, ""), restart=args.restart))
+            print(f"🗂️  {'Started a new run over' if started else 'Resuming the unfinished run:'} {count} files "
+                  f"(worker {manifest.worker})")
+
+    pipeline = _pipeline(store, extraction_cache, args, manifest=manifest, claim_batch_size=args.claim_batch_size)
+    stats = asyncio.run(pipeline.run(paths, prune_prefix=prune_prefix))
+    print(json.dumps(stats, indent=2))
+    _print_summary(stats)
+    if manifest is not None:
+        states = asyncio.run(manifest.status())["states"]
+        print(f"🗂️  Manifest: {states}")
+        if states["failed"]:
+            print(f"   {states['failed']} failed files; see --status, retry with --retry-failed")
+
+    if stats["chunks_written"] or stats["chunks_deleted"]:
+        rebuild_index(store, args.locale)
+    print("✅ RAG loading complete!")
+
+
+async def _expand_deletions(store, paths, locale):
+    doc_ids = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for prefix in {os.path.join(path, ""), os.path.join(os.path.abspath(path), "")}:
+                doc_ids.update(await store.afile_fingerprints(locale, prefix))
+        else:
+            # Files are stored under the path they were ingested with, relative or absolute
+            doc_ids.update({path, os.path.abspath(path)})
+    return sorted(doc_ids)
+
+
+def cmd_delete(args):
+    store = get_store(with_embeddings=False)
+    if args.source:
+        deleted = store.delete_documents(sources=args.paths, locale=args.locale)
+        print(f"🗑️  Deleted {deleted} chunks of {len(args.paths)} source(s) (locale={args.locale})")
+        return
+
+    async def delete():
+        doc_ids = await _expand_deletions(store, args.paths, args.locale)
+        return doc_ids, await store.adelete_documents(doc_ids=doc_ids, locale=args.locale)
+
+    doc_ids, deleted = asyncio.run(delete())
+    print(f"🗑️  Deleted {deleted} chunks of {len(doc_ids)} path(s) (locale={args.locale})")
+
+
+def cmd_dedup(args):
+    store = get_store(with_embeddings=False)
+    threshold = args.dedup_threshold or near_duplicate_threshold()
+    print(f"🧬 Deduplicating stored chunks of locale={args.locale} at similarity {threshold}")
+    result = asyncio.run(store.adeduplicate(args.locale, threshold, args.batch_size))
+    print(json.dumps({"locale": args.locale, **result}, indent=2))
+    if result["duplicates"]:
+        rebuild_index(store, args.locale)
+
+
+def cmd_gc(args):
+    result = get_store(with_embeddings=False).collect_garbage(args.locale)
+    print(json.dumps({"locale": args.locale, **result}, indent=2))
+
+
+def cmd_reindex(args):
+    rebuild_index(get_store(with_embeddings=False), args.locale)
+
+
+def cmd_stats(args):
+    store = get_store(with_embeddings=False)
+    result = store.corpus_stats(args.locale)
+    result["manifest"] = asyncio.run(store.ingest_manifest(args.locale).status())
+    try:
+        cache = make_extraction_cache(args.extraction_cache)
+        result["extraction_cache"] = cache.stats() if cache else None
+    except Exception as e:
+        result["extraction_cache"] = {"error": str(e)}
+    print(json.dumps(result, indent=2, default=str))
+
+
+async def _watch(store, extraction_cache, args, directory):
+    from managers.file_watcher import RESCAN, debounced, make_watcher
+
+    prefix = os.path.join(directory, "")
+
+    async def sync_all():
+        stats = await _pipeline(store, extraction_cache, args).run(
+            list_files(directory), prune_prefix=None if args.keep_missing else prefix
+        )
+        _print_summary(stats)
+
+    watcher = make_watcher(directory, poll_interval=args.poll_interval, polling=args.poll)
+    watcher.start()
+    print(f"👀 Watching {directory} ({watcher.kind}), debounce {args.debounce}s; Ctrl-C to stop")
+    try:
+        await sync_all()
+        async for batch in debounced(watcher.queue, args.debounce, args.max_delay):
+            start = time.monotonic()
+            if RESCAN in batch:
+                print("🔄 Rescanning the whole directory")
+                await sync_all()
+                continue
+            present = sorted(p for p in batch if os.path.isfile(p))
+            removed = sorted(p for p in batch if not os.path.exists(p))
+            written = deleted = 0
+            if present:
+                stats = await _pipeline(store, extraction_cache, args).run(present)
+                written = stats["chunks_written"]
+                if stats["files_skipped"] or stats["chunks_failed"]:
+                    _print_summary(stats)
+            if removed and not args.keep_missing:
+                deleted = await store.adelete_files(removed, args.locale)
+            print(f"📥 {len(present)} changed, {len(removed)} removed files: {written} chunks written, "
+                  f"{deleted} deleted in {time.monotonic() - start:.1f}s")
+    finally:
+        watcher.stop()
+
+
+def cmd_watch(args):
+    store, extraction_cache = _loader(args)
+    directory = _directory(args)
+    try:
+        asyncio.run(_watch(store, extraction_cache, args, directory))
+    except KeyboardInterrupt:
+        print("👋 Stopped watching")
+    print(f"   ANN index not rebuilt while watching; run `ingest.py reindex --locale {args.locale}` after large changes")
+
+
+def _pipeline_options(parser):
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Extraction processes")
+    parser.add_argument("--embed-batch-size", type=int, default=256,
+                        help="Chunks per embedding job (requests are packed up to RAG_EMBED_MAX_REQUEST_TOKENS)")
+    parser.add_argument("--embed-concurrency", type=int, default=None,
+                        help="Max concurrent embedding requests, adapted to 429s (default: RAG_EMBED_CONCURRENCY or 4)")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="Embedding requests per minute (default: RAG_INGEST_REQUESTS_PER_MINUTE, unlimited)")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="Embedding tokens per minute (default: RAG_INGEST_TOKENS_PER_MINUTE, unlimited)")
+    parser.add_argument("--write-batch-size", type=int, default=1000, help="Chunks per write transaction")
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--full", action="store_true", help="Re-embed every chunk, ignoring fingerprints and hashes")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=None,
+                        help="Skip near-duplicate chunks (default: RAG_DEDUP)")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="Estimated Jaccard similarity of a near-duplicate (default: RAG_DEDUP_THRESHOLD or 0.85)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load, sync, watch and inspect the pgvector RAG store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, handler, description):
+        sub = commands.add_parser(name, help=description)
+        sub.add_argument("--locale", default=LOCALE)
+        sub.add_argument("--extraction-cache", choices=["disk", "postgres", "off"], default=None,
+                         help="Parsed-page cache backend (default: RAG_EXTRACTION_CACHE or disk)")
+        sub.set_defaults(handler=handler)
+        return sub
+
+    add = command("add", cmd_add, "Ingest the given files")
+    add.add_argument("files", nargs="+")
+    _pipeline_options(add)
+
+    sync = command("sync", cmd_sync, "Make the locale match a directory")
+    sync.add_argument("directory", nargs="?", help="Directory to load (default: newData)")
+    _pipeline_options(sync)
+    sync.add_argument("--keep-missing", action="store_true", help="Keep chunks of files no longer in DIRECTORY")
+    sync.add_argument("--worker-id", default=None, help="Name of this loader in the manifest (default: host:pid)")
+    sync.add_argument("--claim-batch-size", type=int, default=32, help="Files claimed from the manifest at a time")
+    sync.add_argument("--restart", action="store_true", help="Start a new run even if the last one is unfinished")
+    sync.add_argument("--retry-failed", action="store_true", help="Only retry the files that failed")
+    sync.add_argument("--status", action="store_true", help="Print the manifest's per-state counts and failures")
+    sync.add_argument("--no-manifest", action="store_true", help="Ingest the listing without tracking progress")
+
+    delete = command("delete", cmd_delete, "Delete files (or every ingested file under a directory)")
+    delete.add_argument("paths", nargs="+")
+    delete.add_argument("--source", action="store_true",
+                        help="PATHs are metadata sources (e.g. URLs) rather than ingested files")
+
+    command("gc", cmd_gc, "Delete orphaned chunks, fingerprints and document rows")
+    dedup = command("dedup", cmd_dedup, "Delete near-duplicates among the stored chunks")
+    dedup.add_argument("--dedup-threshold", type=float, default=None,
+                       help="Estimated Jaccard similarity of a near-duplicate (default: RAG_DEDUP_THRESHOLD or 0.85)")
+    dedup.add_argument("--batch-size", type=int, default=1000, help="Chunks per transaction")
+
+    command("reindex", cmd_reindex, "Rebuild the locale's ANN index")
+    command("stats", cmd_stats, "Corpus, manifest and extraction cache statistics")
+
+    watch = command("watch", cmd_watch, "Sync, then ingest changes as they happen")
+    watch.add_argument("directory", nargs="?", help="Directory to watch (default: newData)")
+    _pipeline_options(watch)
+    watch.add_argument("--keep-missing", action="store_true", help="Keep chunks of removed files")
+    watch.add_argument("--debounce", type=float, default=2.0, help="Seconds of quiet before a batch is ingested")
+    watch.add_argument("--max-delay", type=float, default=30.0, help="Longest a change waits during constant activity")
+    watch.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    watch.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between polls")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Online re-embedding of rag_chunks with a new embedding model / dimensions.
+
+The live app keeps serving from rag_chunks.embedding the whole time:
+
+  start   --model M --dimensions N   add the shadow column embedding_next vector(N), a trigger that
+                                     clears it when a chunk's content changes, record the target spec
+                                     in rag_settings, then run
+  run     embed chunks whose embedding_next is NULL in batches, committing each batch. Resumable:
+          rerun after an interruption and it continues where it stopped. Embedding requests go
+          through the shared EmbeddingBatcher (RAG_EMBED_* / RAG_INGEST_* rate limits)
+  status  progress of the migration
+  swap    build the ANN indexes on the shadow column (CONCURRENTLY), then in one transaction: block
+          writers, embed the stragglers, rename embedding -> embedding_prev and embedding_next ->
+          embedding, move the index names over, rebuild rag_documents (if present), record the new
+          active spec and bump the corpus version. Running workers switch their query embeddings on their next spec refresh.
+  cleanup drop embedding_prev once the new spec is verified
+  abort   drop the shadow column, its indexes and the trigger
+
+Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, and OPENAI_API_KEY.
+Usage: python scripts/reembed_corpus.py start --model text-embedding-3-small --dimensions 768
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+import psycopg
+from pgvector.psycopg import register_vector
+
+from managers.corpus_version import bump_corpus_version, ensure_corpus_version_table
+from managers.document_index import document_table_exists, rebuild_documents
+from managers.embedding_batcher import make_ingestion_embeddings
+from managers.embeddings import (
+    EmbeddingSpec,
+    delete_setting,
+    ensure_settings_table,
+    get_active_spec,
+    get_setting,
+    set_active_spec,
+    set_setting,
+    validate_spec,
+)
+from managers.pgvector_store import Vector
+from managers.vector_index import (
+    INDEX_PREFIX,
+    MIN_IVFFLAT_ROWS,
+    VectorIndexManager,
+    index_name,
+    quantized_index_name,
+)
+
+MIGRATION_KEY = "embedding_migration"
+SHADOW_COLUMN = "embedding_next"
+PREVIOUS_COLUMN = "embedding_prev"
+NEXT_SUFFIX = "_next"
+
+_RESET_FUNCTION_DDL = f"""
+    CREATE OR REPLACE FUNCTION rag_chunks_reset_{SHADOW_COLUMN}() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.content IS DISTINCT FROM OLD.content THEN
+            NEW.{SHADOW_COLUMN} := NULL;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+_TRIGGER_NAME = f"rag_chunks_reset_{SHADOW_COLUMN}"
+_PENDING_SQL = f"SELECT id, content, content_hash FROM rag_chunks WHERE {SHADOW_COLUMN} IS NULL ORDER BY id LIMIT %s;"
+# The content_hash guard skips chunks rewritten since they were read; the trigger has cleared them for the next batch
+_FILL_SQL = f"UPDATE rag_chunks SET {SHADOW_COLUMN} = %s WHERE id = %s AND content_hash IS NOT DISTINCT FROM %s;"
+
+
+def _connect(autocommit: bool = False):
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        conn = psycopg.connect(database_url, autocommit=autocommit)
+    else:
+        db_host = os.getenv("DB_HOST")
+        db_user = os.getenv("DB_USER")
+        db_password = os.getenv("DB_PASSWORD")
+        db_name = os.getenv("DB_NAME")
+        if not all([db_host, db_user, db_password, db_name]):
+            print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+            sys.exit(1)
+        conn = psycopg.connect(
+            dbname=db_name, user=db_user, password=db_password, host=db_host,
+            port=os.getenv("DB_PORT", "5432"), autocommit=autocommit,
+        )
+    register_vector(conn)
+    return conn
+
+
+def _column_exists(cur, column: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'rag_chunks' AND column_name = %s;",
+        (column,),
+    )
+    return cur.fetchone() is not None
+
+
+def _migration_spec(cur) -> EmbeddingSpec:
+    value = get_setting(cur, MIGRATION_KEY)
+    if not value:
+        print("❌ No re-embedding migration in progress (run start first)", file=sys.stderr)
+        sys.exit(1)
+    return EmbeddingSpec.from_value(value)
+
+
+def _fill_batch(cur, embedder, batch_size: int) -> int:
+    """Embed and store one batch of pending chunks; returns how many were read."""
+    cur.execute(_PENDING_SQL, (batch_size,))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    vectors = embedder.embed_documents([content for _, content, _ in rows])
+    cur.executemany(_FILL_SQL, [(Vector(list(v)), id_, ch) for (id_, _, ch), v in zip(rows, vectors)])
+    return len(rows)
+
+
+def cmd_start(args) -> None:
+    spec = validate_spec(EmbeddingSpec(model=args.model, dimensions=args.dimensions))
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            ensure_settings_table(cur)
+            current = get_setting(cur, MIGRATION_KEY)
+            if current and EmbeddingSpec.from_value(current) != spec:
+                print(f"❌ A migration to {EmbeddingSpec.from_value(current)} is in progress; abort it first", file=sys.stderr)
+                sys.exit(1)
+            if _column_exists(cur, PREVIOUS_COLUMN):
+                print(f"❌ {PREVIOUS_COLUMN} from the last migration still exists; run cleanup first", file=sys.stderr)
+                sys.exit(1)
+            cur.execute(f"ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS {SHADOW_COLUMN} vector({spec.dimensions});")
+            cur.execute(_RESET_FUNCTION_DDL)
+            cur.execute(f"DROP TRIGGER IF EXISTS {_TRIGGER_NAME} ON rag_chunks;")
+            cur.execute(
+                f"CREATE TRIGGER {_TRIGGER_NAME} BEFORE UPDATE ON rag_chunks "
+                f"FOR EACH ROW EXECUTE FUNCTION rag_chunks_reset_{SHADOW_COLUMN}();"
+            )
+            set_setting(cur, MIGRATION_KEY, spec._asdict())
+    print(f"✅ Migration to {spec.model} ({spec.dimensions} dims) started")
+    cmd_run(args)
+
+
+def cmd_run(args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            spec = _migration_spec(cur)
+        conn.commit()
+        embedder = make_ingestion_embeddings(spec)
+        done = 0
+        started = time.time()
+        while True:
+            with conn.cursor() as cur:
+                n = _fill_batch(cur, embedder, args.batch_size)
+            conn.commit()
+            if not n:
+                break
+            done += n
+            print(f"  {done} chunks re-embedded ({done / max(time.time() - started, 1e-6):.1f}/s)")
+    print("✅ All chunks have a new embedding; run swap")
+
+
+def cmd_status(args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            ensure_settings_table(cur)
+            active = get_active_spec(cur)
+            target = get_setting(cur, MIGRATION_KEY)
+            report = {"active_spec": active._asdict() if active else None, "migration": target}
+            if target and _column_exists(cur, SHADOW_COLUMN):
+                cur.execute(f"SELECT count(*), count({SHADOW_COLUMN}) FROM rag_chunks;")
+                total, done = cur.fetchone()
+                report.update(total_chunks=total, re_embedded=done, percent=round(100.0 * done / total, 1) if total else 100.0)
+            report["previous_column_present"] = _column_exists(cur, PREVIOUS_COLUMN)
+    print(json.dumps(report, indent=2))
+
+
+def _build_shadow_indexes(cur, manager: VectorIndexManager) -> dict:
+    """Build each locale's ANN index on the shadow column under a temporary name; returns {final: temp}."""
+    built = {}
+    for locale in manager.locales(cur):
+        cur.execute("SELECT count(*) FROM rag_chunks WHERE locale = %s;", (locale,))
+        rows = cur.fetchone()[0]
+        if manager.quantization != "none":
+            final = quantized_index_name(locale, manager.quantization)
+            ddl = manager.create_quantized_index_sql(locale, name=final + NEXT_SUFFIX, concurrently=True, column=SHADOW_COLUMN)
+        elif manager.index_type == "ivfflat" and rows < MIN_IVFFLAT_ROWS:
+            print(f"  locale={locale}: {rows} rows, ivfflat index deferred")
+            continue
+        else:
+            final = index_name(locale)
+            ddl = manager.create_index_sql(locale, rows, name=final + NEXT_SUFFIX, concurrently=True, column=SHADOW_COLUMN)
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {final + NEXT_SUFFIX};")
+        cur.execute(ddl)
+        built[final] = final + NEXT_SUFFIX
+        print(f"  locale={locale}: built {final + NEXT_SUFFIX}")
+    return built
+
+
+def cmd_swap(args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            spec = _migration_spec(cur)
+            cur.execute(f"SELECT count(*) FROM rag_chunks WHERE {SHADOW_COLUMN} IS NULL;")
+            pending = cur.fetchone()[0]
+            if pending > args.max_catchup:
+                print(f"❌ {pending} chunks still pending (> {args.max_catchup}); run first", file=sys.stderr)
+                sys.exit(1)
+            manager = VectorIndexManager(index_type=args.type, quantization=args.quantization, dimensions=spec.dimensions)
+            built = _build_shadow_indexes(cur, manager)
+
+    embedder = make_ingestion_embeddings(spec)
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            # Readers keep going; writers wait until the swap commits
+            cur.execute("LOCK TABLE rag_chunks IN SHARE ROW EXCLUSIVE MODE;")
+            caught_up = 0
+            while True:
+                n = _fill_batch(cur, embedder, args.batch_size)
+                if not n:
+                    break
+                caught_up += n
+            cur.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'rag_chunks' AND indexname LIKE %s AND indexname NOT LIKE %s;",
+                (INDEX_PREFIX + "%", "%" + NEXT_SUFFIX),
+            )
+            for (old_index,) in cur.fetchall():
+                cur.execute(f"DROP INDEX IF EXISTS {old_index};")
+            cur.execute(f"DROP TRIGGER IF EXISTS {_TRIGGER_NAME} ON rag_chunks;")
+            cur.execute(f"ALTER TABLE rag_chunks RENAME COLUMN embedding TO {PREVIOUS_COLUMN};")
+            cur.execute(f"ALTER TABLE rag_chunks RENAME COLUMN {SHADOW_COLUMN} TO embedding;")
+            for final, temp in built.items():
+                cur.execute(f"ALTER INDEX {temp} RENAME TO {final};")
+            if document_table_exists(cur):
+                # Document centroids for two-stage search take the new size too
+                rebuild_documents(cur, spec.dimensions)
+            set_active_spec(cur, spec)
+            delete_setting(cur, MIGRATION_KEY)
+            ensure_corpus_version_table(cur)
+            version = bump_corpus_version(cur)
+        conn.commit()
+    print(f"✅ Swapped to {spec.model} ({spec.dimensions} dims), corpus version {version}; {caught_up} chunks caught up")
+    print(f"   Set RAG_EMBEDDING_MODEL / RAG_EMBEDDING_DIMENSIONS to match, then run cleanup to drop {PREVIOUS_COLUMN}")
+
+
+def cmd_cleanup(args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE rag_chunks DROP COLUMN IF EXISTS {PREVIOUS_COLUMN};")
+    print(f"✅ Dropped {PREVIOUS_COLUMN}")
+
+
+def cmd_abort(args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            ensure_settings_table(cur)
+            cur.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'rag_chunks' AND indexname LIKE %s;",
+                (INDEX_PREFIX + "%" + NEXT_SUFFIX,),
+            )
+            for (temp,) in cur.fetchall():
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {temp};")
+            cur.execute(f"DROP TRIGGER IF EXISTS {_TRIGGER_NAME} ON rag_chunks;")
+            cur.execute(f"ALTER TABLE rag_chunks DROP COLUMN IF EXISTS {SHADOW_COLUMN};")
+            delete_setting(cur, MIGRATION_KEY)
+    print("✅ Migration aborted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed rag_chunks with a new model / dimensions without downtime")
+    sub = parser.add_subparsers(dest="command", required=True)
+    start = sub.add_parser("start", help="Add the shadow column and start re-embedding")
+    start.add_argument("--model", required=True, help="e.g. text-embedding-3-small")
+    start.add_argument("--dimensions", type=int, required=True, help="e.g. 768")
+    start.add_argument("--batch-size", type=int, default=256)
+    run = sub.add_parser("run", help="Resume re-embedding pending chunks")
+    run.add_argument("--batch-size", type=int, default=256)
+    sub.add_parser("status", help="Show migration progress")
+    swap = sub.add_parser("swap", help="Build indexes and atomically switch to the new embeddings")
+    swap.add_argument("--type", choices=["ivfflat", "hnsw"], help="Index type (default: RAG_INDEX_TYPE)")
+    swap.add_argument("--quantization", choices=["none", "halfvec", "binary"], help="Storage mode (default: RAG_QUANTIZATION)")
+    swap.add_argument("--batch-size", type=int, default=256)
+    swap.add_argument("--max-catchup", type=int, default=1000, help="Refuse to swap with more pending chunks than this")
+    sub.add_parser("cleanup", help=f"Drop {PREVIOUS_COLUMN} after a swap")
+    sub.add_parser("abort", help="Abandon the migration")
+    args = parser.parse_args()
+
+    commands = {
+        "start": cmd_start,
+        "run": cmd_run,
+        "status": cmd_status,
+        "swap": cmd_swap,
+        "cleanup": cmd_cleanup,
+        "abort": cmd_abort,
+    }
+    commands[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
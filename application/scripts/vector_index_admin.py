@@ -0,0 +1,160 @@
+"""
+Admin CLI for the per-locale rag_chunks ANN indexes.
+
+  status      per-locale index type, size, lists vs recommended, query-time settings
+  rebuild     REINDEX CONCURRENTLY (or recreate when type/lists drifted); run after bulk ingestion.
+              Without --locale rebuilds every locale and drops the legacy global index.
+  add-locale  build the partial index for a new locale (e.g. add-locale fr)
+  recall      measured recall@k and latency of a locale's index against exact search
+  quantize    build the halfvec/binary HNSW index per locale (migration to quantized storage);
+              --drop-full then drops the full-precision ANN index it replaces
+  compare     recall@k / latency / index size of every storage mode that has an index
+  documents   (re)build rag_documents, the per-document centroids for two-stage search
+              (RAG_DOCUMENT_CANDIDATES); needed after a re-embedding swap
+
+Index type, recall target and quantization come from RAG_INDEX_TYPE / RAG_RECALL_TARGET /
+RAG_QUANTIZATION (or --type / --recall-target / --quantization).
+Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME.
+Usage: python scripts/vector_index_admin.py status
+"""
+import argparse
+import json
+import os
+import sys
+
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_application_dir = os.path.dirname(_script_dir)
+if _application_dir not in sys.path:
+    sys.path.insert(0, _application_dir)
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(_application_dir, ".env"))
+load_dotenv(os.path.join(os.path.dirname(_application_dir), ".env"), override=True)
+
+import psycopg
+from pgvector.psycopg import register_vector
+
+from managers.document_index import rebuild_documents
+from managers.vector_index import VectorIndexManager
+
+
+def _connect(autocommit: bool = False):
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        conn = psycopg.connect(database_url, autocommit=autocommit)
+    else:
+        db_host = os.getenv("DB_HOST")
+        db_user = os.getenv("DB_USER")
+        db_password = os.getenv("DB_PASSWORD")
+        db_name = os.getenv("DB_NAME")
+        if not all([db_host, db_user, db_password, db_name]):
+            print("❌ Set DATABASE_URL or DB_HOST, DB_USER, DB_PASSWORD, DB_NAME", file=sys.stderr)
+            sys.exit(1)
+        conn = psycopg.connect(
+            dbname=db_name, user=db_user, password=db_password, host=db_host,
+            port=os.getenv("DB_PORT", "5432"), autocommit=autocommit,
+        )
+    register_vector(conn)
+    return conn
+
+
+def cmd_status(manager: VectorIndexManager, args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            print(json.dumps(manager.describe(cur), indent=2))
+
+
+def cmd_rebuild(manager: VectorIndexManager, args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            action = manager.rebuild(cur, args.locale)
+    print(f"✅ Index {action}")
+
+
+def cmd_add_locale(manager: VectorIndexManager, args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            action = manager.add_locale(cur, args.locale)
+    if action == "skipped":
+        print(f"⚠️  Not enough rows for an ivfflat index on locale={args.locale} yet; rerun after ingestion")
+    else:
+        print(f"✅ Index for locale={args.locale} {action}")
+
+
+def cmd_recall(manager: VectorIndexManager, args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            locales = [args.locale] if args.locale else manager.locales(cur)
+            results = [manager.measure_recall(cur, loc, k=args.k, samples=args.samples) for loc in locales]
+        conn.rollback()
+    print(json.dumps(results, indent=2))
+
+
+def cmd_quantize(manager: VectorIndexManager, args) -> None:
+    with _connect(autocommit=True) as conn:
+        with conn.cursor() as cur:
+            results = manager.migrate_quantized(cur, args.locale, drop_full=args.drop_full)
+    for locale, action in results.items():
+        print(f"✅ {manager.quantization} index for locale={locale}: {action}")
+    if not args.drop_full:
+        print("ℹ️  Full-precision indexes kept; compare recall, set RAG_QUANTIZATION, then rerun with --drop-full")
+
+
+def cmd_compare(manager: VectorIndexManager, args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            locales = [args.locale] if args.locale else manager.locales(cur)
+            results = {loc: manager.compare_quantization(cur, loc, k=args.k, samples=args.samples) for loc in locales}
+        conn.rollback()
+    print(json.dumps(results, indent=2))
+
+
+def cmd_documents(manager: VectorIndexManager, args) -> None:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            count = rebuild_documents(cur, locale=args.locale)
+        conn.commit()
+    print(f"✅ rag_documents rebuilt with {count} document(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the rag_chunks ANN index")
+    parser.add_argument("--type", choices=["ivfflat", "hnsw"], help="Index type (default: RAG_INDEX_TYPE)")
+    parser.add_argument("--recall-target", type=float, help="Recall target (default: RAG_RECALL_TARGET)")
+    parser.add_argument("--quantization", choices=["none", "halfvec", "binary"], help="Storage mode (default: RAG_QUANTIZATION)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Report index health")
+    rebuild = sub.add_parser("rebuild", help="Rebuild indexes after bulk ingestion")
+    rebuild.add_argument("--locale", help="Only this locale (default: all)")
+    add_locale = sub.add_parser("add-locale", help="Build the ANN index for a new locale")
+    add_locale.add_argument("locale")
+    recall = sub.add_parser("recall", help="Measure recall against exact search")
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--samples", type=int, default=50)
+    recall.add_argument("--locale", help="Only this locale (default: all)")
+    quantize = sub.add_parser("quantize", help="Build quantized indexes (migration)")
+    quantize.add_argument("--locale", help="Only this locale (default: all)")
+    quantize.add_argument("--drop-full", action="store_true", help="Drop the full-precision ANN index afterwards")
+    compare = sub.add_parser("compare", help="Compare recall/latency of full-precision and quantized indexes")
+    compare.add_argument("--k", type=int, default=10)
+    compare.add_argument("--samples", type=int, default=50)
+    compare.add_argument("--locale", help="Only this locale (default: all)")
+    documents = sub.add_parser("documents", help="Rebuild the document centroid table for two-stage search")
+    documents.add_argument("--locale", help="Only this locale (default: all, recreating the table)")
+    args = parser.parse_args()
+
+    manager = VectorIndexManager(index_type=args.type, recall_target=args.recall_target, quantization=args.quantization)
+    commands = {
+        "status": cmd_status,
+        "rebuild": cmd_rebuild,
+        "add-locale": cmd_add_locale,
+        "recall": cmd_recall,
+        "quantize": cmd_quantize,
+        "compare": cmd_compare,
+        "documents": cmd_documents,
+    }
+    commands[args.command](manager, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Unit tests for query-focused sentence compression (fake embeddings, no database or OpenAI access).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.compression import SentenceCompressor, split_sentences
+from managers.pgvector_store import DocLike
+
+pytestmark = pytest.mark.asyncio
+
+TOPICS = ("groundwater", "colorado", "rainfall")
+
+
+class KeywordEmbeddings:
+    """One dimension per topic word, so similarity is topic overlap."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def aembed_documents(self, texts):
+        self.requests.append(list(texts))
+        return [[float(t.lower().count(word)) + 0.01 for word in TOPICS] for t in texts]
+
+
+def _doc(text, source="x/a.pdf"):
+    return SimpleNamespace(page_content=text, metadata={"source": source})
+
+
+CHUNK = (
+    "Groundwater pumping is limited in active management areas. "
+    "The Colorado River supplies the CAP canal. "
+    "Rainfall in the Sonoran desert averages under ten inches."
+)
+
+
+class TestSplitSentences:
+    async def test_splits_and_folds_short_fragments(self):
+        assert split_sentences("1. Water is scarce in the desert.\n\nSee page 4. Thanks a lot everyone here.") == [
+            "1. Water is scarce in the desert.",
+            "See page 4. Thanks a lot everyone here.",
+        ]
+
+
+class TestCompress:
+    async def test_keeps_most_relevant_sentences_within_budget(self):
+        embeddings = KeywordEmbeddings()
+        compressor = SentenceCompressor(embedding_function=embeddings, token_budget=15)
+        docs = await compressor.compress("How is groundwater managed?", [_doc(CHUNK)])
+        assert docs[0].page_content == "Groundwater pumping is limited in active management areas."
+        assert docs[0].metadata == {"source": "x/a.pdf"}
+        # Query and all sentences embedded in one request
+        assert len(embeddings.requests) == 1
+
+    async def test_sentences_cached_between_queries_and_shared_across_chunks(self):
+        embeddings = KeywordEmbeddings()
+        compressor = SentenceCompressor(embedding_function=embeddings, token_budget=1000)
+        overlap = "The Colorado River supplies the CAP canal."
+        docs = [_doc(CHUNK), _doc(overlap + " Rainfall recharges aquifers slowly over time.")]
+        result = await compressor.compress("colorado", docs)
+        assert sum(d.page_content.count(overlap) for d in result) == 1
+        await compressor.compress("rainfall", docs)
+        assert embeddings.requests[1] == ["rainfall"]
+
+    async def test_irrelevant_documents_dropped_by_similarity_floor(self):
+        compressor = SentenceCompressor(embedding_function=KeywordEmbeddings(), min_similarity=0.9)
+        docs = [DocLike("Groundwater levels are falling across the basin.", {}), _doc("Rainfall totals were reported for the month.")]
+        result = await compressor.compress("groundwater", docs)
+        assert [d.page_content for d in result] == ["Groundwater levels are falling across the basin."]
+        assert isinstance(result[0], DocLike)
+
+    async def test_embedding_failure_returns_original_documents(self):
+        class Broken:
+            async def aembed_documents(self, texts):
+                raise RuntimeError("rate limited")
+
+        docs = [_doc(CHUNK)]
+        assert await SentenceCompressor(embedding_function=Broken()).compress("q", docs) is docs
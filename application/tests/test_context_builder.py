@@ -0,0 +1,74 @@
+"""
+Unit tests for the kb_data context builder (chunk merging, source tags, token budget).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.context_builder import build_context, merge_text, overlap_length
+from managers.rag_manager import RAGManager
+from tests.test_rag_manager import FakeStore
+
+TEXT = (
+    "The Central Arizona Project delivers Colorado River water to Maricopa, Pima and Pinal counties. "
+    "Shortage tiers reduce deliveries to agriculture first, then to cities. "
+    "Groundwater replenishment offsets pumping in active management areas."
+)
+
+
+def _chunk(text, index=None, doc_id="newData/cap.pdf", name="cap.pdf"):
+    meta = {"source": doc_id, "name": name}
+    if index is not None:
+        meta.update(doc_id=doc_id, chunk_index=index)
+    return SimpleNamespace(page_content=text, metadata=meta)
+
+
+class TestMerge:
+    def test_overlap_removed(self):
+        assert overlap_length("abc def ghi", "def ghi jkl") == 7
+        assert merge_text("abc def ghi", "def ghi jkl") == "abc def ghi jkl"
+
+    def test_required_overlap(self):
+        assert merge_text("abc", "xyz", min_overlap=5) is None
+        assert merge_text("abc", "xyz") == "abc xyz"
+
+
+class TestBuildContext:
+    def test_adjacent_chunks_merge_in_document_order(self):
+        first, second = TEXT[:180], TEXT[120:]
+        context = build_context([_chunk(second, 1), _chunk(first, 0)])
+        assert context == "[Source: cap.pdf]\n" + TEXT.strip()
+
+    def test_non_adjacent_chunks_stay_separate_and_ordered_by_rank(self):
+        docs = [_chunk("second passage", 5), _chunk("first passage", 1), _chunk("other doc", 0, doc_id="x/b.pdf", name="b.pdf")]
+        context = build_context(docs, tag_sources=False)
+        assert context.split("\n\n") == ["second passage", "first passage", "other doc"]
+
+    def test_unindexed_chunks_merge_only_on_real_overlap(self):
+        docs = [_chunk(TEXT[:180]), _chunk(TEXT[120:]), _chunk("Unrelated.")]
+        context = build_context(docs, tag_sources=False)
+        assert context.split("\n\n") == [TEXT.strip(), "Unrelated."]
+
+    def test_duplicate_text_dropped(self):
+        assert build_context([_chunk("same", 0), _chunk("same", 3)], tag_sources=False) == "same"
+
+    def test_token_budget_truncates_and_stops(self):
+        docs = [_chunk("a" * 400, 0, doc_id="x/a.pdf"), _chunk("b" * 4000, 0, doc_id="x/b.pdf"), _chunk("c", 0, doc_id="x/c.pdf")]
+        context = build_context(docs, token_budget=200, tag_sources=False)
+        assert context.startswith("a" * 400)
+        assert "c" not in context
+        assert len(context) < 1000
+
+
+class TestRAGManagerContext:
+    @pytest.mark.asyncio
+    async def test_knowledge_to_string_uses_builder(self):
+        manager = RAGManager(FakeStore(), token_budget=1000)
+        context = await manager.knowledge_to_string({"documents": [_chunk(TEXT[:180], 0), _chunk(TEXT[120:], 1)]})
+        assert context.count("Shortage tiers") == 1
+        assert context.startswith("[Source: cap.pdf]")
@@ -0,0 +1,170 @@
+"""
+Unit tests for the embedding batcher: token packing, order preservation, AIMD on 429s,
+transient-error retries and the requests/tokens rate limiter (fake embeddings, no API calls).
+Run with:  pytest application/tests/ -v
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.embedding_batcher import EmbeddingBatcher, RateLimiter, is_transient, retry_after
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429")
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+class FakeEmbeddings:
+    chunk_size = 1000
+
+    def __init__(self, fail_first=0, delay=0.0):
+        self.requests = []
+        self.fail_first = fail_first
+        self.delay = delay
+        self.in_flight = self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_first:
+                self.fail_first -= 1
+                raise RateLimitError(retry_after="0")
+            self.requests.append(list(texts))
+            return [[float(t.split()[-1])] for t in texts]
+        finally:
+            self.in_flight -= 1
+
+
+def _texts(n, words=10):
+    return [" ".join(["water"] * (words - 1) + [str(i)]) for i in range(n)]
+
+
+class TestPacking:
+    def test_requests_stay_under_the_token_ceiling_in_order(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(), max_request_tokens=25)
+        groups = batcher.pack(_texts(7))
+        assert [i for group in groups for i in group] == list(range(7))
+        assert all(len(group) <= 2 for group in groups)
+
+    def test_oversized_text_goes_alone(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(), max_request_tokens=5)
+        assert batcher.pack(_texts(3, words=40)) == [[0], [1], [2]]
+
+    def test_input_count_ceiling(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(), max_request_size=3)
+        assert [len(g) for g in batcher.pack(_texts(7))] == [3, 3, 1]
+
+
+@pytest.mark.asyncio
+class TestScheduling:
+    async def test_results_keep_input_order(self):
+        embeddings = FakeEmbeddings(delay=0.001)
+        batcher = EmbeddingBatcher(embeddings, max_request_size=2, max_concurrency=3)
+        vectors = await batcher.aembed_documents(_texts(9))
+        assert vectors == [[float(i)] for i in range(9)]
+        assert len(embeddings.requests) == 5 and embeddings.max_in_flight <= 3
+
+    async def test_rate_limit_halves_concurrency_once_per_burst_and_retries(self):
+        embeddings = FakeEmbeddings(fail_first=3, delay=0.001)
+        batcher = EmbeddingBatcher(embeddings, max_request_size=1, max_concurrency=8, backoff=0.001)
+        vectors = await batcher.aembed_documents(_texts(8))
+        assert vectors == [[float(i)] for i in range(8)]
+        assert batcher.rate_limits == 3 and batcher.retries == 3
+        assert batcher.concurrency < 8
+
+    async def test_gives_up_after_max_retries(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(fail_first=10), max_retries=2, backoff=0.001)
+        with pytest.raises(RateLimitError):
+            await batcher.aembed_documents(_texts(1))
+
+    async def test_successes_grow_concurrency_back(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(), max_request_size=1, max_concurrency=4)
+        batcher.concurrency = 1.0
+        await batcher.aembed_documents(_texts(10))
+        assert batcher.concurrency > 2
+
+
+class TestSyncCalls:
+    def test_each_call_runs_its_own_loop(self):
+        batcher = EmbeddingBatcher(FakeEmbeddings(), requests_per_minute=1000)
+        assert batcher.embed_documents(_texts(2)) == [[0.0], [1.0]]
+        assert batcher.embed_documents(_texts(1)) == [[0.0]]
+
+
+class TestRetryAfter:
+    def test_header_values(self):
+        assert retry_after(RateLimitError(retry_after="2")) == 2.0
+        assert retry_after(RateLimitError()) is None
+
+
+class ServerError(Exception):
+    def __init__(self, status_code):
+        super().__init__(str(status_code))
+        self.status_code = status_code
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """Raises the given errors, one per request, before answering."""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+
+    async def aembed_documents(self, texts):
+        if self.errors:
+            raise self.errors.pop(0)
+        return await super().aembed_documents(texts)
+
+
+class TestTransientErrors:
+    def test_classification(self):
+        assert is_transient(ServerError(502)) and is_transient(APIConnectionError()) and is_transient(TimeoutError())
+        assert not is_transient(ServerError(400)) and not is_transient(ValueError("bad input"))
+
+
+@pytest.mark.asyncio
+class TestTransientRetries:
+    async def test_server_errors_and_dropped_connections_are_retried_without_throttling(self):
+        embeddings = FlakyEmbeddings([ServerError(503), APIConnectionError(), asyncio.TimeoutError()])
+        batcher = EmbeddingBatcher(embeddings, max_concurrency=4, backoff=0.001)
+        assert await batcher.aembed_documents(_texts(2)) == [[0.0], [1.0]]
+        assert batcher.errors == batcher.retries == 3
+        assert batcher.rate_limits == 0 and batcher.concurrency == 4
+
+    async def test_client_errors_are_not_retried(self):
+        batcher = EmbeddingBatcher(FlakyEmbeddings([ServerError(400)]), backoff=0.001)
+        with pytest.raises(ServerError):
+            await batcher.aembed_documents(_texts(1))
+        assert batcher.retries == 0
+
+
+@pytest.mark.asyncio
+class TestRateLimiter:
+    async def test_unlimited_does_not_wait(self):
+        limiter = RateLimiter()
+        assert await limiter.acquire(10**9) == 0.0
+
+    async def test_token_budget_delays_requests(self):
+        limiter = RateLimiter(tokens_per_minute=6000)  # 100 tokens/s
+        start = time.monotonic()
+        await limiter.acquire(6000)
+        waited = await limiter.acquire(10)
+        assert waited > 0.05 and time.monotonic() - start >= waited
+
+    async def test_oversized_request_passes_on_a_full_bucket(self):
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100)
+        assert await limiter.acquire(1000) == 0.0
@@ -0,0 +1,57 @@
+"""
+Unit tests for the extraction cache (normalization, disk backend, cached extract_file).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.extraction_cache import DiskExtractionCache, normalize_text
+from managers.file_fingerprints import file_sha256
+from managers.ingestion import extract_file, warm_file
+
+
+class TestNormalizeText:
+    def test_ligatures_line_ends_and_blank_lines(self):
+        assert normalize_text("ﬁrst  \r\nline\x00\n\n\n\nnext\r") == "first\nline\n\nnext"
+
+
+class TestDiskExtractionCache:
+    def test_round_trip_and_invalidation(self, tmp_path):
+        cache = DiskExtractionCache(str(tmp_path), extractor="v1")
+        pages = [("Page one", {"page": 0}), ("Página dos", {"page": 1})]
+        assert cache.get("ab" * 32) is None
+        cache.put("ab" * 32, pages)
+        assert cache.get("ab" * 32) == pages
+        assert cache.stats()["entries"] == 1
+        assert cache.delete(["ab" * 32, "cd" * 32]) == 1 and cache.get("ab" * 32) is None
+
+    def test_clear_can_keep_the_current_extractor(self, tmp_path):
+        old = DiskExtractionCache(str(tmp_path), extractor="v1")
+        current = DiskExtractionCache(str(tmp_path), extractor="v2")
+        old.put("ab" * 32, [("old", {})])
+        current.put("ab" * 32, [("new", {})])
+        assert current.stats()["stale_entries"] == 1
+        assert current.clear(keep_current=True) == 1
+        assert old.get("ab" * 32) is None and current.get("ab" * 32) == [("new", {})]
+
+
+class TestCachedExtraction:
+    def test_second_extraction_reads_the_cache(self, tmp_path):
+        path = tmp_path / "doc.txt"
+        path.write_text("Groundwater recharge.  \n\n\n\nPima County.", encoding="utf-8")
+        cache = DiskExtractionCache(str(tmp_path / "cache"))
+        first = extract_file(str(path), cache=cache)
+        second = extract_file(str(path), cache=cache)
+        assert not first.cached and second.cached
+        assert [c[0] for c in first.chunks] == [c[0] for c in second.chunks] == ["Groundwater recharge.\n\nPima County."]
+        assert second.chunks[0][1]["source"] == str(path)
+        assert cache.get(file_sha256(str(path)))[0][1].get("source") is None
+
+    def test_warm_file(self, tmp_path):
+        path = tmp_path / "doc.txt"
+        path.write_text("Water", encoding="utf-8")
+        cache = DiskExtractionCache(str(tmp_path / "cache"))
+        assert warm_file(str(path), cache) == (str(path), "extracted")
+        assert warm_file(str(path), cache) == (str(path), "cached")
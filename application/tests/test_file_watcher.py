@@ -0,0 +1,85 @@
+"""
+Unit tests for the watch-folder support of scripts/ingest.py (debouncing, polling,
+inotify event handling).
+Run with:  pytest application/tests/ -v
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.file_watcher import RESCAN, InotifyWatcher, PollingWatcher, _libc, debounced
+
+
+@pytest.mark.asyncio
+class TestDebounced:
+    async def test_a_burst_becomes_one_batch(self):
+        queue = asyncio.Queue()
+        for path in ["a.pdf", "b.pdf", "a.pdf"]:
+            queue.put_nowait(path)
+        batches = debounced(queue, debounce=0.05)
+        assert await batches.__anext__() == {"a.pdf", "b.pdf"}
+
+    async def test_constant_activity_is_cut_at_max_delay(self):
+        queue = asyncio.Queue()
+
+        async def trickle():
+            for i in range(50):
+                queue.put_nowait(f"{i}.txt")
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(trickle())
+        batch = await debounced(queue, debounce=0.05, max_delay=0.1).__anext__()
+        task.cancel()
+        assert 1 < len(batch) < 50
+
+
+@pytest.mark.asyncio
+class TestPollingWatcher:
+    async def test_added_changed_and_removed_files(self, tmp_path):
+        (tmp_path / "old.txt").write_text("a")
+        watcher = PollingWatcher(str(tmp_path), poll_interval=0.02)
+        watcher.start()
+        await asyncio.sleep(0.05)
+        (tmp_path / "new.pdf").write_text("b")
+        (tmp_path / "notes.docx").write_text("ignored")
+        os.remove(tmp_path / "old.txt")
+        batch = await debounced(watcher.queue, debounce=0.1).__anext__()
+        watcher.stop()
+        assert batch == {str(tmp_path / "new.pdf"), str(tmp_path / "old.txt")}
+
+
+class TestInotifyEvents:
+    def _watcher(self):
+        watcher = InotifyWatcher("/data", libc=object())
+        watcher._dirs = {1: "/data"}
+        return watcher
+
+    def test_written_and_deleted_files_are_reported(self):
+        watcher = self._watcher()
+        watcher._handle(1, 0x8, "a.pdf")  # IN_CLOSE_WRITE
+        watcher._handle(1, 0x200, "b.txt")  # IN_DELETE
+        watcher._handle(1, 0x8, "c.docx")
+        assert [watcher.queue.get_nowait() for _ in range(watcher.queue.qsize())] == ["/data/a.pdf", "/data/b.txt"]
+
+    def test_overflow_and_vanished_directories_ask_for_a_rescan(self):
+        watcher = self._watcher()
+        watcher._handle(-1, 0x4000, "")  # IN_Q_OVERFLOW
+        watcher._handle(1, 0x40 | 0x40000000, "sub")  # IN_MOVED_FROM | IN_ISDIR
+        assert [watcher.queue.get_nowait() for _ in range(2)] == [RESCAN, RESCAN]
+
+
+@pytest.mark.skipif(_libc() is None, reason="no inotify")
+@pytest.mark.asyncio
+class TestInotifyWatcher:
+    async def test_new_subdirectory_files_are_reported(self, tmp_path):
+        watcher = InotifyWatcher(str(tmp_path))
+        watcher.start()
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "a.pdf").write_text("x")
+        batch = await debounced(watcher.queue, debounce=0.1).__anext__()
+        watcher.stop()
+        assert batch == {str(tmp_path / "sub" / "a.pdf")}
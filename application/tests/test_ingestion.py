@@ -0,0 +1,319 @@
+"""
+Unit tests for the pipelined ingestion (process-pool extraction, rate-limited embedding,
+single bulk writer, incremental sync, manifest checkpoints). Uses a fake extractor and store, no files or database.
+Run with:  pytest application/tests/ -v
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.facets import document_facets
+from managers.file_fingerprints import FileFingerprint
+from managers.ingest_manifest import IngestManifest
+from managers.ingestion import ExtractedFile, IngestionPipeline
+from managers.near_duplicates import SignatureRow
+from managers.pgvector_store import content_hash
+
+
+def fake_extract(path, chunk_size, chunk_overlap, known_sha256=None):
+    # "<name>:<chunks>" paths (the file's sha256 is its path); "bad:*" fails like an unreadable PDF
+    name, count = path.split(":")
+    if name == "bad":
+        return ExtractedFile(path, 0, [], "Error - broken")
+    fingerprint = FileFingerprint(path, 1, 1.0, path)
+    if known_sha256 == path:
+        return ExtractedFile(path, 0, [], fingerprint=fingerprint, unchanged=True)
+    chunks = [(f"{name} chunk {i}", {"source": path}) for i in range(int(count))]
+    return ExtractedFile(path, int(count), chunks, fingerprint=fingerprint._replace(chunk_count=len(chunks)))
+
+
+class FakeEmbeddings:
+    def __init__(self, fail_on=None):
+        self.requests = []
+        self.fail_on = fail_on
+
+    async def aembed_documents(self, texts):
+        self.requests.append(len(texts))
+        if self.fail_on and any(self.fail_on in t for t in texts):
+            raise RuntimeError("embedding failed")
+        await asyncio.sleep(0)
+        return [[float(len(t))] for t in texts]
+
+
+class FakeStore:
+    def __init__(self, embeddings, fingerprints=None, chunks=None):
+        self.embedding_function = embeddings
+        self.fingerprints = fingerprints or {}
+        self.chunks = chunks or {}  # doc_id -> [(chunk_index, content_hash, embedding)]
+        self.writes = []
+        self.files = []
+        self.deleted = []
+        self.signatures = []
+        self.facets = []
+        self.releases = 0
+
+    async def afile_fingerprints(self, locale="en", prefix=None):
+        return dict(self.fingerprints)
+
+    async def achunk_state(self, doc_id, locale="en"):
+        return self.chunks.get(doc_id, [])
+
+    async def aadd_embedded_documents(self, documents, embeddings, locale="en", files=None, signatures=None):
+        assert len(documents) == len(embeddings)
+        self.writes.append([d.metadata["source"] for d in documents])
+        self.facets.extend(d.metadata.get("facets") for d in documents)
+        self.files.extend(files or [])
+        self.signatures.extend(signatures or [])
+
+    async def aembed_sentences(self, texts):
+        return [(f"h{len(t)}", [0.0]) for t in texts]
+
+    async def arelease_duplicates(self, locale="en"):
+        self.releases += 1
+        return 0
+
+    async def adelete_files(self, paths, locale="en"):
+        self.deleted.extend(paths)
+        return len(paths)
+
+
+class FakeNearDuplicates:
+    """Every chunk with the same text as an earlier one is its duplicate."""
+
+    def __init__(self):
+        self.seen = {}
+
+    async def assign(self, chunks, chunk_counts=None):
+        rows = []
+        for chunk in chunks:
+            canonical = self.seen.setdefault(chunk.text.split(" ", 1)[1], chunk.chunk_id)
+            duplicate = canonical != chunk.chunk_id
+            rows.append(SignatureRow(chunk.chunk_id, chunk.doc_id, chunk.chunk_index, chunk.source, b"", [],
+                                     canonical if duplicate else None, "h" if duplicate else None))
+        return rows
+
+
+class FakeManifest:
+    """In-memory rag_ingest_manifest for one worker."""
+
+    lease_seconds = 300.0
+
+    def __init__(self, states):
+        self.states = dict(states)
+        self.errors = {}
+        self.history = []
+
+    async def next_batch(self, limit):
+        batch = sorted(p for p, state in self.states.items() if state == "pending")[:limit]
+        for path in batch:
+            self.states[path] = "claimed"
+        return batch
+
+    async def mark(self, paths, state, error=None):
+        for path in paths:
+            self.states[path] = state
+            self.history.append((path, state))
+            if error:
+                self.errors[path] = error
+
+    async def heartbeat(self):
+        pass
+
+
+class RecordingConnection:
+    """Async psycopg connection stand-in; fetchone() answers the unfinished-files count."""
+
+    def __init__(self, unfinished=0):
+        self.executed = []
+        self.unfinished = unfinished
+        self.rowcount = 0
+        self.description = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    async def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    async def fetchone(self):
+        return (self.unfinished,)
+
+    async def commit(self):
+        pass
+
+
+def _pipeline(store, **kwargs):
+    kwargs.setdefault("workers", 2)
+    return IngestionPipeline(store, extract=fake_extract, progress_interval=60, **kwargs)
+
+
+@pytest.mark.asyncio
+class TestIngestionPipeline:
+    async def test_every_chunk_is_embedded_and_written(self):
+        store = FakeStore(FakeEmbeddings())
+        paths = [f"doc{i}:{i + 1}" for i in range(10)]
+        stats = await _pipeline(store, embed_batch_size=8, write_batch_size=20).run(paths)
+        assert stats["files"] == 10 and stats["pages"] == 55
+        assert stats["chunks_written"] == 55 and stats["chunks_failed"] == 0
+        assert sum(store.embedding_function.requests) == 55
+
+    async def test_files_are_never_split_across_writes(self):
+        store = FakeStore(FakeEmbeddings())
+        paths = [f"doc{i}:{n}" for i, n in enumerate([3, 7, 2, 9, 4, 6])]
+        await _pipeline(store, embed_batch_size=4, write_batch_size=5, embed_concurrency=3).run(paths)
+        seen = {}
+        for n, write in enumerate(store.writes):
+            for source in write:
+                assert seen.setdefault(source, n) == n
+        assert len(store.writes) > 1
+
+    async def test_failures_are_counted_not_fatal(self):
+        store = FakeStore(FakeEmbeddings(fail_on="poison"))
+        stats = await _pipeline(store, embed_batch_size=2).run(["bad:1", "poison:2", "good:3"])
+        assert stats["files_skipped"] == 1
+        assert stats["chunks_failed"] == 2 and stats["chunks_written"] == 3
+        assert [f.path for f in store.files] == ["good:3"]
+
+
+@pytest.mark.asyncio
+class TestIncrementalIngestion:
+    async def test_unchanged_files_are_not_parsed_or_embedded(self):
+        known = FileFingerprint("same:3", 1, 1.0, "same:3", 3)
+        store = FakeStore(FakeEmbeddings(), fingerprints={"same:3": known})
+        stats = await _pipeline(store).run(["same:3", "new:2"])
+        assert stats["files_unchanged"] == 1 and stats["chunks_embedded"] == 2
+        assert {f.path: f.chunk_count for f in store.files} == {"same:3": 3, "new:2": 2}
+
+    async def test_only_changed_chunks_are_embedded(self):
+        stored = [
+            (0, content_hash("doc chunk 0"), [0.0]),
+            (1, "stale", [1.0]),
+            (5, content_hash("doc chunk 2"), [2.0]),
+        ]
+        store = FakeStore(FakeEmbeddings(), chunks={"doc:4": stored})
+        stats = await _pipeline(store).run(["doc:4"])
+        # chunk 0 unchanged, chunk 2 moved (stored embedding reused), chunks 1 and 3 embedded
+        assert stats["chunks_unchanged"] == 1 and stats["chunks_reused"] == 1
+        assert store.embedding_function.requests == [2] and stats["chunks_written"] == 3
+        assert store.files[0].chunk_count == 4
+        # Facets of the whole document, not of the rewritten chunks alone
+        assert store.facets == [document_facets("doc:4", [f"doc chunk {i}" for i in range(4)])] * 3
+
+    async def test_vanished_files_under_the_prefix_are_deleted(self):
+        fingerprints = {
+            path: FileFingerprint(path, 1, 1.0, path, 1) for path in ["data/a:1", "data/gone:1", "other/b:1"]
+        }
+        store = FakeStore(FakeEmbeddings(), fingerprints=fingerprints)
+        stats = await _pipeline(store).run(["data/a:1"], prune_prefix="data/")
+        assert store.deleted == ["data/gone:1"] and stats["files_deleted"] == 1
+
+    async def test_empty_listing_never_prunes(self):
+        fingerprints = {"data/a:1": FileFingerprint("data/a:1", 1, 1.0, "data/a:1", 1)}
+        store = FakeStore(FakeEmbeddings(), fingerprints=fingerprints)
+        await _pipeline(store).run([], prune_prefix="data/")
+        assert store.deleted == []
+
+
+@pytest.mark.asyncio
+class TestNearDuplicateIngestion:
+    async def test_duplicates_are_neither_embedded_nor_written(self):
+        embeddings = FakeEmbeddings()
+        store = FakeStore(embeddings)
+        # "<name> chunk <i>" texts: b's chunks 0 and 1 repeat a's
+        stats = await _pipeline(store, embed_concurrency=1, near_duplicates=FakeNearDuplicates()).run(["a:2", "b:3"])
+        assert stats["chunks_duplicate"] == 2 and stats["chunks_written"] == 3
+        assert sum(embeddings.requests) == 3
+        # Whichever file is extracted first holds the canonical copies
+        duplicate = {(r.doc_id, r.chunk_index): r.canonical_id is not None for r in store.signatures}
+        assert len(duplicate) == 5 and not duplicate[("b:3", 2)]
+        assert all(duplicate[("a:2", i)] != duplicate[("b:3", i)] for i in (0, 1))
+        assert {f.path: f.chunk_count for f in store.files} == {"a:2": 2, "b:3": 3}
+        assert store.releases == 1
+
+
+@pytest.mark.asyncio
+class TestSentenceEmbeddingIngestion:
+    async def test_sentences_are_embedded_in_the_embed_stage_and_handed_to_the_writer(self):
+        class SentenceStore(FakeStore):
+            sentence_embeddings = True
+
+            async def aadd_embedded_documents(self, documents, embeddings, locale="en", files=None, sentences=None):
+                await super().aadd_embedded_documents(documents, embeddings, locale, files)
+                self.sentences.append(len(sentences))
+
+        store = SentenceStore(FakeEmbeddings())
+        store.sentences = []
+        await _pipeline(store).run(["a:2", "b:1"])
+        assert sum(store.sentences) == 3
+
+
+@pytest.mark.asyncio
+class TestManifestIngestion:
+    async def test_claimed_files_move_through_every_state(self):
+        manifest = FakeManifest({"a:2": "pending", "b:1": "pending", "done:1": "written"})
+        store = FakeStore(FakeEmbeddings())
+        stats = await _pipeline(store, manifest=manifest, claim_batch_size=1).run([])
+        assert stats["chunks_written"] == 3
+        assert manifest.states == {"a:2": "written", "b:1": "written", "done:1": "written"}
+        assert [s for p, s in manifest.history if p == "a:2"] == ["extracted", "embedded", "written"]
+
+    async def test_failures_are_recorded_with_their_error(self):
+        manifest = FakeManifest({"bad:1": "pending", "poison:1": "pending", "good:1": "pending"})
+        store = FakeStore(FakeEmbeddings(fail_on="poison"))
+        await _pipeline(store, manifest=manifest, embed_batch_size=1).run([])
+        assert manifest.states == {"bad:1": "failed", "poison:1": "failed", "good:1": "written"}
+        assert manifest.errors["bad:1"] == "Error - broken"
+        assert manifest.errors["poison:1"].startswith("Embedding failed")
+
+    async def test_stat_unchanged_files_are_marked_written(self, tmp_path):
+        path = tmp_path / "same.txt"
+        path.write_text("water")
+        st = os.stat(path)
+        known = FileFingerprint(str(path), st.st_size, st.st_mtime, "x", 1)
+        manifest = FakeManifest({str(path): "pending"})
+        store = FakeStore(FakeEmbeddings(), fingerprints={str(path): known})
+        stats = await _pipeline(store, manifest=manifest).run([])
+        assert stats["files_unchanged"] == 1 and manifest.states[str(path)] == "written"
+
+
+@pytest.mark.asyncio
+class TestIngestManifest:
+    async def test_unfinished_run_is_resumed_not_restarted(self):
+        conn = RecordingConnection(unfinished=4)
+
+        async def connect():
+            return conn
+
+        started, count = await IngestManifest(connect, "en", "w1").enqueue(["data/a.pdf"], "data/")
+        assert (started, count) == (False, 4)
+        assert not any(q.startswith("INSERT INTO rag_ingest_manifest") for q, _ in conn.executed)
+
+    async def test_new_run_drops_unlisted_rows_and_enqueues(self):
+        conn = RecordingConnection()
+
+        async def connect():
+            return conn
+
+        started, count = await IngestManifest(connect, "en", "w1").enqueue(["data/a.pdf", "data/b.pdf"], "data/")
+        assert (started, count) == (True, 2)
+        queries = [q for q, _ in conn.executed]
+        assert any(q.startswith("SELECT pg_advisory_xact_lock") for q in queries)
+        assert queries[-2].startswith("DELETE FROM rag_ingest_manifest") and queries[-1].startswith("INSERT")
+        assert conn.executed[-1][1]["paths"] == ["data/a.pdf", "data/b.pdf"]
+
+    async def test_unknown_state_is_rejected(self):
+        async def connect():
+            return RecordingConnection()
+
+        with pytest.raises(ValueError):
+            await IngestManifest(connect).mark(["a"], "done")
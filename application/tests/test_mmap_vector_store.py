@@ -0,0 +1,174 @@
+"""
+Unit tests for the memory-mapped snapshot store.
+
+Snapshots are written straight to a temp dir and the Postgres source is faked,
+so no database or OpenAI access is needed.
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg
+
+from managers.mmap_vector_store import MmapVectorStore, write_snapshot
+
+ROWS = [
+    ("north", {"source": "n.pdf"}, [1.0, 0.0, 0.0]),
+    ("east", {"source": "e.pdf"}, [0.0, 2.0, 0.0]),
+    ("north-east", {"source": "ne.pdf"}, [1.0, 1.0, 0.0]),
+]
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+    async def aembed_query(self, text):
+        return self.vectors[text]
+
+    async def aembed_documents(self, texts):
+        return [self.vectors[t] for t in texts]
+
+
+class FakeSource:
+    def __init__(self, version=1):
+        self.version = version
+        self.exported_version = version
+        self.embedding_function = FakeEmbeddings({"north": [3.0, 0.1, 0.0], "east": [0.0, 1.0, 0.0]})
+
+    def get_corpus_version(self):
+        return self.version
+
+    async def aget_corpus_version(self):
+        return self.version
+
+    def refresh_embedding_spec(self, force=False):
+        return False
+
+    async def arefresh_embedding_spec(self, force=False):
+        return False
+
+    def _connect(self):
+        self.connection = FakeConnection(self.exported_version, ROWS)
+        return self.connection
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((self.conn.isolation_level, query))
+        if "rag_corpus_version" in query:
+            self.result = [(self.conn.version,)]
+        elif "count(*)" in query:
+            self.result = [(len(self.conn.rows), 3)]
+        else:
+            self.result = list(self.conn.rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def __iter__(self):
+        return iter(self.result)
+
+
+class FakeConnection:
+    """Answers the snapshot export; the corpus version is the one seen inside its transaction."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.isolation_level = None
+        self.queries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+
+def _store(tmp_path, dtype="float32", version=1):
+    store = MmapVectorStore(FakeSource(version), snapshot_dir=str(tmp_path), dtype=dtype)
+    write_snapshot(store._base_path("en", version), ROWS, len(ROWS), 3, dtype, {"locale": "en", "version": version})
+    return store
+
+
+class TestSearch:
+    @pytest.mark.parametrize("dtype", ["float32", "float16"])
+    def test_top_k_by_cosine(self, tmp_path, dtype):
+        docs = _store(tmp_path, dtype).similarity_search("north", k=2)
+        assert [d.page_content for d in docs] == ["north", "north-east"]
+        assert docs[0].metadata == {"source": "n.pdf"}
+
+    def test_k_larger_than_corpus(self, tmp_path):
+        assert len(_store(tmp_path).similarity_search("east", k=10)) == len(ROWS)
+
+    @pytest.mark.asyncio
+    async def test_batch_search(self, tmp_path):
+        results = await _store(tmp_path).asimilarity_search_batch(["north", "east"], k=1)
+        assert [r[0].page_content for r in results] == ["north", "east"]
+
+    @pytest.mark.asyncio
+    async def test_scored_search_returns_cosine_distance(self, tmp_path):
+        scored = await _store(tmp_path).asimilarity_search_with_score("east", k=2)
+        assert [d.page_content for d, _ in scored] == ["east", "north-east"]
+        assert scored[0][1] == pytest.approx(0.0, abs=1e-6)
+        assert scored[1][1] == pytest.approx(1 - 2 ** -0.5, abs=1e-6)
+
+    def test_rejects_unknown_dtype(self, tmp_path):
+        with pytest.raises(ValueError):
+            MmapVectorStore(FakeSource(), snapshot_dir=str(tmp_path), dtype="int8")
+
+
+class TestRefresh:
+    @pytest.mark.asyncio
+    async def test_stale_snapshot_serves_while_new_version_builds(self, tmp_path):
+        store = _store(tmp_path)
+        await store.asimilarity_search("north")
+        assert store._snapshots["en"].version == 1
+
+        store._source.version = 2
+        write_snapshot(store._base_path("en", 2), ROWS[:1], 1, 3, "float32", {"locale": "en", "version": 2})
+        store.invalidate("en")
+        docs = await store.asimilarity_search("east", k=3)
+        assert len(docs) == 3  # still the v1 snapshot
+        await store._refreshing["en"]
+        assert store._snapshots["en"].version == 2
+        assert len(await store.asimilarity_search("east", k=3)) == 1
+
+    def test_snapshot_is_named_by_the_version_inside_the_export_transaction(self, tmp_path):
+        store = MmapVectorStore(FakeSource(version=1), snapshot_dir=str(tmp_path))
+        store._source.exported_version = 2  # a writer committed between the poll and the export
+        store.similarity_search("north")
+        assert store._snapshots["en"].version == 2
+        assert os.path.exists(store._base_path("en", 2) + ".json")
+        assert not os.path.exists(store._base_path("en", 1) + ".json")
+        isolation, first_query = store._source.connection.queries[0]
+        assert isolation == psycopg.IsolationLevel.REPEATABLE_READ and "rag_corpus_version" in first_query
+
+    def test_open_snapshot_survives_removal_by_a_newer_build(self, tmp_path):
+        store = _store(tmp_path)
+        assert len(store.similarity_search("east", k=3)) == 3
+        other = MmapVectorStore(FakeSource(version=2), snapshot_dir=str(tmp_path))
+        other.similarity_search("east")
+        assert not os.path.exists(store._base_path("en", 1) + ".json")
+        assert [d.page_content for d in store.similarity_search("east", k=3)][0] == "east"
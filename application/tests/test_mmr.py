@@ -0,0 +1,71 @@
+"""
+Unit tests for MMR diversification and its use in RAGManager (no database or OpenAI access).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.mmr import mmr_select
+from managers.rag_manager import RAGManager
+from tests.test_rag_manager import FakeStore, _doc
+
+# Two near-identical chunks and one on a different topic
+VECTORS = [[1.0, 0.0], [0.99, 0.05], [0.6, 0.8]]
+RELEVANCE = [0.95, 0.94, 0.80]
+
+
+class TestMMRSelect:
+    def test_pure_relevance_keeps_rank_order(self):
+        assert mmr_select(RELEVANCE, VECTORS, 3, lambda_mult=1.0) == [0, 1, 2]
+
+    def test_diversity_skips_near_duplicate(self):
+        assert mmr_select(RELEVANCE, VECTORS, 2, lambda_mult=0.5) == [0, 2]
+
+    def test_duplicate_threshold_excludes_outright(self):
+        assert mmr_select(RELEVANCE, VECTORS, 3, lambda_mult=1.0, duplicate_similarity=0.98) == [0, 2]
+
+    def test_per_source_cap_without_vectors(self):
+        picked = mmr_select([None] * 4, None, 3, sources=["a", "a", "a", "b"], max_per_source=2)
+        assert picked == [0, 1, 3]
+
+    def test_empty(self):
+        assert mmr_select([], [], 4) == []
+
+
+class VectorStore(FakeStore):
+    def __init__(self, candidates):
+        super().__init__([c[0] for c in candidates])
+        self.candidates = candidates
+
+    async def asimilarity_search_with_vectors(self, query, k=4, locale="en"):
+        self.calls.append((query, k, locale))
+        return self.candidates[:k]
+
+
+class TestRAGManagerMMR:
+    @pytest.mark.asyncio
+    async def test_over_fetches_and_diversifies(self):
+        candidates = [
+            (_doc("Maricopa county sheet", "x/maricopa.pdf"), 0.05, VECTORS[0]),
+            (_doc("Pima county sheet", "x/pima.pdf"), 0.06, VECTORS[1]),
+            (_doc("Colorado River shortage", "x/river.pdf"), 0.20, VECTORS[2]),
+        ]
+        store = VectorStore(candidates)
+        manager = RAGManager(store, mmr_lambda=0.5, mmr_candidates=10)
+        result = await manager.ann_search("county water", k=2)
+        assert store.calls[0][1] == 10
+        assert [d.page_content for d in result["documents"]] == ["Maricopa county sheet", "Colorado River shortage"]
+
+    @pytest.mark.asyncio
+    async def test_per_source_cap_on_store_without_vectors(self):
+        store = FakeStore([_doc(f"c{i}", "x/same.pdf") for i in range(3)] + [_doc("other", "x/other.pdf")])
+        result = await RAGManager(store, max_per_source=1, mmr_candidates=4).ann_search("q", k=2)
+        assert [d.page_content for d in result["documents"]] == ["c0", "other"]
+
+    def test_rejects_out_of_range_lambda(self):
+        with pytest.raises(ValueError):
+            RAGManager(FakeStore(), mmr_lambda=1.5)
@@ -0,0 +1,99 @@
+"""
+Unit tests for near-duplicate chunk detection (MinHash signatures, LSH buckets, canonical assignment).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.near_duplicates import ChunkRef, NearDuplicateIndex, lsh_buckets, minhash, similarity
+
+FACT_SHEET = (
+    "The Active Management Area program requires groundwater users in Phoenix, Pinal, Prescott, Tucson and "
+    "Santa Cruz to report annual withdrawals. Each area has a management goal, and the Department of Water "
+    "Resources adopts a management plan for every ten year period with conservation requirements for "
+    "municipal, agricultural and industrial users. New subdivisions must demonstrate an assured water supply "
+    "for one hundred years before lots can be sold, and recharge projects store Colorado River water "
+    "delivered by the Central Arizona Project in aquifers for later recovery during shortages. "
+) * 2
+
+
+class StoredConnection:
+    """Async psycopg connection stand-in answering the candidate query with rows."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    async def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    async def fetchall(self):
+        return self.rows
+
+    async def commit(self):
+        pass
+
+
+def _index(rows=()):
+    conn = StoredConnection(rows)
+
+    async def connect():
+        return conn
+
+    return NearDuplicateIndex(connect, "en", threshold=0.85), conn
+
+
+def _stored(chunk_id, doc_id, index, text):
+    signature = minhash(text)
+    return (chunk_id, doc_id, index, doc_id, signature.tobytes(), lsh_buckets(signature), f"hash-{chunk_id}")
+
+
+class TestMinHash:
+    def test_similar_texts_share_buckets_and_unrelated_ones_do_not(self):
+        edited = FACT_SHEET.replace("later recovery", "recovery")
+        other = "Tucson Water delivers reclaimed water to parks, golf courses and schools across the metro area."
+        assert similarity(minhash(FACT_SHEET), minhash(FACT_SHEET)) == 1.0
+        assert similarity(minhash(FACT_SHEET), minhash(edited)) >= 0.85
+        assert set(lsh_buckets(minhash(FACT_SHEET))) & set(lsh_buckets(minhash(edited)))
+        assert similarity(minhash(FACT_SHEET), minhash(other)) < 0.2
+
+    def test_case_and_punctuation_are_ignored(self):
+        assert similarity(minhash("Groundwater, Recharge!  and storage"), minhash("groundwater recharge and storage")) == 1.0
+
+    def test_threshold_must_be_a_similarity(self):
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(None, threshold=0)
+
+
+@pytest.mark.asyncio
+class TestNearDuplicateIndex:
+    async def test_duplicates_of_stored_and_earlier_chunks(self):
+        index, conn = _index([_stored("a0", "a.pdf", 0, FACT_SHEET)])
+        rows = await index.assign([
+            ChunkRef("b0", "b.pdf", 0, FACT_SHEET.replace("later recovery", "recovery"), "hb0", "b.pdf"),
+            ChunkRef("b1", "b.pdf", 1, "Footer: Arizona Department of Water Resources, 1110 W Washington St.", "hb1", "b.pdf"),
+            ChunkRef("b2", "b.pdf", 2, "Footer: Arizona Department of Water Resources, 1110 W Washington St.", "hb2", "b.pdf"),
+        ])
+        assert [(row.canonical_id, row.canonical_hash) for row in rows] == [("a0", "hash-a0"), (None, None), ("b1", "hb1")]
+        assert "m.buckets && %(buckets)s" in conn.executed[-1][0]
+
+    async def test_a_rewritten_chunk_is_not_a_duplicate_of_its_old_version(self):
+        index, _ = _index([_stored("a0", "a.pdf", 0, FACT_SHEET), _stored("a5", "a.pdf", 5, FACT_SHEET)])
+        rows = await index.assign(
+            [ChunkRef("a0", "a.pdf", 0, FACT_SHEET + " Updated.", "new", "a.pdf")], chunk_counts={"a.pdf": 3}
+        )
+        # a0 is being overwritten and a5 is past the document's new end
+        assert rows[0].canonical_id is None
@@ -0,0 +1,113 @@
+"""
+Unit tests for RAGManager and the async VectorStoreBase contract.
+
+Uses an in-memory fake store, so no PostgreSQL or OpenAI access is needed.
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.rag_manager import RAGManager
+from managers.vector_store import VectorStoreBase
+
+pytestmark = pytest.mark.asyncio
+
+
+def _doc(content, source):
+    return SimpleNamespace(page_content=content, metadata={"source": source, "name": os.path.basename(source)})
+
+
+class FakeStore(VectorStoreBase):
+    def __init__(self, docs=None, fail=False):
+        self.docs = docs or []
+        self.fail = fail
+        self.calls = []
+
+    def similarity_search(self, query, k=4, locale="en"):
+        raise AssertionError("RAGManager must use the async API")
+
+    def add_documents(self, documents, locale="en"):
+        self.docs.extend(documents)
+
+    async def asimilarity_search(self, query, k=4, locale="en"):
+        self.calls.append((query, k, locale))
+        if self.fail:
+            raise RuntimeError("db down")
+        return self.docs[:k]
+
+    async def aadd_documents(self, documents, locale="en"):
+        self.docs.extend(documents)
+
+
+# ---------------------------------------------------------------------------
+# ann_search
+# ---------------------------------------------------------------------------
+class TestAnnSearch:
+    async def test_uses_async_search_and_parses_sources(self):
+        store = FakeStore([
+            _doc("Groundwater in Phoenix.", "newData/phoenix.pdf"),
+            _doc("More on Phoenix.", "newData/phoenix.pdf"),
+        ])
+        result = await RAGManager(store).ann_search("phoenix water", k=2, locale="es")
+
+        assert store.calls == [("phoenix water", 2, "es")]
+        assert len(result["documents"]) == 2
+        assert [s["filename"] for s in result["sources"]] == ["phoenix.pdf"]
+
+    async def test_store_failure_returns_empty_result(self):
+        result = await RAGManager(FakeStore(fail=True)).ann_search("anything")
+        assert result == {"documents": [], "sources": []}
+
+
+# ---------------------------------------------------------------------------
+# Adaptive k
+# ---------------------------------------------------------------------------
+class ScoredStore(FakeStore):
+    def __init__(self, scored):
+        super().__init__([doc for doc, _ in scored])
+        self.scored = scored
+
+    async def asimilarity_search_with_score(self, query, k=4, locale="en"):
+        self.calls.append((query, k, locale))
+        return self.scored[:k]
+
+
+class TestAdaptiveK:
+    async def test_similarity_cutoff_can_return_nothing(self):
+        store = ScoredStore([(_doc("far", "x/a.pdf"), 0.6)])
+        result = await RAGManager(store, min_similarity=0.75).ann_search("unrelated")
+        assert result == {"documents": [], "sources": []}
+
+    async def test_max_k_widens_when_chunks_are_relevant(self):
+        scored = [(_doc(f"c{i}", f"x/{i}.pdf"), 0.1 + i * 0.05) for i in range(8)]
+        store = ScoredStore(scored)
+        result = await RAGManager(store, min_similarity=0.75, max_k=8).ann_search("q", k=2)
+        assert store.calls[0][1] == 8
+        assert [d.page_content for d in result["documents"]] == ["c0", "c1", "c2", "c3"]
+
+    async def test_token_budget_keeps_best_chunk_and_stops(self):
+        scored = [(_doc("x" * 400, "x/a.pdf"), 0.1), (_doc("y" * 400, "x/b.pdf"), 0.2), (_doc("z", "x/c.pdf"), 0.3)]
+        result = await RAGManager(ScoredStore(scored), token_budget=50).ann_search("q", k=3)
+        assert [d.page_content[0] for d in result["documents"]] == ["x"]
+
+    async def test_unscored_store_falls_back_to_plain_search(self):
+        store = FakeStore([_doc("a", "x/a.pdf"), _doc("b", "x/b.pdf")])
+        result = await RAGManager(store, min_similarity=0.9).ann_search("q", k=2)
+        assert len(result["documents"]) == 2
+
+
+# ---------------------------------------------------------------------------
+# VectorStoreBase defaults
+# ---------------------------------------------------------------------------
+class TestBatchSearchDefault:
+    async def test_batch_returns_one_result_per_query_in_order(self):
+        store = FakeStore([_doc("a", "x/a.pdf"), _doc("b", "x/b.pdf")])
+        results = await store.asimilarity_search_batch(["q1", "q2", "q3"], k=1, locale="en")
+
+        assert len(results) == 3
+        assert [q for q, _, _ in store.calls] == ["q1", "q2", "q3"]
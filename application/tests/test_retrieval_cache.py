@@ -0,0 +1,121 @@
+"""
+Unit tests for the retrieval result cache and its use in RAGManager.
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adapters.bedrock_kb import BedrockKnowledgeBase
+from managers.rag_manager import RAGManager
+from managers.retrieval_cache import RetrievalCache, normalize_query
+from tests.test_rag_manager import FakeStore, _doc
+
+pytestmark = pytest.mark.asyncio
+
+
+class Versions:
+    def __init__(self):
+        self.version = 1
+
+    async def __call__(self):
+        return self.version
+
+
+def _result(name="a"):
+    return {"documents": [_doc(name, f"x/{name}.pdf")], "sources": [{"filename": f"{name}.pdf"}]}
+
+
+class TestRetrievalCache:
+    async def test_normalization_ignores_case_spacing_and_trailing_punctuation(self):
+        assert normalize_query("  What is  CAP? ") == normalize_query("what is cap")
+
+    async def test_hit_after_store(self):
+        cache = RetrievalCache(version_fn=Versions(), version_check_interval=0)
+        _, token = await cache.lookup("q", "en", 4)
+        cache.store("q", "en", 4, _result(), token)
+        cached, _ = await cache.lookup("Q?", "en", 4)
+        assert cached["sources"] == [{"filename": "a.pdf"}]
+        assert (await cache.lookup("q", "es", 4))[0] is None
+        assert (await cache.lookup("q", "en", 5))[0] is None
+
+    async def test_version_bump_invalidates(self):
+        versions = Versions()
+        cache = RetrievalCache(version_fn=versions, version_check_interval=0)
+        _, token = await cache.lookup("q", "en", 4)
+        cache.store("q", "en", 4, _result(), token)
+        versions.version = 2
+        assert (await cache.lookup("q", "en", 4))[0] is None
+
+    async def test_result_computed_across_a_bump_is_not_cached(self):
+        versions = Versions()
+        cache = RetrievalCache(version_fn=versions, version_check_interval=0)
+        _, token = await cache.lookup("q", "en", 4)
+        versions.version = 2
+        await cache.lookup("other", "en", 4)
+        cache.store("q", "en", 4, _result(), token)
+        assert cache.stats()["entries"] == 0
+
+    async def test_lru_bound(self):
+        cache = RetrievalCache(max_entries=2)
+        for q in ("a", "b", "c"):
+            cache.store(q, "en", 4, _result(q), 0)
+        assert (await cache.lookup("a", "en", 4))[0] is None
+        assert (await cache.lookup("c", "en", 4))[0] is not None
+
+    async def test_ttl_without_version(self):
+        cache = RetrievalCache(ttl_seconds=0)
+        cache.store("q", "en", 4, _result(), 0)
+        assert (await cache.lookup("q", "en", 4))[0] is None
+
+
+class TestRAGManagerCache:
+    async def test_second_search_served_from_cache(self):
+        store = FakeStore([_doc("Groundwater.", "newData/phoenix.pdf")])
+        manager = RAGManager(store, cache=RetrievalCache(version_fn=Versions()))
+        first = await manager.ann_search("phoenix water", k=2)
+        second = await manager.ann_search("Phoenix water?", k=2)
+        assert len(store.calls) == 1
+        assert second["sources"] == first["sources"]
+
+    async def test_failures_are_not_cached(self):
+        store = FakeStore(fail=True)
+        manager = RAGManager(store, cache=RetrievalCache(version_fn=Versions()))
+        await manager.ann_search("q")
+        await manager.ann_search("q")
+        assert len(store.calls) == 2
+
+
+class FakeBedrockClient:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"retrievalResults": [
+            {"content": {"text": "Groundwater."}, "location": {"s3Location": {"uri": "s3://kb/phoenix.pdf"}}}
+        ]}
+
+
+class TestBedrockCache:
+    def _kb(self):
+        kb = BedrockKnowledgeBase(kb_id="kb", region="us-west-2", cache=RetrievalCache())
+        kb.client = FakeBedrockClient()
+        return kb
+
+    async def test_second_search_served_from_cache(self):
+        kb = self._kb()
+        first = await kb.ann_search("phoenix water", k=2)
+        second = await kb.ann_search("Phoenix water?", k=2)
+        assert len(kb.client.calls) == 1
+        assert second["sources"] == first["sources"]
+
+    async def test_other_locale_misses(self):
+        kb = self._kb()
+        await kb.ann_search("phoenix water", k=2)
+        await kb.ann_search("phoenix water", k=2, locale="es")
+        assert len(kb.client.calls) == 2
+        assert kb._cache.stats()["hits"] == 0
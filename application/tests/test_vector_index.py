@@ -0,0 +1,95 @@
+"""
+Unit tests for VectorIndexManager sizing and query-time settings (no database needed).
+Run with:  pytest application/tests/ -v
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.vector_index import (
+    VectorIndexManager,
+    index_name,
+    ivfflat_lists_for,
+    quantized_search_sql,
+    validate_locale,
+)
+
+
+class TestIvfflatSizing:
+    def test_lists_scale_with_rows(self):
+        assert ivfflat_lists_for(0) == 1
+        assert ivfflat_lists_for(30_000) == 30
+        assert ivfflat_lists_for(4_000_000) == 2000
+
+    def test_recreate_when_lists_drift(self):
+        manager = VectorIndexManager(index_type="ivfflat")
+        info = {"type": "ivfflat", "options": {"lists": 100}, "valid": True, "size_bytes": 0}
+        assert manager.needs_recreate(info, 10_000)
+        assert not manager.needs_recreate(info, 120_000)
+
+    def test_recreate_when_type_changes(self):
+        manager = VectorIndexManager(index_type="hnsw")
+        info = {"type": "ivfflat", "options": {"lists": 30}, "valid": True, "size_bytes": 0}
+        assert manager.needs_recreate(info, 30_000)
+
+    def test_invalid_type_rejected(self):
+        with pytest.raises(ValueError):
+            VectorIndexManager(index_type="flat")
+
+
+class TestSearchSettings:
+    def test_higher_recall_probes_more(self):
+        low = VectorIndexManager(index_type="ivfflat", recall_target=0.9).search_settings(lists=100)
+        high = VectorIndexManager(index_type="ivfflat", recall_target=0.98).search_settings(lists=100)
+        assert int(low["ivfflat.probes"]) < int(high["ivfflat.probes"]) <= 100
+        assert int(low["hnsw.ef_search"]) < int(high["hnsw.ef_search"])
+
+    def test_exact_recall_probes_every_list(self):
+        settings = VectorIndexManager(recall_target=0.999).search_settings(lists=64)
+        assert settings["ivfflat.probes"] == "64"
+
+    def test_ef_search_at_least_k(self):
+        settings = VectorIndexManager(index_type="hnsw", recall_target=0.9).search_settings(k=200)
+        assert int(settings["hnsw.ef_search"]) >= 200
+
+
+class TestPerLocaleIndexes:
+    def test_partial_index_per_locale(self):
+        ddl = VectorIndexManager(index_type="ivfflat").create_index_sql("es", 5000)
+        assert "rag_chunks_embedding_es_idx" in ddl
+        assert "WHERE locale = 'es'" in ddl
+        assert "lists = 5" in ddl
+
+    def test_index_name_normalizes_region_suffix(self):
+        assert index_name("es-mx") == "rag_chunks_embedding_es_mx_idx"
+
+    @pytest.mark.parametrize("locale", ["", "EN", "en'; DROP TABLE rag_chunks;--", None])
+    def test_unsafe_locales_rejected(self, locale):
+        with pytest.raises(ValueError):
+            validate_locale(locale)
+
+
+class TestQuantization:
+    def test_binary_index_uses_hamming_hnsw(self):
+        ddl = VectorIndexManager(quantization="binary").create_quantized_index_sql("en")
+        assert "rag_chunks_embedding_en_bit_idx" in ddl
+        assert "USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)" in ddl
+        assert "WHERE locale = 'en'" in ddl
+
+    def test_search_rescores_candidates_at_full_precision(self):
+        text = quantized_search_sql("es", "halfvec", 1536)
+        assert "ORDER BY (embedding::halfvec(1536)) <=> %(embedding)s::halfvec(1536)" in text
+        assert "LIMIT %(candidates)s" in text
+        assert text.rstrip().endswith("ORDER BY embedding <=> %(embedding)s\n    LIMIT %(k)s;")
+
+    def test_candidates_never_below_k(self):
+        manager = VectorIndexManager(quantization="halfvec", rescore_candidates=20)
+        assert manager.candidates_for(4) == 20
+        assert manager.candidates_for(50) == 50
+
+    def test_invalid_quantization_rejected(self):
+        with pytest.raises(ValueError):
+            VectorIndexManager(quantization="int8")
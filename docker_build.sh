@@ -51,7 +51,7 @@ if [[ "$OSTYPE" == "linux-gnu"* ]]; then
     fi
 fi
 
-# RAG vector store is PostgreSQL (pgvector). Ingest with Add_files_to_db.py when DB_* and OPENAI_API_KEY are set.
+# RAG vector store is PostgreSQL (pgvector). Ingest with scripts/ingest.py sync (or watch) when DB_* and OPENAI_API_KEY are set.
 echo "✅ Frontend will be built inside Docker (OS-agnostic)"
 
 # Load environment variables from .env file if it exists (for OPENAI_API_KEY in container)
@@ -87,6 +87,6 @@ echo "🚀 To run the container:"
 echo "   docker run -p 8000:8000 waterbot"
 echo ""
 echo "💡 To rebuild components:"
-echo "   - Vector database: python application/scripts/Add_files_to_db.py"
+echo "   - Vector database: python application/scripts/ingest.py sync"
 echo "   - Frontend is built automatically inside Docker (no manual build needed)"
 echo "   Then re-run this script"
\ No newline at end of file
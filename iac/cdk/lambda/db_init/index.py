@@ -124,26 +124,148 @@ def handler(event, context):
         print("pgvector extension enabled")
         
         # Create rag_chunks table for pgvector (replaces ChromaDB)
-        rag_chunks_query = """
+        # Must match RAG_EMBEDDING_DIMENSIONS in the app (managers/embeddings.py)
+        embedding_dimensions = int(os.environ.get('RAG_EMBEDDING_DIMENSIONS', '1536'))
+        rag_chunks_query = f"""
         CREATE TABLE IF NOT EXISTS rag_chunks (
             id TEXT PRIMARY KEY,
             doc_id TEXT,
             chunk_index INT,
             content TEXT NOT NULL,
-            embedding vector(1536),
+            embedding vector({embedding_dimensions}),
             metadata JSONB,
             content_hash TEXT,
             locale TEXT NOT NULL,
             created_at TIMESTAMPTZ DEFAULT now()
         );
         
-        CREATE INDEX IF NOT EXISTS rag_chunks_embedding_idx
-        ON rag_chunks USING ivfflat (embedding vector_cosine_ops)
-        WITH (lists = 100);
+        -- ANN indexes are not created here: there is one partial index per locale
+        -- (rag_chunks_embedding_<locale>_idx) and ivfflat lists must be trained on real data.
+        -- The app / ingestion scripts build them sized from each locale's row count
+        -- (managers/vector_index.py, scripts/vector_index_admin.py rebuild / add-locale).
         
         CREATE INDEX IF NOT EXISTS idx_rag_chunks_doc_id ON rag_chunks (doc_id);
         CREATE INDEX IF NOT EXISTS idx_rag_chunks_metadata ON rag_chunks USING GIN (metadata);
         CREATE INDEX IF NOT EXISTS idx_rag_chunks_locale ON rag_chunks (locale);
+        -- Delete by source (managers/document_lifecycle.py); the GIN index only serves @>
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_source ON rag_chunks ((metadata->>'source'), locale);
+        
+        -- Full-text column for hybrid retrieval (keep in sync with managers/pgvector_store.py)
+        ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector(CASE locale WHEN 'es' THEN 'spanish'::regconfig ELSE 'english'::regconfig END, content)
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_content_tsv ON rag_chunks USING GIN (content_tsv);
+        
+        -- Retrieval facets filled at ingestion (keep in sync with managers/facets.py)
+        ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS regions TEXT[];
+        ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS doc_type TEXT;
+        ALTER TABLE rag_chunks ADD COLUMN IF NOT EXISTS publisher TEXT;
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_regions ON rag_chunks USING GIN (regions);
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_doc_type ON rag_chunks (locale, doc_type);
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_publisher ON rag_chunks (locale, publisher);
+        
+        -- Corpus version, bumped by every rag_chunks writer (managers/corpus_version.py)
+        CREATE TABLE IF NOT EXISTS rag_corpus_version (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+        INSERT INTO rag_corpus_version (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+        
+        -- Document centroids for two-stage retrieval (keep in sync with managers/document_index.py)
+        CREATE TABLE IF NOT EXISTS rag_documents (
+            doc_id TEXT NOT NULL,
+            locale TEXT NOT NULL,
+            embedding vector({embedding_dimensions}) NOT NULL,
+            chunk_count INT NOT NULL,
+            updated_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (doc_id, locale)
+        );
+        -- Backfill documents already in rag_chunks; the app only builds the table when it is missing
+        INSERT INTO rag_documents (doc_id, locale, embedding, chunk_count)
+        SELECT doc_id, locale, avg(embedding), count(*)
+        FROM rag_chunks
+        WHERE doc_id IS NOT NULL AND embedding IS NOT NULL
+        GROUP BY doc_id, locale
+        ON CONFLICT (doc_id, locale) DO NOTHING;
+        -- One partial HNSW index per locale (rag_documents_embedding_<locale>_idx); HNSW needs no
+        -- training data. The app adds the index of any other locale it finds.
+        CREATE INDEX IF NOT EXISTS rag_documents_embedding_en_idx ON rag_documents
+            USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64) WHERE locale = 'en';
+        CREATE INDEX IF NOT EXISTS rag_documents_embedding_es_idx ON rag_documents
+            USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64) WHERE locale = 'es';
+        
+        -- Active embedding spec and re-embedding migration state (managers/embeddings.py)
+        CREATE TABLE IF NOT EXISTS rag_settings (
+            key TEXT PRIMARY KEY,
+            value JSONB NOT NULL,
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+        
+        -- Sentence embeddings for query-time context compression (managers/compression.py)
+        CREATE TABLE IF NOT EXISTS rag_sentence_embeddings (
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            dimensions INT NOT NULL,
+            embedding vector NOT NULL,
+            PRIMARY KEY (content_hash, model, dimensions)
+        );
+        
+        -- Ingested file fingerprints for incremental loads (managers/file_fingerprints.py)
+        CREATE TABLE IF NOT EXISTS rag_files (
+            path TEXT NOT NULL,
+            locale TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            mtime DOUBLE PRECISION NOT NULL,
+            sha256 TEXT NOT NULL,
+            chunk_count INT NOT NULL,
+            ingested_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (path, locale)
+        );
+        
+        -- Resumable loader runs: per-file state, attempts and claims (managers/ingest_manifest.py)
+        CREATE TABLE IF NOT EXISTS rag_ingest_manifest (
+            path TEXT NOT NULL,
+            locale TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending'
+                CHECK (state IN ('pending', 'extracted', 'embedded', 'written', 'failed')),
+            attempts INT NOT NULL DEFAULT 0,
+            error TEXT,
+            worker TEXT,
+            claimed_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (path, locale)
+        );
+        CREATE INDEX IF NOT EXISTS rag_ingest_manifest_state_idx ON rag_ingest_manifest (locale, state);
+        
+        -- MinHash signatures and LSH buckets for near-duplicate chunks (managers/near_duplicates.py)
+        CREATE TABLE IF NOT EXISTS rag_chunk_minhash (
+            chunk_id TEXT PRIMARY KEY,
+            doc_id TEXT NOT NULL,
+            locale TEXT NOT NULL,
+            chunk_index INT NOT NULL,
+            source TEXT,
+            signature BYTEA NOT NULL,
+            buckets BIGINT[] NOT NULL,
+            canonical_id TEXT,
+            canonical_hash TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_buckets ON rag_chunk_minhash USING GIN (buckets);
+        CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_doc_id ON rag_chunk_minhash (doc_id, locale);
+        CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_source ON rag_chunk_minhash (source, locale);
+        CREATE INDEX IF NOT EXISTS idx_rag_chunk_minhash_canonical ON rag_chunk_minhash (canonical_id)
+            WHERE canonical_id IS NOT NULL;
+        
+        -- Parsed-page cache of the loaders, keyed by file hash (managers/extraction_cache.py)
+        CREATE TABLE IF NOT EXISTS rag_extractions (
+            sha256 TEXT NOT NULL,
+            extractor TEXT NOT NULL,
+            pages BYTEA NOT NULL,
+            page_count INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (sha256, extractor)
+        );
         """
         cursor.execute(rag_chunks_query)
         print("rag_chunks table and indexes created successfully")